@@ -6,23 +6,28 @@ from agent_tools import (
     decision_tool
 )
 from llm_service import generate_llm_explanation
+from metrics import AGENT_STEP_SECONDS
 
-def run_agent(application: dict, use_llm: bool = False):
+def run_agent(application: dict, use_llm: bool = False, credit_score_fn=credit_score_tool):
     """
     Runs validation → credit score → risk rules → decision.
     Now supports MANUAL REVIEW.
+
+    `credit_score_fn(pan, income, loan_amount)` can be swapped out (e.g. by bulk
+    ingestion, which scores against credit profiles it has already loaded).
     """
 
     result = {}
 
     # 1️⃣ Validation
-    validation = validate_input_tool(
-        name=application["name"],
-        age=application["age"],
-        income=application["income"],
-        loan_amount=application["loan_amount"],
-        pan=application["pan"]
-    )
+    with AGENT_STEP_SECONDS.time("validation"):
+        validation = validate_input_tool(
+            name=application["name"],
+            age=application["age"],
+            income=application["income"],
+            loan_amount=application["loan_amount"],
+            pan=application["pan"]
+        )
     result["validation"] = validation
 
     if not validation["success"]:
@@ -33,27 +38,30 @@ def run_agent(application: dict, use_llm: bool = False):
         return result
 
     # 2️⃣ Credit Score
-    credit_score = credit_score_tool(
-    application["pan"],
-    application["income"],
-    application["loan_amount"]
-)
+    with AGENT_STEP_SECONDS.time("credit_score"):
+        credit_score = credit_score_fn(
+            application["pan"],
+            application["income"],
+            application["loan_amount"]
+        )
 
     result["credit_score"] = credit_score
 
     # 3️⃣ Risk Assessment
-    risk = risk_rules_tool(
-        income=application["income"],
-        loan_amount=application["loan_amount"],
-        credit_score=credit_score["credit_score"],
-    )
+    with AGENT_STEP_SECONDS.time("risk"):
+        risk = risk_rules_tool(
+            income=application["income"],
+            loan_amount=application["loan_amount"],
+            credit_score=credit_score["credit_score"],
+        )
     result["risk"] = risk
 
     # 4️⃣ Decision
-    decision = decision_tool(
-        credit_score=credit_score["credit_score"],
-        risk_level=risk["risk_level"],
-    )
+    with AGENT_STEP_SECONDS.time("decision"):
+        decision = decision_tool(
+            credit_score=credit_score["credit_score"],
+            risk_level=risk["risk_level"],
+        )
     result["decision"] = decision
 
     # 5️⃣ Status determination
@@ -64,6 +72,7 @@ def run_agent(application: dict, use_llm: bool = False):
 
     # 6️⃣ LLM explanation (optional)
     if use_llm:
-        result["llm_explanation"] = generate_llm_explanation(application, result)
+        with AGENT_STEP_SECONDS.time("llm_explanation"):
+            result["llm_explanation"] = generate_llm_explanation(application, result)
 
     return result
@@ -1,6 +1,9 @@
 # agent_tools.py
 from pydantic import BaseModel
 from utils import get_or_update_credit_score
+from rule_engine import rule_engine
+
+# Thresholds, messages and rule order live in policy.json (see rule_engine.py)
 
 # 1. Validation
 class ValidateInputResult(BaseModel):
@@ -8,25 +11,19 @@ class ValidateInputResult(BaseModel):
     message: str
 
 def validate_input_tool(name: str, age: int, income: float, loan_amount: float, pan: str):
-    if age < 18 or age > 100:
-        return ValidateInputResult(success=False, message="Age out of allowed range").dict()
-    if income <= 0:
-        return ValidateInputResult(success=False, message="Income must be greater than zero").dict()
-    if loan_amount <= 0:
-        return ValidateInputResult(success=False, message="Loan amount must be greater than zero").dict()
-    if loan_amount > income * 10:
-        return ValidateInputResult(success=False, message="Loan amount extremely high relative to income").dict()
-    return ValidateInputResult(success=True, message="Input looks valid").dict()
+    outcome = rule_engine.evaluate("validation", {"age": age, "income": income, "loan_amount": loan_amount})
+    return ValidateInputResult(**outcome).dict()
 
 # 2. Credit score
 class CreditScoreResult(BaseModel):
     credit_score: int
 
-def credit_score_tool(pan: str, income: float, loan_amount: float):
+def credit_score_tool(pan: str, income: float, loan_amount: float, counted_self: bool = False):
     score = get_or_update_credit_score(
         pan=pan,
         income=income,
-        loan_amount=loan_amount
+        loan_amount=loan_amount,
+        counted_self=counted_self
     )
     return CreditScoreResult(credit_score=score).dict()
 
@@ -36,13 +33,10 @@ class RiskResult(BaseModel):
     reason: str
 
 def risk_rules_tool(income: float, loan_amount: float, credit_score: int):
-    if credit_score < 550:
-        return RiskResult(risk_level="high", reason="Very low credit score").dict()
-    if loan_amount > income * 5:
-        return RiskResult(risk_level="high", reason="Loan amount too high relative to income").dict()
-    if loan_amount > income * 3:
-        return RiskResult(risk_level="medium", reason="Moderate risk loan amount").dict()
-    return RiskResult(risk_level="low", reason="Healthy income-to-loan ratio").dict()
+    outcome = rule_engine.evaluate(
+        "risk", {"income": income, "loan_amount": loan_amount, "credit_score": credit_score}
+    )
+    return RiskResult(**outcome).dict()
 
 # 4. Decision tool
 class DecisionResult(BaseModel):
@@ -51,24 +45,6 @@ class DecisionResult(BaseModel):
     manual_review: bool = False  # NEW FLAG
 
 def decision_tool(credit_score: int, risk_level: str):
-    # 🚨 Manual review triggers
-    if credit_score < 600:
-        return DecisionResult(approved=False, manual_review=True,
-               reason="Low credit score requires manual verification").dict()
-
-    if risk_level == "high":
-        return DecisionResult(approved=False, manual_review=True,
-               reason="High-risk profile requires manual review").dict()
-
-    # Auto reject (no manual review)
-    if credit_score < 630:
-        return DecisionResult(approved=False,
-               reason="Credit score below eligibility threshold").dict()
-
-    # Auto reject for high risk
-    if risk_level == "high":
-        return DecisionResult(approved=False,
-               reason="Risk too high for approval").dict()
-
-    # Auto approve
-    return DecisionResult(approved=True, reason="Good credit score and acceptable risk").dict()
+    # Manual review triggers, auto reject and auto approve — in that order
+    outcome = rule_engine.evaluate("decision", {"credit_score": credit_score, "risk_level": risk_level})
+    return DecisionResult(**outcome).dict()
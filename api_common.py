@@ -0,0 +1,330 @@
+# api_common.py
+"""
+What main.py and main_async.py share, so the two apps cannot drift apart.
+
+`create_app()` builds the FastAPI app (CORS, per-route metrics, /metrics,
+background workers) and registers every route whose handler is the same in
+both modes: ingestion (psycopg2 pipeline on the threadpool in both), dashboard
+stats, the live status feed and the /internal endpoints. The app modules then
+add only the routes that read or write through their own driver (psycopg2 in
+main.py, asyncpg in main_async.py), built from the helpers below.
+"""
+import json
+import time
+from datetime import datetime
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
+from starlette.routing import Match
+
+import db_postgres
+import metrics
+from batch import ingest_batch, parse_payload, BATCH_MAX_ROWS
+from chat_sessions import chat_store
+from db_postgres import init_db, parse_fields, decode_cursor, track_round_trips
+from explanation_worker import explanation_workers
+from history_partitions import history_maintainer
+from llm_cache import llm_cache
+from llm_service import resilient_client
+from loan_stats import dashboard_stats, stats_reconciler, STATS_DEFAULT_DAYS
+from models import (
+    LoanApplicationCreate,
+    LoanApplicationOut,
+    LoanBatchResponse,
+    ManualReviewBatchRequest,
+    ManualReviewBatchResponse,
+    ManualReviewBatchResult,
+)
+from rule_engine import rule_engine, PolicyError
+from services import generate_application_data, review_decisions, DuplicateApplicationError, REVIEW_BATCH_MAX
+from status_events import status_relay, astream_events, parse_statuses
+from utils import json_default, sse_event, SSE_HEADERS
+
+
+# ============================================================
+# APP + SHARED ROUTES
+# ============================================================
+def create_app(title: str, count_queries: bool = True) -> FastAPI:
+    """
+    `count_queries`: record loan_http_request_db_queries. Only psycopg2 statements
+    are counted, and only with DB_COUNT_ROUND_TRIPS=true; the async app passes
+    False since its asyncpg reads would be missing from the count.
+    """
+    app = FastAPI(title=title)
+    count_queries = count_queries and db_postgres.DB_COUNT_ROUND_TRIPS
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],            # Allow all frontend origins
+        allow_credentials=True,
+        allow_methods=["*"],            # GET, POST, PUT, DELETE, OPTIONS
+        allow_headers=["*"],            # All headers
+    )
+
+    # ---- METRICS: per-route latency and (sync app, counting on) DB round trips
+    def _route_template(request: Request) -> str:
+        """`/loan/{application_id}` rather than the raw path, to keep label cardinality bounded."""
+        route = request.scope.get("route")
+        if route is None:
+            for candidate in app.router.routes:
+                if candidate.matches(request.scope)[0] == Match.FULL:
+                    route = candidate
+                    break
+        return getattr(route, "path", "unmatched")
+
+    @app.middleware("http")
+    async def record_request_metrics(request: Request, call_next):
+        if not metrics.METRICS_ENABLED:
+            return await call_next(request)
+        started = time.perf_counter()
+        status = 500
+        with track_round_trips() as queries:
+            try:
+                response = await call_next(request)
+                status = response.status_code
+                return response
+            finally:
+                route = _route_template(request)
+                metrics.HTTP_REQUEST_SECONDS.observe(
+                    time.perf_counter() - started, request.method, route, str(status)
+                )
+                if count_queries:
+                    metrics.HTTP_REQUEST_QUERIES.observe(queries[0], request.method, route)
+
+    @app.get("/metrics")
+    async def metrics_endpoint():
+        return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+    init_db()
+
+    # the app modules add their own pool setup / teardown handlers after these
+    @app.on_event("startup")
+    async def start_background_workers():
+        explanation_workers.start()
+        stats_reconciler.start()
+        history_maintainer.start()
+        rule_engine.start()
+        chat_store.follow_status_events()
+
+    @app.on_event("shutdown")
+    async def stop_background_workers():
+        explanation_workers.stop()
+        stats_reconciler.stop()
+        history_maintainer.stop()
+        rule_engine.stop()
+        status_relay.stop()
+
+    # ---- CUSTOMER: CREATE APPLICATION
+    @app.post("/loan/", response_model=LoanApplicationOut)
+    async def create_loan_application(request: LoanApplicationCreate):
+        # PAN reservation, scoring, status history and decision run in one psycopg2 transaction
+        try:
+            record = await run_in_threadpool(generate_application_data, request)
+        except DuplicateApplicationError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        return LoanApplicationOut(**record)
+
+    # ---- PARTNER: BULK CREATE APPLICATIONS (JSON array or NDJSON body)
+    @app.post("/loan/batch", response_model=LoanBatchResponse)
+    async def create_loan_applications_batch(request: Request):
+        body = (await request.body()).decode("utf-8")
+        try:
+            items = parse_payload(body)
+        except json.JSONDecodeError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON / NDJSON payload: {e}")
+
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array or NDJSON stream")
+        if len(items) > BATCH_MAX_ROWS:
+            raise HTTPException(status_code=413, detail=f"Batch exceeds {BATCH_MAX_ROWS} rows")
+
+        try:
+            summary = await run_in_threadpool(ingest_batch, items)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        return LoanBatchResponse(**summary)
+
+    # ---- OFFICER: DASHBOARD AGGREGATES (declared before /loan/{application_id})
+    @app.get("/loan/stats")
+    async def loan_dashboard_stats(days: int = STATS_DEFAULT_DAYS):
+        return await run_in_threadpool(dashboard_stats, days)
+
+    # ---- OFFICER: LIVE STATUS FEED (SSE; declared before /loan/{application_id})
+    @app.get("/loan/events")
+    async def loan_status_events(request: Request, after: int | None = None, status: str | None = None):
+        # resume from ?after= or the EventSource Last-Event-ID header. Async in both apps:
+        # a sync generator would hold one of the 40 threadpool threads per open dashboard
+        if after is None and request.headers.get("last-event-id", "").isdigit():
+            after = int(request.headers["last-event-id"])
+        return StreamingResponse(
+            astream_events(after, parse_statuses(status)),
+            media_type="text/event-stream",
+            headers=SSE_HEADERS,
+        )
+
+    # ---- INTERNAL: counters of the in-process components
+    @app.get("/internal/llm-cache")
+    async def llm_cache_stats():
+        return llm_cache.stats()
+
+    @app.get("/internal/explanations")
+    async def explanation_worker_stats():
+        return explanation_workers.stats()
+
+    @app.get("/internal/llm-client")
+    async def llm_client_stats():
+        # concurrency / retries / circuit breaker
+        return resilient_client.stats()
+
+    @app.get("/internal/policy")
+    async def policy_stats():
+        # version, rule hits, sampled latency
+        return rule_engine.stats()
+
+    @app.post("/internal/policy/reload")
+    async def reload_policy():
+        try:
+            reloaded = await run_in_threadpool(rule_engine.reload, True)
+        except PolicyError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        if not reloaded:
+            raise HTTPException(status_code=422, detail=rule_engine.last_error or "Policy not reloaded")
+        return {"version": rule_engine.policy.version}
+
+    @app.get("/internal/status-events")
+    async def status_event_stats():
+        # LISTEN/NOTIFY outbox relay
+        return status_relay.stats()
+
+    @app.get("/internal/chat-sessions")
+    async def chat_session_stats():
+        return chat_store.stats()
+
+    return app
+
+
+# ============================================================
+# HELPERS FOR THE DRIVER-SPECIFIC ROUTES
+# ============================================================
+def listing_params(
+    limit: int = 50,
+    cursor: str | None = None,
+    fields: str | None = None,
+    risk_level: str | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    stream: bool = False,
+) -> dict:
+    """Query parameters of the officer listings (use with Depends)."""
+    return {
+        "limit": limit, "cursor": cursor, "fields": fields, "risk_level": risk_level,
+        "created_from": created_from, "created_to": created_to, "stream": stream,
+    }
+
+
+
+def split_listing(params: dict, status: str | None) -> tuple:
+    """(fields, limit, stream, filters); validates fields / cursor eagerly for streamed listings."""
+    params = dict(params)
+    fields, limit, stream = params.pop("fields"), params.pop("limit"), params.pop("stream")
+    filters = {**params, "status": status}
+    if stream:
+        # the generator only runs once the response has started; report bad input as 400 now
+        try:
+            parse_fields(fields)
+            if filters.get("cursor"):
+                decode_cursor(filters["cursor"])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return fields, limit, stream, filters
+
+
+def ndjson_response(lines) -> StreamingResponse:
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+
+def ndjson_line(row: dict) -> str:
+    return json.dumps(row, default=json_default) + "\n"
+
+
+def prompt_row_or_404(row: dict | None) -> tuple:
+    """(row, history) of an application read with PROMPT_COLUMNS."""
+    if not row:
+        raise HTTPException(status_code=404, detail="Application not found")
+    return row, row.pop("history")
+
+
+def agent_sim(row: dict) -> dict:
+    return {
+        "credit_score": row["credit_score"],
+        "risk_level": row["risk_level"],
+        "decision_reason": row["decision_reason"]
+    }
+
+
+def sse_relay(chunks, field: str, extra: dict | None = None):
+    """Relay LLM tokens as `delta` events, then one `done` event with the full text (plus `extra`)."""
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield sse_event({"delta": chunk}, event="delta")
+    yield sse_event({field: "".join(parts).strip(), **(extra or {})}, event="done")
+
+
+async def asse_relay(chunks, field: str, extra: dict | None = None):
+    parts = []
+    async for chunk in chunks:
+        parts.append(chunk)
+        yield sse_event({"delta": chunk}, event="delta")
+    yield sse_event({field: "".join(parts).strip(), **(extra or {})}, event="done")
+
+
+def sse_response(events, headers: dict | None = None) -> StreamingResponse:
+    return StreamingResponse(events, media_type="text/event-stream", headers={**SSE_HEADERS, **(headers or {})})
+
+
+def chat_session_headers(session) -> dict:
+    return {"X-Chat-Session-Id": session.session_id}
+
+
+def review_batch_decisions(req: ManualReviewBatchRequest) -> list:
+    if len(req.reviews) > REVIEW_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {REVIEW_BATCH_MAX} reviews per request")
+    return review_decisions_or_400([(r.application_id, r.action, r.notes) for r in req.reviews], req.officer)
+
+
+def review_decisions_or_400(reviews: list, officer: str) -> list:
+    try:
+        return review_decisions(reviews, officer)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def review_batch_response(decisions: list, reviewed: dict) -> ManualReviewBatchResponse:
+    """`reviewed`: application_id → new status for the rows the UPDATE matched."""
+    return ManualReviewBatchResponse(
+        total=len(decisions),
+        reviewed=len(reviewed),
+        skipped=len(decisions) - len(reviewed),
+        results=[
+            ManualReviewBatchResult(
+                application_id=application_id,
+                status=reviewed.get(application_id),
+                error=None if application_id in reviewed else "Not found or not pending manual review",
+            )
+            for application_id, *_ in decisions
+        ],
+    )
+
+
+def review_not_applied(exists: bool):
+    """The single review UPDATE matched nothing: unknown application or no longer pending."""
+    if not exists:
+        raise HTTPException(status_code=404, detail="Application not found")
+    raise HTTPException(status_code=400, detail="Application is not pending manual review")
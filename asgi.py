@@ -0,0 +1,17 @@
+# asgi.py
+"""
+Pick the API implementation by configuration:
+
+    API_MODE=sync  uvicorn asgi:app     # main.py, threadpool + psycopg2 (default)
+    API_MODE=async uvicorn asgi:app     # main_async.py, asyncpg + AsyncGroq
+"""
+import os
+
+API_MODE = os.getenv("API_MODE", "sync").lower()
+
+if API_MODE == "async":
+    from main_async import app
+elif API_MODE == "sync":
+    from main import app
+else:
+    raise RuntimeError(f"Unknown API_MODE {API_MODE!r} (expected 'sync' or 'async')")
@@ -0,0 +1,274 @@
+# batch.py
+"""
+Bulk loan ingestion.
+
+    python batch.py applications.ndjson                  # NDJSON, one application per line
+    python batch.py applications.json --chunk-size 500   # JSON array, loaded whole
+    cat applications.ndjson | python batch.py -
+
+Each chunk is validated, scored and decided in memory and persisted in one
+transaction: credit profiles and known active PANs are resolved with
+set-based queries, applications are COPYed into a temp staging table and
+admitted with one INSERT ... ON CONFLICT DO NOTHING against the
+unique_active_pan index (a concurrent POST /loan/ that wins the race turns
+the row into a `conflict`, not a failed chunk). loan_status_history is
+written with COPY and credit_profile with a single execute_values upsert.
+
+NDJSON input is read line by line and submitted in chunks, so the CLI never
+holds more than one chunk in memory; a JSON array is loaded whole.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+
+from pydantic import ValidationError
+from psycopg2.extras import execute_values
+
+from db_postgres import (
+    transaction,
+    copy_rows,
+    APPLICATION_COLUMNS,
+    HISTORY_COLUMNS,
+)
+from models import LoanApplicationCreate
+from services import ACTIVE_STATUSES, new_application_data, evaluate_application
+from explanation_worker import explanation_workers
+from pan_counts import recent_counts
+from utils import apply_credit_rules, new_credit_score
+
+BATCH_MAX_ROWS = int(os.getenv("BATCH_MAX_ROWS", "10000"))
+
+
+def parse_payload(text: str) -> list:
+    """Accept either a JSON array or NDJSON (one JSON object per line)."""
+    text = text.strip()
+    if not text:
+        return []
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def iter_payload(f):
+    """Yield applications from a file: NDJSON one line at a time, a JSON array loaded whole."""
+    first = True
+    for number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        if first and line.lstrip().startswith("["):
+            yield from json.loads(line + f.read())
+            return
+        first = False
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"line {number}: {e}") from e
+
+
+def ingest_batch(items: list) -> dict:
+    """Validate, score, decide and persist a list of applications in one transaction."""
+    started = time.perf_counter()
+    results = [None] * len(items)
+
+    # -----------------------------------
+    # 1. Request validation (pydantic)
+    # -----------------------------------
+    requests = []
+    for i, raw in enumerate(items):
+        try:
+            req = raw if isinstance(raw, LoanApplicationCreate) else LoanApplicationCreate(**raw)
+        except (ValidationError, TypeError) as e:
+            results[i] = {"index": i, "status": "invalid", "error": str(e)}
+            continue
+        requests.append((i, req))
+
+    applications = []
+    history_rows = []
+    pending_explanations = []
+
+    with transaction() as conn:
+        cur = conn.cursor()
+        pans = list({req.pan for _, req in requests})
+
+        # -----------------------------------
+        # 2. Set-based lookups
+        # -----------------------------------
+        cur.execute("""
+            SELECT DISTINCT pan FROM loan_applications
+            WHERE pan = ANY(%s) AND status IN %s;
+        """, (pans, ACTIVE_STATUSES))
+        active = {row[0] for row in cur.fetchall()}
+
+        # Lock existing profiles for the rest of the batch, in a fixed order so
+        # overlapping batches cannot deadlock on each other
+        cur.execute("""
+            SELECT pan, credit_score FROM credit_profile
+            WHERE pan = ANY(%s)
+            ORDER BY pan
+            FOR UPDATE;
+        """, (pans,))
+        profiles = dict(cur.fetchall())
+
+        recent = recent_counts(cur, pans)
+
+        # (row index, pan, score) in batch order; only rows that are admitted
+        # in step 4 reach credit_profile
+        scored = []
+
+        def score_from_profiles(pan, income, loan_amount):
+            if pan in profiles:
+                score = apply_credit_rules(profiles[pan], recent.get(pan, 0), income, loan_amount)
+            else:
+                score = new_credit_score()
+            profiles[pan] = score
+            scored.append((i, pan, score))      # i: the row being evaluated below
+            return {"credit_score": score}
+
+        # -----------------------------------
+        # 3. Validation / scoring / decision
+        # -----------------------------------
+        for i, req in requests:
+            if req.pan in active:
+                results[i] = {
+                    "index": i,
+                    "status": "conflict",
+                    "error": f"Active application already exists for PAN {req.pan}",
+                }
+                continue
+
+            data = new_application_data(req)
+            history = []
+            evaluate_application(data, history, credit_score_fn=score_from_profiles)
+
+            # Later rows in the batch see this application in the 30-day window / active set
+            recent[req.pan] = recent.get(req.pan, 0) + 1
+            if data["status"] in ACTIVE_STATUSES:
+                active.add(req.pan)
+
+            applications.append(tuple(data[c] for c in APPLICATION_COLUMNS))
+            if data["llm_status_explanation_state"] == "pending":
+                pending_explanations.append(data["application_id"])
+            history_rows.extend(
+                (data["application_id"], h["old_status"], h["new_status"], h["changed_at"])
+                for h in history
+            )
+            results[i] = {
+                "index": i,
+                "application_id": data["application_id"],
+                "status": data["status"],
+                "credit_score": data["credit_score"],
+                "risk_level": data["risk_level"],
+                "decision_reason": data["decision_reason"],
+            }
+
+        # -----------------------------------
+        # 4. Bulk persistence
+        # -----------------------------------
+        admitted = set()
+        if applications:
+            columns = ", ".join(APPLICATION_COLUMNS)
+            cur.execute("""
+                CREATE TEMP TABLE batch_applications
+                (LIKE loan_applications INCLUDING DEFAULTS)
+                ON COMMIT DROP;
+            """)
+            copy_rows(cur, "batch_applications", APPLICATION_COLUMNS, applications)
+            # The SELECT in step 2 only saw committed rows: an active application
+            # for the same PAN committed since then is skipped here instead of
+            # aborting the whole chunk with a unique violation.
+            cur.execute(f"""
+                INSERT INTO loan_applications ({columns})
+                SELECT {columns} FROM batch_applications
+                ON CONFLICT DO NOTHING
+                RETURNING application_id;
+            """)
+            admitted = {row[0] for row in cur.fetchall()}
+            copy_rows(cur, "loan_status_history", HISTORY_COLUMNS,
+                      [row for row in history_rows if row[0] in admitted])
+
+        for i, req in requests:
+            application_id = results[i].get("application_id")
+            if application_id and application_id not in admitted:
+                results[i] = {
+                    "index": i,
+                    "status": "conflict",
+                    "error": f"Active application already exists for PAN {req.pan}",
+                }
+        pending_explanations = [a for a in pending_explanations if a in admitted]
+
+        # Last admitted score per PAN; a PAN whose rows all conflicted keeps its profile
+        final_scores = {pan: score for i, pan, score in scored if results[i].get("application_id")}
+        if final_scores:
+            execute_values(cur, """
+                INSERT INTO credit_profile (pan, credit_score, last_updated)
+                VALUES %s
+                ON CONFLICT (pan) DO UPDATE
+                SET credit_score = EXCLUDED.credit_score,
+                    last_updated = EXCLUDED.last_updated;
+            """, sorted(final_scores.items()), template="(%s, %s, NOW())")
+
+    # Status explanations are generated in the background; when the queue is
+    # full (or no workers run in this process) the API's sweep picks them up.
+    if explanation_workers.running:
+        for application_id in pending_explanations:
+            explanation_workers.enqueue(application_id)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "total": len(items),
+        "accepted": len(admitted),
+        "failed": len(items) - len(admitted),
+        "elapsed_seconds": round(elapsed, 4),
+        "rows_per_sec": round(len(items) / elapsed, 1) if elapsed > 0 else 0.0,
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-ingest loan applications (JSON array or NDJSON).")
+    parser.add_argument("path", help="input file, or - for stdin")
+    parser.add_argument("--chunk-size", type=int, default=BATCH_MAX_ROWS,
+                        help=f"applications persisted per transaction (at most BATCH_MAX_ROWS={BATCH_MAX_ROWS})")
+    parser.add_argument("--results", action="store_true", help="print per-row results")
+    args = parser.parse_args(argv)
+    if not 0 < args.chunk_size <= BATCH_MAX_ROWS:
+        parser.error(f"--chunk-size must be between 1 and {BATCH_MAX_ROWS}")
+
+    started = time.perf_counter()
+    total = accepted = failed = 0
+    error = None
+    f = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8")
+    try:
+        rows = iter_payload(f)
+        while chunk := list(itertools.islice(rows, args.chunk_size)):
+            summary = ingest_batch(chunk)
+            accepted += summary["accepted"]
+            failed += summary["failed"]
+            if args.results:
+                for row in summary["results"]:
+                    print(json.dumps({**row, "index": row["index"] + total}))
+            total += len(chunk)
+    except ValueError as e:
+        # Chunks before the bad line are already committed
+        error = f"stopped at {e}; {total} applications were submitted before it"
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+    elapsed = time.perf_counter() - started
+    print(json.dumps({
+        "total": total,
+        "accepted": accepted,
+        "failed": failed,
+        "elapsed_seconds": round(elapsed, 4),
+        "rows_per_sec": round(total / elapsed, 1) if elapsed > 0 else 0.0,
+    }), file=sys.stderr)
+    if error:
+        sys.exit(error)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,442 @@
+# benchmark.py
+"""
+Benchmark suite for the ingestion pipeline and the read / review endpoints.
+
+    python benchmark.py                                  # all scenarios, compare with the baseline
+    python benchmark.py --fresh-db --save-baseline       # throwaway database, record a new baseline
+    python benchmark.py --scenarios post_loan,get_loan --concurrency 16 --requests 2000
+    python benchmark.py --url http://localhost:8000      # HTTP scenarios against a running API
+
+Every scenario is driven by a closed-loop load generator: `--concurrency`
+workers each send a request, wait for the answer and send the next one until
+`--requests` have completed. Reported per scenario: throughput, p50/p95/p99
+latency, errors and DB round trips per request (statements, COPYs and
+commits counted by db_postgres when run in-process, including background
+work the requests trigger, such as status explanations).
+
+The LLM is stubbed in-process (fixed text after `--llm-latency` ms); against
+a live API point GROQ_BASE_URL at fake_groq.py instead. Payloads are the
+sample cases of test.py with fresh PANs and jittered amounts.
+
+A run fails (exit 1) when a scenario regresses against the stored baseline:
+throughput or p95 worse than BENCH_TOLERANCE (default 25%), or more than half
+a round trip per request more than recorded.
+"""
+import argparse
+import json
+import os
+import queue
+import random
+import string
+import sys
+import threading
+import time
+import uuid
+
+BENCH_BASELINE_PATH = os.getenv(
+    "BENCH_BASELINE_PATH", os.path.join(os.path.dirname(__file__), "benchmark_baseline.json")
+)
+BENCH_TOLERANCE = float(os.getenv("BENCH_TOLERANCE", "0.25"))
+BENCH_ROUND_TRIP_SLACK = 0.5
+
+# Sample cases from test.py
+SAMPLE_CASES = [
+    {"name": "Approval Case", "age": 25, "income": 50000, "loan_amount": 100000},
+    {"name": "Reject Case", "age": 30, "income": 50000, "loan_amount": 100000},
+    {"name": "Manual Review User", "age": 25, "income": 5000, "loan_amount": 40000},
+]
+MANUAL_REVIEW_CASE = SAMPLE_CASES[2]
+
+SCENARIOS = ("run_agent", "generate_application_data", "post_loan", "get_loan", "list_all", "review")
+HTTP_SCENARIOS = ("post_loan", "get_loan", "list_all", "review")
+
+
+# -----------------------------
+# PAYLOADS
+# -----------------------------
+def random_pan(rng: random.Random) -> str:
+    letters = string.ascii_uppercase
+    return (
+        "".join(rng.choice(letters) for _ in range(5))
+        + "".join(rng.choice(string.digits) for _ in range(4))
+        + rng.choice(letters)
+    )
+
+
+def make_payload(rng: random.Random, case: dict | None = None) -> dict:
+    """A sample case with a fresh PAN and amounts jittered by ±10%."""
+    case = case or rng.choice(SAMPLE_CASES)
+    return {
+        "name": case["name"],
+        "age": case["age"],
+        "income": round(case["income"] * rng.uniform(0.9, 1.1), 2),
+        "loan_amount": round(case["loan_amount"] * rng.uniform(0.9, 1.1), 2),
+        "pan": random_pan(rng),
+    }
+
+
+# -----------------------------
+# LLM STUB
+# -----------------------------
+def stub_llm(latency_ms: float):
+    """Replace the Groq calls in llm_service with a fixed response."""
+    import asyncio
+    import llm_service
+
+    text = "Stubbed explanation for benchmarking."
+
+    def generate(prompt, application=None):
+        time.sleep(latency_ms / 1000)
+        return text
+
+    async def agenerate(prompt, application=None):
+        await asyncio.sleep(latency_ms / 1000)
+        return text
+
+    def generate_stream(prompt, application=None):
+        yield generate(prompt, application)
+
+    async def agenerate_stream(prompt, application=None):
+        yield await agenerate(prompt, application)
+
+    llm_service._generate = generate
+    llm_service._agenerate = agenerate
+    llm_service._generate_stream = generate_stream
+    llm_service._agenerate_stream = agenerate_stream
+
+
+# -----------------------------
+# CLOSED-LOOP LOAD GENERATOR
+# -----------------------------
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def closed_loop(operation, requests: int, concurrency: int, round_trips=None, seed: int = 0) -> dict:
+    """
+    Run `operation(rng)` `requests` times from `concurrency` workers, each
+    issuing its next call only after the previous one returned.
+    `operation` returns False (or raises) on failure.
+    """
+    remaining = [requests]
+    lock = threading.Lock()
+    latencies = []
+    error_examples = []
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        local = []
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    break
+                remaining[0] -= 1
+            started = time.perf_counter()
+            try:
+                ok = operation(rng) is not False
+            except Exception as e:
+                ok = False
+                with lock:
+                    if len(error_examples) < 5:
+                        error_examples.append(repr(e))
+            if ok:
+                local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+
+    trips_before = round_trips() if round_trips else None
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    completed = len(latencies)
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": requests - completed,
+        "error_examples": error_examples,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(completed / wall, 1) if wall > 0 else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "round_trips_per_request": (
+            round((round_trips() - trips_before) / requests, 2) if round_trips else None
+        ),
+    }
+
+
+# -----------------------------
+# TARGETS
+# -----------------------------
+class InProcessTarget:
+    """The sync app (main.py) through Starlette's TestClient, sharing one event loop."""
+
+    def __init__(self):
+        from fastapi.testclient import TestClient
+        import main
+
+        self._client = TestClient(main.app)
+        self._client.__enter__()       # runs startup (explanation workers)
+
+    def request(self, method: str, path: str, payload: dict | None = None):
+        response = self._client.request(method, path, json=payload)
+        return response.status_code, response.json() if response.content else None
+
+    def close(self):
+        self._client.__exit__(None, None, None)
+
+
+class HttpTarget:
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+
+    def request(self, method: str, path: str, payload: dict | None = None):
+        import urllib.error
+        import urllib.request
+
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        req = urllib.request.Request(
+            self.base_url + path, data=data, method=method,
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=60) as response:
+                body = response.read()
+                return response.status, json.loads(body) if body else None
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+    def close(self):
+        pass
+
+
+# -----------------------------
+# SCENARIOS
+# -----------------------------
+class Suite:
+    def __init__(self, target, in_process: bool, requests: int, concurrency: int, seed: int):
+        self.target = target
+        self.in_process = in_process
+        self.requests = requests
+        self.concurrency = concurrency
+        self.seed = seed
+        self.created_ids = []
+        self._ids_lock = threading.Lock()
+        self._review_ids = queue.Queue()
+
+        self.round_trips = None
+        if in_process:
+            from db_postgres import round_trips
+            self.round_trips = round_trips
+
+    def _post(self, payload: dict):
+        status, body = self.target.request("POST", "/loan/", payload)
+        if status != 200:
+            return None
+        with self._ids_lock:
+            self.created_ids.append(body["application_id"])
+        return body
+
+    def _ensure_ids(self, minimum: int = 200):
+        rng = random.Random(self.seed + 1)
+        while len(self.created_ids) < minimum:
+            if self._post(make_payload(rng)) is None:
+                raise RuntimeError("could not create applications for the read scenarios")
+
+    def _prepare_reviews(self):
+        rng = random.Random(self.seed + 2)
+        while self._review_ids.qsize() < self.requests:
+            body = self._post(make_payload(rng, MANUAL_REVIEW_CASE))
+            if body is None:
+                raise RuntimeError("could not create applications for the review scenario")
+            if body["status"] == "manual_review":
+                self._review_ids.put(body["application_id"])
+
+    # ---- operations (rng → truthy / False)
+    def op_run_agent(self, rng):
+        from agent import run_agent
+
+        application = make_payload(rng)
+        score = rng.randint(500, 800)
+        return run_agent(application, credit_score_fn=lambda pan, income, loan: {"credit_score": score})
+
+    def op_generate_application_data(self, rng):
+        from models import LoanApplicationCreate
+        from services import generate_application_data
+
+        record = generate_application_data(LoanApplicationCreate(**make_payload(rng)))
+        with self._ids_lock:
+            self.created_ids.append(record["application_id"])
+        return record
+
+    def op_post_loan(self, rng):
+        return self._post(make_payload(rng)) is not None
+
+    def op_get_loan(self, rng):
+        status, _ = self.target.request("GET", f"/loan/{rng.choice(self.created_ids)}")
+        return status == 200
+
+    def op_list_all(self, rng):
+        status, _ = self.target.request("GET", "/loan/all?limit=50")
+        return status == 200
+
+    def op_review(self, rng):
+        application_id = self._review_ids.get_nowait()
+        status, _ = self.target.request("PUT", f"/loan/{application_id}/review", {
+            "action": rng.choice(["approve", "reject"]),
+            "notes": "benchmark",
+            "officer": "bench",
+        })
+        return status == 200
+
+    def run(self, name: str) -> dict:
+        if name in ("get_loan", "list_all"):
+            self._ensure_ids()
+        if name == "review":
+            self._prepare_reviews()
+        operation = getattr(self, f"op_{name}")
+        return closed_loop(operation, self.requests, self.concurrency,
+                           round_trips=self.round_trips, seed=self.seed)
+
+
+# -----------------------------
+# BASELINES
+# -----------------------------
+def compare(results: dict, baseline: dict, tolerance: float = BENCH_TOLERANCE) -> list:
+    """Regressions of `results` against `baseline` (same concurrency only)."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base or base.get("concurrency") != result["concurrency"]:
+            continue
+        if result["errors"]:
+            regressions.append(f"{name}: {result['errors']} failed requests")
+        if result["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {result['throughput_rps']} rps < baseline {base['throughput_rps']}"
+            )
+        if result["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {result['p95_ms']} ms > baseline {base['p95_ms']}")
+        rt, base_rt = result.get("round_trips_per_request"), base.get("round_trips_per_request")
+        if rt is not None and base_rt is not None and rt > base_rt + BENCH_ROUND_TRIP_SLACK:
+            regressions.append(f"{name}: {rt} round trips/request > baseline {base_rt}")
+    return regressions
+
+
+def _create_database():
+    """Disposable database on the configured server; schema comes from init_db at import of main."""
+    import db_postgres
+
+    name = f"loan_bench_{uuid.uuid4().hex[:8]}"
+    conn = db_postgres.get_connection()
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f"CREATE DATABASE {name};")
+    conn.close()
+    original, db_postgres.DB_NAME = db_postgres.DB_NAME, name
+    return name, original
+
+
+def _drop_database(name: str, original: str):
+    import db_postgres
+
+    db_postgres.close_pool()
+    db_postgres.DB_NAME = original
+    conn = db_postgres.get_connection()
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f"DROP DATABASE IF EXISTS {name} WITH (FORCE);")
+    conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Loan API benchmark suite.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma-separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="closed-loop workers")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="benchmark a running API instead of the in-process app")
+    parser.add_argument("--fresh-db", action="store_true", help="run against a throwaway database")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="stubbed LLM latency (ms)")
+    parser.add_argument("--baseline", default=BENCH_BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--output", help="write the full report as JSON")
+    args = parser.parse_args(argv)
+
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    if args.url:
+        skipped = [n for n in names if n not in HTTP_SCENARIOS]
+        if skipped:
+            print("skipping in-process scenarios with --url:", ", ".join(skipped), file=sys.stderr)
+        names = [n for n in names if n in HTTP_SCENARIOS]
+
+    fresh = None
+    if not args.url:
+        import db_postgres
+
+        db_postgres.DB_COUNT_ROUND_TRIPS = True
+        if args.fresh_db:
+            fresh = _create_database()
+        stub_llm(args.llm_latency)
+
+    target = HttpTarget(args.url) if args.url else InProcessTarget()
+    results = {}
+    try:
+        suite = Suite(target, in_process=not args.url, requests=args.requests,
+                      concurrency=args.concurrency, seed=args.seed)
+        for name in names:
+            results[name] = suite.run(name)
+            r = results[name]
+            print(f"{name:<28} {r['throughput_rps']:>9} rps  p50 {r['p50_ms']:>8} ms  "
+                  f"p95 {r['p95_ms']:>8} ms  p99 {r['p99_ms']:>8} ms  "
+                  f"rt/req {r['round_trips_per_request']}  errors {r['errors']}")
+    finally:
+        target.close()
+        if fresh:
+            _drop_database(*fresh)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "target": args.url or "in-process",
+        "llm_latency_ms": args.llm_latency,
+        "scenarios": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print("baseline saved:", args.baseline)
+        return
+
+    if not os.path.exists(args.baseline):
+        print("no baseline yet (run with --save-baseline)")
+        return
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline)
+    for line in regressions:
+        print("REGRESSION", line)
+    if regressions:
+        sys.exit(1)
+    print("no regressions against", args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+# chat_sessions.py
+"""
+Conversation memory and cached application context for POST /loan/{id}/chat.
+
+- The application part of the chat prompt (prompts.chat_context: applicant,
+  decision, budgeted timeline) is rendered once per application and kept in an
+  LRU for CHAT_CONTEXT_TTL (terminal applications: until evicted). A chat turn
+  only reads Postgres when that context is missing.
+- The context is dropped on status change: directly by services.after_status_change
+  in this worker, and through the LISTEN/NOTIFY relay (status_events.py) for
+  changes made by any other process.
+- A session remembers the last CHAT_SESSION_TURNS question/answer pairs of one
+  application's conversation. It lives in an in-memory LRU with an idle TTL, and
+  also in loan_chat_sessions (migration 10) with CHAT_SESSION_PERSIST=true, so
+  any worker can continue it.
+
+    python chat_sessions.py stats
+    python chat_sessions.py purge     # delete persisted sessions idle for longer than CHAT_SESSION_TTL
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import uuid
+from collections import deque
+
+from db_postgres import transaction
+from llm_cache import LRUCache, TERMINAL_STATUSES
+from llm_service import is_llm_failure
+from prompts import chat_context, truncate, PROMPT_MESSAGE_MAX_TOKENS
+from status_events import status_relay
+
+CHAT_SESSION_TTL = float(os.getenv("CHAT_SESSION_TTL", "1800"))          # idle seconds before a session is forgotten
+CHAT_SESSION_MAX = int(os.getenv("CHAT_SESSION_MAX", "10000"))            # sessions kept in memory per worker
+CHAT_SESSION_TURNS = int(os.getenv("CHAT_SESSION_TURNS", "6"))            # question/answer pairs remembered
+CHAT_SESSION_PERSIST = os.getenv("CHAT_SESSION_PERSIST", "false").lower() == "true"
+CHAT_CONTEXT_TTL = float(os.getenv("CHAT_CONTEXT_TTL", "300"))            # seconds, non-terminal applications
+CHAT_CONTEXT_MAX = int(os.getenv("CHAT_CONTEXT_MAX", "2048"))
+
+
+def _new_session_id() -> str:
+    return f"cs_{uuid.uuid4().hex}"
+
+
+class ChatSession:
+    """One conversation about one application. `context` / `application` are set per request."""
+
+    def __init__(self, session_id: str, application_id: str, turns=()):
+        self.session_id = session_id
+        self.application_id = application_id
+        self.turns = deque(turns, maxlen=CHAT_SESSION_TURNS * 2)     # [{role, text}], oldest first
+        self.context = None
+        self.application = None      # {application_id, status}: tags / TTL of llm_cache entries
+
+
+# -----------------------------
+# 💬 SESSION + CONTEXT STORE
+# -----------------------------
+class ChatSessionStore:
+    def __init__(self, persist: bool = CHAT_SESSION_PERSIST):
+        self.sessions = LRUCache(CHAT_SESSION_MAX)
+        self.contexts = LRUCache(CHAT_CONTEXT_MAX)
+        self.persist = persist
+        self._lock = threading.Lock()
+        self._following = False
+        self._counters = {
+            "sessions_new": 0,
+            "sessions_resumed": 0,
+            "context_hits": 0,
+            "context_misses": 0,
+            "invalidations": 0,
+            "turns_remembered": 0,
+            "errors": 0,
+        }
+
+    def _count(self, name: str, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def open(self, application_id: str, session_id: str | None = None) -> ChatSession:
+        """
+        The session `session_id` if it exists and belongs to this application,
+        otherwise a new one (stored on the first remembered turn). The cached
+        context is attached when there is one; else the caller loads the
+        application and calls attach_context().
+        """
+        session = self._find(session_id) if session_id else None
+        if session is None or session.application_id != application_id:
+            session = ChatSession(_new_session_id(), application_id)
+            self._count("sessions_new")
+        else:
+            self._count("sessions_resumed")
+
+        cached = self.contexts.get(application_id)
+        if cached is None:
+            session.context = session.application = None
+            self._count("context_misses")
+        else:
+            session.context, status = cached
+            session.application = {"application_id": application_id, "status": status}
+            self._count("context_hits")
+        return session
+
+    def attach_context(self, session: ChatSession, app: dict, history: list):
+        context = chat_context(app, history)
+        ttl = None if app["status"] in TERMINAL_STATUSES else CHAT_CONTEXT_TTL
+        self.contexts.set(app["application_id"], (context, app["status"]), ttl, app["application_id"])
+        session.context = context
+        session.application = {"application_id": app["application_id"], "status": app["status"]}
+
+    def remember(self, session: ChatSession, question: str, answer: str):
+        """Append one exchange; failed LLM answers are not remembered."""
+        if is_llm_failure(answer):
+            return
+        session.turns.append({"role": "customer", "text": truncate(question.strip(), PROMPT_MESSAGE_MAX_TOKENS)})
+        session.turns.append({"role": "assistant", "text": answer})
+        self.sessions.set(session.session_id, session, CHAT_SESSION_TTL)
+        self._count("turns_remembered")
+        if self.persist:
+            self._db_set(session)
+
+    def stream_turn(self, session: ChatSession, question: str, chunks):
+        """Pass LLM chunks through; remember the assembled answer once the stream ends."""
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        self.remember(session, question, "".join(parts).strip())
+
+    # ---- async app: only the persistent tier blocks, keep it off the event loop
+    async def aopen(self, application_id: str, session_id: str | None = None) -> ChatSession:
+        if self.persist:
+            return await asyncio.to_thread(self.open, application_id, session_id)
+        return self.open(application_id, session_id)
+
+    async def aremember(self, session: ChatSession, question: str, answer: str):
+        if self.persist:
+            await asyncio.to_thread(self.remember, session, question, answer)
+        else:
+            self.remember(session, question, answer)
+
+    async def astream_turn(self, session: ChatSession, question: str, chunks):
+        parts = []
+        async for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        await self.aremember(session, question, "".join(parts).strip())
+
+    # ---- invalidation
+    def invalidate(self, application_id: str):
+        self._count("invalidations", self.contexts.invalidate_application(application_id))
+
+    def follow_status_events(self):
+        """Drop contexts on status changes committed by any process (one LISTEN connection)."""
+        with self._lock:
+            if self._following:
+                return
+            self._following = True
+        status_relay.add_listener(self._on_status_events)
+        status_relay.start()
+
+    def _on_status_events(self, events: list):
+        for application_id in {e["application_id"] for e in events}:
+            self.invalidate(application_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+        stats["memory_sessions"] = len(self.sessions)
+        stats["memory_contexts"] = len(self.contexts)
+        stats["persist"] = self.persist
+        return stats
+
+    # ---- persistent tier (own connection: never joins / aborts the caller's transaction)
+    def _find(self, session_id: str) -> ChatSession | None:
+        session = self.sessions.get(session_id)
+        if session is None and self.persist:
+            session = self._db_get(session_id)
+            if session is not None:
+                self.sessions.set(session_id, session, CHAT_SESSION_TTL)
+        return session
+
+    def _db_get(self, session_id: str) -> ChatSession | None:
+        try:
+            with transaction(independent=True) as conn:
+                cur = conn.cursor()
+                cur.execute("""
+                    SELECT application_id, turns FROM loan_chat_sessions
+                    WHERE session_id = %s AND updated_at > NOW() - make_interval(secs => %s);
+                """, (session_id, CHAT_SESSION_TTL))
+                row = cur.fetchone()
+        except Exception as e:
+            self._count("errors")
+            print("⚠️ Chat session read failed:", e)
+            return None
+        if row is None:
+            return None
+        application_id, turns = row
+        if isinstance(turns, str):
+            turns = json.loads(turns)
+        return ChatSession(session_id, application_id, turns)
+
+    def _db_set(self, session: ChatSession):
+        try:
+            with transaction(independent=True) as conn:
+                conn.cursor().execute("""
+                    INSERT INTO loan_chat_sessions (session_id, application_id, turns)
+                    VALUES (%s, %s, %s::jsonb)
+                    ON CONFLICT (session_id) DO UPDATE
+                    SET turns = EXCLUDED.turns, updated_at = NOW();
+                """, (session.session_id, session.application_id, json.dumps(list(session.turns))))
+        except Exception as e:
+            self._count("errors")
+            print("⚠️ Chat session write failed:", e)
+
+
+chat_store = ChatSessionStore()
+
+
+def purge_expired(ttl: float = CHAT_SESSION_TTL) -> int:
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "DELETE FROM loan_chat_sessions WHERE updated_at <= NOW() - make_interval(secs => %s);", (ttl,)
+        )
+        return cur.rowcount
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if command == "purge":
+        print("purged:", purge_expired())
+    else:
+        with transaction() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT COUNT(*), COUNT(DISTINCT application_id),
+                       COALESCE(AVG(jsonb_array_length(turns)), 0)
+                FROM loan_chat_sessions
+                WHERE updated_at > NOW() - make_interval(secs => %s);
+            """, (CHAT_SESSION_TTL,))
+            active, applications, avg_turns = cur.fetchone()
+        print(json.dumps({"active": active, "applications": applications, "avg_turns": round(float(avg_turns), 1)}))
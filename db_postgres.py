@@ -1,9 +1,20 @@
 # db_postgres.py
+import base64
+import io
+import json
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2 import extensions
+from psycopg2.extras import RealDictCursor, execute_values
 import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+import metrics
+
 load_dotenv()
 
 DB_HOST = os.getenv("DB_HOST", "localhost")
@@ -12,14 +23,339 @@ DB_NAME = os.getenv("DB_NAME", "bank")
 DB_USER = os.getenv("DB_USER", "postgres")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "admin")
 
+# Connection pool tuning
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))                 # seconds to wait for a free connection
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))     # recycle connections older than this
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", "30"))  # ping if idle longer
+
+# Count every statement / COPY / commit sent to the server (benchmark.py, per-request
+# query counts in /metrics). Off by default: every cursor is wrapped in a counting
+# subclass and every statement takes a process-wide lock
+DB_COUNT_ROUND_TRIPS = os.getenv("DB_COUNT_ROUND_TRIPS", "false").lower() == "true"
+
+
+# -----------------------------
+# ROUND-TRIP COUNTING (DB_COUNT_ROUND_TRIPS)
+# -----------------------------
+_round_trips = [0]
+_round_trips_lock = threading.Lock()
+_counting_cursors = {}
+_request_round_trips = ContextVar("request_round_trips", default=None)
+
+
+def _count_round_trip():
+    with _round_trips_lock:
+        _round_trips[0] += 1
+    cell = _request_round_trips.get()
+    if cell is not None:
+        cell[0] += 1
+
+
+@contextmanager
+def track_round_trips():
+    """Count the round trips made inside this block (and tasks / threadpool calls it spawns)."""
+    cell = [0]
+    token = _request_round_trips.set(cell)
+    try:
+        yield cell
+    finally:
+        _request_round_trips.reset(token)
+
+
+def round_trips() -> int:
+    """Statements, COPYs, commits and rollbacks sent so far by this process (if counting is on)."""
+    return _round_trips[0]
+
+
+def _counting_cursor(base):
+    """Subclass of cursor class `base` (plain, RealDictCursor, ...) that counts its calls."""
+    cls = _counting_cursors.get(base)
+    if cls is None:
+        class CountingCursor(base):
+            def execute(self, *args, **kwargs):
+                _count_round_trip()
+                return super().execute(*args, **kwargs)
+
+            def executemany(self, *args, **kwargs):
+                _count_round_trip()
+                return super().executemany(*args, **kwargs)
+
+            def copy_expert(self, *args, **kwargs):
+                _count_round_trip()
+                return super().copy_expert(*args, **kwargs)
+
+        cls = _counting_cursors[base] = CountingCursor
+    return cls
+
+
+class CountingConnection(extensions.connection):
+    def cursor(self, *args, **kwargs):
+        base = kwargs.get("cursor_factory") or self.cursor_factory or extensions.cursor
+        kwargs["cursor_factory"] = _counting_cursor(base)
+        return super().cursor(*args, **kwargs)
+
+    def commit(self):
+        if self.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            _count_round_trip()
+        return super().commit()
+
+    def rollback(self):
+        if self.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            _count_round_trip()
+        return super().rollback()
+
 
 def get_connection():
+    """Open a raw, unpooled connection. Prefer `transaction()` in request code."""
     return psycopg2.connect(
         host=DB_HOST,
         port=DB_PORT,
         dbname=DB_NAME,
         user=DB_USER,
         password=DB_PASSWORD,
+        connection_factory=CountingConnection if DB_COUNT_ROUND_TRIPS else None,
+    )
+
+
+# -----------------------------
+# 🔌 CONNECTION POOL
+# -----------------------------
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections.
+    - at most `max_size` connections are open at once; callers block up to `timeout`
+    - idle connections are pinged with SELECT 1 before reuse after `health_check_interval`
+    - connections older than `max_lifetime` are closed instead of being reused
+    """
+
+    def __init__(self, min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE,
+                 timeout=DB_POOL_TIMEOUT, max_lifetime=DB_POOL_MAX_LIFETIME,
+                 health_check_interval=DB_POOL_HEALTH_CHECK_INTERVAL):
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+
+        self._cond = threading.Condition()
+        self._idle = []          # LIFO stack of (conn, last_used)
+        self._born = {}          # id(conn) -> monotonic creation time
+        self._size = 0           # open connections (idle + borrowed)
+        self._closed = False
+
+        for _ in range(min(min_size, self.max_size)):
+            self._size += 1
+            self._idle.append((self._open(), time.monotonic()))
+
+    def _open(self):
+        conn = get_connection()
+        self._born[id(conn)] = time.monotonic()
+        return conn
+
+    def _expired(self, conn) -> bool:
+        born = self._born.get(id(conn), 0)
+        return self.max_lifetime > 0 and time.monotonic() - born > self.max_lifetime
+
+    def _healthy(self, conn, last_used: float) -> bool:
+        if conn.closed or self._expired(conn):
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        self._born.pop(id(conn), None)
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout("Connection pool is closed")
+                    if self._idle:
+                        conn, last_used = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        conn = None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(f"No database connection available within {self.timeout}s")
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                try:
+                    return self._open()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+
+            if self._healthy(conn, last_used):
+                return conn
+            self._discard(conn)
+
+    def putconn(self, conn, discard: bool = False):
+        if (
+            discard
+            or self._closed
+            or conn.closed
+            or self._expired(conn)
+            or conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE
+        ):
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "max_size": self.max_size,
+            }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._discard(conn)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Process-wide pool, created lazily on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def _pool_usage() -> dict:
+    if _pool is None:
+        return {}
+    stats = _pool.stats()
+    return {("in_use",): stats["in_use"], ("idle",): stats["idle"], ("max",): stats["max_size"]}
+
+
+metrics.Gauge("loan_db_pool_connections", "psycopg2 pool connections", ("state",), callback=_pool_usage)
+
+
+# -----------------------------
+# 🔁 UNIT OF WORK
+# -----------------------------
+_current_conn: ContextVar = ContextVar("db_postgres_conn", default=None)
+
+
+@contextmanager
+def transaction(independent: bool = False):
+    """
+    Borrow one pooled connection for a unit of work.
+
+    Commits on success, rolls back on error and returns the connection to the pool.
+    Nested calls (e.g. helpers used inside a request) reuse the outer connection,
+    so a whole request runs on one connection and one transaction.
+    `independent=True` always borrows a separate connection, for side work
+    (caches, bookkeeping) that must neither join nor abort the caller's transaction.
+    """
+    conn = _current_conn.get()
+    if conn is not None and not independent:
+        yield conn
+        return
+
+    pool = get_pool()
+    conn = pool.getconn()
+    token = _current_conn.set(conn)
+    broken = False
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            broken = True
+        raise
+    finally:
+        _current_conn.reset(token)
+        pool.putconn(conn, discard=broken)
+
+
+# -----------------------------
+# 📦 BULK LOAD (COPY)
+# -----------------------------
+APPLICATION_COLUMNS = (
+    "application_id", "name", "age", "income", "loan_amount", "pan", "status",
+    "credit_score", "risk_level", "decision_reason", "llm_explanation",
+    "llm_status_explanation", "llm_status_explanation_state", "officer_notes",
+    "reviewed_by", "created_at",
+)
+
+HISTORY_COLUMNS = ("application_id", "old_status", "new_status", "changed_at")
+
+
+def _copy_value(value) -> str:
+    # CSV COPY: unquoted empty field is NULL, quoted empty field is ''
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return '"' + value.replace('"', '""') + '"'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+@metrics.timed(metrics.DB_HELPER_SECONDS)
+def copy_rows(cur, table: str, columns: tuple, rows):
+    """Stream tuples into `table` with a single COPY ... FROM STDIN round trip."""
+    buf = io.StringIO()
+    for row in rows:
+        buf.write(",".join(_copy_value(v) for v in row))
+        buf.write("\n")
+    buf.seek(0)
+    cur.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+        buf,
     )
 
 
@@ -27,182 +363,370 @@ def get_connection():
 # ⚡ INITIALISE DATABASE
 # -----------------------------
 def init_db():
-    conn = get_connection()
-    cur = conn.cursor()
-
-    # -----------------------------------
-    # 1. Main loan application table
-    # -----------------------------------
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS loan_applications (
-            application_id TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            age INTEGER NOT NULL,
-            income REAL NOT NULL,
-            loan_amount REAL NOT NULL,
-            pan TEXT NOT NULL,
-            status TEXT NOT NULL,
-            credit_score INTEGER,
-            risk_level TEXT,
-            decision_reason TEXT,
-            llm_explanation TEXT,
-            llm_status_explanation TEXT,
-            officer_notes TEXT,
-            reviewed_by TEXT,
-            created_at TIMESTAMP NOT NULL
-        );
-    """)
-
-    # -----------------------------------
-    # 2. Status history table
-    # -----------------------------------
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS loan_status_history (
-            id SERIAL PRIMARY KEY,
-            application_id TEXT NOT NULL,
-            old_status TEXT,
-            new_status TEXT NOT NULL,
-            changed_at TIMESTAMP NOT NULL DEFAULT NOW()
-        );
-    """)
-
-    # -----------------------------------
-    # 3. Officer review actions table
-    # -----------------------------------
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS loan_manual_review (
-            id SERIAL PRIMARY KEY,
-            application_id TEXT NOT NULL,
-            officer TEXT NOT NULL,
-            action TEXT NOT NULL,        -- approved / rejected
-            notes TEXT,
-            reviewed_at TIMESTAMP NOT NULL DEFAULT NOW()
-        );
-    """)
-
-    # -----------------------------------
-    # 4. Credit Score Profile Table
-    # -----------------------------------
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS credit_profile (
-            pan TEXT PRIMARY KEY,
-            credit_score INTEGER NOT NULL,
-            last_updated TIMESTAMP NOT NULL
-        );
-    """)
-
-
-
-    # Index for searching PAN
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_pan ON loan_applications (pan);")
-
-    # PAN must be unique ONLY when active
-    cur.execute("""
-        CREATE UNIQUE INDEX IF NOT EXISTS unique_active_pan
-        ON loan_applications (pan)
-        WHERE status IN ('submitted','processing','manual_review');
-    """)
-
-    conn.commit()
-    conn.close()
+    """Apply pending schema migrations and create upcoming history partitions (idempotent)."""
+    from migrations import migrate
+    from history_partitions import ensure_partitions
+    migrate()
+    ensure_partitions()
 
 
 # -----------------------------
 # STATUS HISTORY HELPERS
 # -----------------------------
-def log_status_change(application_id: str, old: str | None, new: str):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO loan_status_history (application_id, old_status, new_status)
-        VALUES (%s, %s, %s);
-    """, (application_id, old, new))
-    conn.commit()
-    conn.close()
-
-
-def get_status_history(application_id: str):
-    conn = get_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute("""
-        SELECT old_status, new_status, changed_at
-        FROM loan_status_history
-        WHERE application_id = %s
-        ORDER BY changed_at ASC;
-    """, (application_id,))
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+@metrics.timed(metrics.DB_HELPER_SECONDS)
+def log_status_changes(application_id: str, history: list):
+    """Bulk-insert in-memory history rows ({old_status, new_status, changed_at}) in one statement."""
+    if not history:
+        return
+    with transaction() as conn:
+        cur = conn.cursor()
+        execute_values(cur, """
+            INSERT INTO loan_status_history (application_id, old_status, new_status, changed_at)
+            VALUES %s;
+        """, [
+            (application_id, h["old_status"], h["new_status"], h["changed_at"])
+            for h in history
+        ])
 
 
-# -----------------------------
-# CHECK ACTIVE APPLICATION
-# -----------------------------
-def check_active_application(pan: str) -> bool:
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT application_id
-        FROM loan_applications
-        WHERE pan = %s
-        AND status IN ('submitted','processing','manual_review')
-        LIMIT 1;
-    """, (pan,))
-    res = cur.fetchone()
-    conn.close()
-    return bool(res)
+@metrics.timed(metrics.DB_HELPER_SECONDS)
+def get_status_history(application_id: str, created_at: datetime | None = None):
+    """Pass the application's `created_at` to prune the monthly partitions read."""
+    since = created_at - HISTORY_SINCE_SLACK if created_at else datetime.min
+    with transaction() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute("""
+            SELECT old_status, new_status, changed_at
+            FROM loan_status_history
+            WHERE application_id = %s AND changed_at >= %s
+            ORDER BY changed_at ASC, id ASC;
+        """, (application_id, since))
+        return cur.fetchall()
 
 
 # -----------------------------
 # INSERT / GET MAIN RECORD
 # -----------------------------
-def insert_application(data: dict):
-    conn = get_connection()
-    cur = conn.cursor()
-    try:
+@metrics.timed(metrics.DB_HELPER_SECONDS)
+def reserve_application(data: dict) -> bool:
+    """
+    Admission: insert the application as 'submitted' before any scoring.
+    The unique_active_pan partial index decides; returns False (nothing
+    inserted) when the PAN already has an active application. A concurrent
+    uncommitted reservation for the same PAN makes this wait for its outcome.
+    """
+    with transaction() as conn:
+        cur = conn.cursor()
         cur.execute("""
             INSERT INTO loan_applications
-            (application_id, name, age, income, loan_amount, pan, status,
-             credit_score, risk_level, decision_reason, llm_explanation,
-             llm_status_explanation, officer_notes, reviewed_by, created_at)
+            (application_id, name, age, income, loan_amount, pan, status, created_at)
             VALUES (%(application_id)s, %(name)s, %(age)s, %(income)s,
-                    %(loan_amount)s, %(pan)s, %(status)s, %(credit_score)s,
-                    %(risk_level)s, %(decision_reason)s, %(llm_explanation)s,
-                    %(llm_status_explanation)s, %(officer_notes)s,
-                    %(reviewed_by)s, %(created_at)s);
+                    %(loan_amount)s, %(pan)s, 'submitted', %(created_at)s)
+            ON CONFLICT (pan) WHERE status IN ('submitted','processing','manual_review')
+            DO NOTHING
+            RETURNING application_id;
         """, data)
-        conn.commit()
+        return cur.fetchone() is not None
 
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        conn.close()
 
+@metrics.timed(metrics.DB_HELPER_SECONDS)
+def finalize_application(data: dict):
+    """Write the decision onto a reserved application."""
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            UPDATE loan_applications
+            SET status = %(status)s,
+                credit_score = %(credit_score)s,
+                risk_level = %(risk_level)s,
+                decision_reason = %(decision_reason)s,
+                llm_explanation = %(llm_explanation)s,
+                llm_status_explanation = %(llm_status_explanation)s,
+                llm_status_explanation_state = %(llm_status_explanation_state)s
+            WHERE application_id = %(application_id)s;
+        """, data)
 
+
+@metrics.timed(metrics.DB_HELPER_SECONDS)
 def get_application(application_id: str):
-    conn = get_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute("""
-        SELECT *
-        FROM loan_applications
-        WHERE application_id = %s;
-    """, (application_id,))
-    row = cur.fetchone()
-    conn.close()
+    with transaction() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute("""
+            SELECT *
+            FROM loan_applications
+            WHERE application_id = %s;
+        """, (application_id,))
+        return cur.fetchone()
+
+
+# Columns the explanation / chat prompts read (plus status, for the LLM cache TTL)
+PROMPT_COLUMNS = (
+    "application_id", "name", "age", "income", "loan_amount", "pan", "status",
+    "credit_score", "risk_level", "decision_reason",
+)
+
+
+# History rows are never older than their application (minus clock slack), so
+# bounding changed_at by created_at lets Postgres skip older monthly partitions.
+HISTORY_SINCE_SLACK = timedelta(days=1)
+
+# `h.history`: the ordered status history of `{row}` as a JSON array
+HISTORY_LATERAL = """
+    CROSS JOIN LATERAL (
+        SELECT COALESCE(json_agg(json_build_object(
+                   'old_status', s.old_status,
+                   'new_status', s.new_status,
+                   'changed_at', s.changed_at
+               ) ORDER BY s.changed_at, s.id), '[]'::json) AS history
+        FROM loan_status_history s
+        WHERE s.application_id = {row}.application_id
+          AND s.changed_at >= {row}.created_at - interval '1 day'
+    ) h
+"""
+
+
+def build_with_history_query(application_id: str, columns: tuple | None, param) -> str:
+    """
+    One application row plus its ordered status history (`history`), in a
+    single statement. `columns=None` selects every column.
+    """
+    if columns is None:
+        columns = APPLICATION_COLUMNS
+    unknown = [c for c in columns if c not in APPLICATION_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return f"""
+        SELECT {', '.join('a.' + c for c in columns)}, h.history
+        FROM loan_applications a
+        {HISTORY_LATERAL.format(row="a")}
+        WHERE a.application_id = {param(application_id)};
+    """
+
+
+def parse_history(history) -> list:
+    """json_agg history → the same dicts get_status_history returns (changed_at as datetime)."""
+    if isinstance(history, str):
+        history = json.loads(history)
+    for entry in history:
+        entry["changed_at"] = datetime.fromisoformat(entry["changed_at"])
+    return history
+
+
+@metrics.timed(metrics.DB_HELPER_SECONDS)
+def get_application_with_history(application_id: str, columns: tuple | None = None):
+    """Application row with `history` attached, in one round trip; None if not found."""
+    params = []
+
+    def param(value):
+        params.append(value)
+        return "%s"
+
+    query = build_with_history_query(application_id, columns, param)
+    with transaction() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute(query, params)
+        row = cur.fetchone()
+    if row:
+        row["history"] = parse_history(row["history"])
     return row
 
 
 # -----------------------------
 # MANUAL REVIEW TABLE HELPERS
 # -----------------------------
-def record_manual_review(application_id: str, officer: str, action: str, notes: str):
-    """Store manual review action in audit table."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO loan_manual_review (application_id, officer, action, notes)
-        VALUES (%s, %s, %s, %s);
-    """, (application_id, officer, action, notes))
-    conn.commit()
-    conn.close()
+def build_review_query(decisions: list, changed_at: datetime, param, with_history: bool = False) -> str:
+    """
+    Apply officer decisions [(application_id, new_status, notes, officer)] in one
+    statement. `status = 'manual_review'` in the UPDATE is the concurrency guard:
+    when two officers review the same application only the first gets the row
+    back. Audit and status history rows are written for the returned rows only.
+    With `with_history`, each row carries its history *before* this change
+    (a data-modifying CTE's inserts are not visible to the outer SELECT).
+    """
+    ids, statuses, notes, officers = (list(column) for column in zip(*decisions))
+    query = f"""
+        WITH decisions AS (
+            SELECT * FROM UNNEST(
+                {param(ids)}::text[], {param(statuses)}::text[],
+                {param(notes)}::text[], {param(officers)}::text[]
+            ) AS d(application_id, status, notes, officer)
+        ),
+        reviewed AS (
+            UPDATE loan_applications a
+            SET status = d.status, officer_notes = d.notes, reviewed_by = d.officer,
+                llm_status_explanation = NULL, llm_status_explanation_state = 'pending'
+            FROM decisions d
+            WHERE a.application_id = d.application_id
+              AND a.status = 'manual_review'
+            RETURNING a.*
+        ),
+        audit AS (
+            INSERT INTO loan_manual_review (application_id, officer, action, notes)
+            SELECT application_id, reviewed_by, status, officer_notes FROM reviewed
+        ),
+        logged AS (
+            INSERT INTO loan_status_history (application_id, old_status, new_status, changed_at)
+            SELECT application_id, 'manual_review', status, {param(changed_at)}::timestamp FROM reviewed
+        )
+    """
+    if not with_history:
+        return query + "SELECT * FROM reviewed;"
+    return query + f"SELECT r.*, h.history FROM reviewed r {HISTORY_LATERAL.format(row='r')};"
+
+
+def attach_review_history(row: dict, changed_at: datetime) -> dict:
+    """Complete a with_history review row with the change the statement just logged."""
+    row["history"] = parse_history(row["history"]) + [
+        {"old_status": "manual_review", "new_status": row["status"], "changed_at": changed_at}
+    ]
+    return row
+
+
+@metrics.timed(metrics.DB_HELPER_SECONDS)
+def review_applications(decisions: list, with_history: bool = False) -> list:
+    """
+    Apply officer decisions atomically; returns the reviewed rows. Applications
+    that are missing or no longer pending review are absent from the result.
+    """
+    if not decisions:
+        return []
+    changed_at = datetime.utcnow()
+    params = []
+
+    def param(value):
+        params.append(value)
+        return "%s"
+
+    query = build_review_query(decisions, changed_at, param, with_history)
+    with transaction() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute(query, params)
+        rows = cur.fetchall()
+    if with_history:
+        rows = [attach_review_history(row, changed_at) for row in rows]
+    return rows
+
+
+# -----------------------------
+# 📋 DASHBOARD LISTINGS (keyset pagination)
+# -----------------------------
+HEAVY_COLUMNS = ("llm_explanation", "llm_status_explanation")
+LIST_DEFAULT_COLUMNS = tuple(c for c in APPLICATION_COLUMNS if c not in HEAVY_COLUMNS)
+LIST_MAX_LIMIT = int(os.getenv("LIST_MAX_LIMIT", "500"))
+LIST_STREAM_BATCH_SIZE = int(os.getenv("LIST_STREAM_BATCH_SIZE", "1000"))
+
+
+def parse_fields(fields: str | None) -> tuple:
+    """
+    `fields=` projection: comma-separated column names, or "*" for every column.
+    Defaults to all columns except the large LLM text columns. The keyset columns
+    (created_at, application_id) are always included.
+    """
+    if not fields:
+        columns = list(LIST_DEFAULT_COLUMNS)
+    elif fields.strip() == "*":
+        columns = list(APPLICATION_COLUMNS)
+    else:
+        columns = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [c for c in columns if c not in APPLICATION_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    for key in ("application_id", "created_at"):
+        if key not in columns:
+            columns.append(key)
+    return tuple(columns)
+
+
+def encode_cursor(row: dict) -> str:
+    raw = json.dumps([row["created_at"].isoformat(), row["application_id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        created_at, application_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), application_id
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def build_list_query(columns: tuple, param, status=None, risk_level=None,
+                     created_from=None, created_to=None, cursor=None, limit=None) -> str:
+    """
+    Newest-first listing over (created_at, application_id).
+    `param(value)` registers a bind value and returns its placeholder, so the
+    same builder serves psycopg2 (%s) and asyncpg ($n).
+    """
+    where = []
+    if status:
+        where.append(f"status = {param(status)}")
+    if risk_level:
+        where.append(f"risk_level = {param(risk_level)}")
+    if created_from:
+        where.append(f"created_at >= {param(created_from)}")
+    if created_to:
+        where.append(f"created_at < {param(created_to)}")
+    if cursor:
+        created_at, application_id = decode_cursor(cursor)
+        where.append(f"(created_at, application_id) < ({param(created_at)}, {param(application_id)})")
+
+    query = f"SELECT {', '.join(columns)} FROM loan_applications"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += " ORDER BY created_at DESC, application_id DESC"
+    if limit is not None:
+        query += f" LIMIT {param(limit)}"
+    return query
+
+
+@metrics.timed(metrics.DB_HELPER_SECONDS)
+def list_applications(fields: str | None = None, limit: int = 50, **filters):
+    """One page of applications plus the cursor for the next page (None on the last page)."""
+    limit = max(1, min(limit, LIST_MAX_LIMIT))
+    params = []
+
+    def param(value):
+        params.append(value)
+        return "%s"
+
+    query = build_list_query(parse_fields(fields), param, limit=limit + 1, **filters)
+    with transaction() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute(query, params)
+        rows = cur.fetchall()
+
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def iter_applications(fields: str | None = None, **filters):
+    """
+    Yield every matching application through a server-side cursor, so memory stays
+    flat regardless of table size. Borrows its own pooled connection because the
+    generator is consumed after the request handler has returned.
+    """
+    params = []
+
+    def param(value):
+        params.append(value)
+        return "%s"
+
+    query = build_list_query(parse_fields(fields), param, **filters)
+    pool = get_pool()
+    conn = pool.getconn()
+    broken = False
+    try:
+        with conn.cursor(name="iter_applications", cursor_factory=RealDictCursor) as cur:
+            cur.itersize = LIST_STREAM_BATCH_SIZE
+            cur.execute(query, params)
+            for row in cur:
+                yield row
+        conn.commit()
+    except BaseException:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            broken = True
+        raise
+    finally:
+        pool.putconn(conn, discard=broken)
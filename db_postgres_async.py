@@ -0,0 +1,187 @@
+# db_postgres_async.py
+"""
+asyncpg-backed twin of db_postgres: same helper names and return shapes
+(dict rows), awaited instead of called. Used by main_async.
+"""
+import asyncpg
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+from db_postgres import (
+    DB_HOST,
+    DB_PORT,
+    DB_NAME,
+    DB_USER,
+    DB_PASSWORD,
+    DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_POOL_MAX_LIFETIME,
+    DB_POOL_HEALTH_CHECK_INTERVAL,
+    LIST_MAX_LIMIT,
+    LIST_STREAM_BATCH_SIZE,
+    HISTORY_SINCE_SLACK,
+    parse_fields,
+    encode_cursor,
+    build_list_query,
+    build_with_history_query,
+    build_review_query,
+    attach_review_history,
+    parse_history,
+)
+
+
+# -----------------------------
+# 🔌 CONNECTION POOL
+# -----------------------------
+_pool: asyncpg.Pool | None = None
+
+
+async def get_pool() -> asyncpg.Pool:
+    """Process-wide asyncpg pool, created on first use (or by init_pool at startup)."""
+    global _pool
+    if _pool is None:
+        _pool = await asyncpg.create_pool(
+            host=DB_HOST,
+            port=int(DB_PORT),
+            database=DB_NAME,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
+            timeout=DB_POOL_TIMEOUT,
+            # asyncpg closes idle connections after this; it also resets/validates
+            # connections on release, so a separate ping is not needed
+            max_inactive_connection_lifetime=max(DB_POOL_HEALTH_CHECK_INTERVAL, DB_POOL_MAX_LIFETIME),
+        )
+    return _pool
+
+
+async def init_pool():
+    await get_pool()
+
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+# -----------------------------
+# 🔁 UNIT OF WORK
+# -----------------------------
+_current_conn: ContextVar = ContextVar("db_postgres_async_conn", default=None)
+
+
+@asynccontextmanager
+async def transaction():
+    """Async counterpart of db_postgres.transaction(); nested calls share the connection."""
+    conn = _current_conn.get()
+    if conn is not None:
+        yield conn
+        return
+
+    pool = await get_pool()
+    async with pool.acquire(timeout=DB_POOL_TIMEOUT) as conn:
+        token = _current_conn.set(conn)
+        try:
+            async with conn.transaction():
+                yield conn
+        finally:
+            _current_conn.reset(token)
+
+
+# -----------------------------
+# STATUS HISTORY HELPERS
+# -----------------------------
+async def get_status_history(application_id: str, created_at: datetime | None = None):
+    """Pass the application's `created_at` to prune the monthly partitions read."""
+    since = created_at - HISTORY_SINCE_SLACK if created_at else datetime.min
+    async with transaction() as conn:
+        rows = await conn.fetch("""
+            SELECT old_status, new_status, changed_at
+            FROM loan_status_history
+            WHERE application_id = $1 AND changed_at >= $2
+            ORDER BY changed_at ASC, id ASC;
+        """, application_id, since)
+        return [dict(r) for r in rows]
+
+
+# -----------------------------
+# GET MAIN RECORD
+# -----------------------------
+async def get_application(application_id: str):
+    async with transaction() as conn:
+        row = await conn.fetchrow("""
+            SELECT *
+            FROM loan_applications
+            WHERE application_id = $1;
+        """, application_id)
+        return dict(row) if row else None
+
+
+async def get_application_with_history(application_id: str, columns: tuple | None = None):
+    """Application row with `history` attached, in one round trip; None if not found."""
+    params, param = _asyncpg_params()
+    query = build_with_history_query(application_id, columns, param)
+    async with transaction() as conn:
+        row = await conn.fetchrow(query, *params)
+    if not row:
+        return None
+    row = dict(row)
+    row["history"] = parse_history(row["history"])
+    return row
+
+
+# -----------------------------
+# MANUAL REVIEW TABLE HELPERS
+# -----------------------------
+async def review_applications(decisions: list, with_history: bool = False) -> list:
+    """Apply officer decisions atomically; see db_postgres.build_review_query."""
+    if not decisions:
+        return []
+    changed_at = datetime.utcnow()
+    params, param = _asyncpg_params()
+    query = build_review_query(decisions, changed_at, param, with_history)
+    async with transaction() as conn:
+        rows = [dict(r) for r in await conn.fetch(query, *params)]
+    if with_history:
+        rows = [attach_review_history(row, changed_at) for row in rows]
+    return rows
+
+
+# -----------------------------
+# 📋 DASHBOARD LISTINGS (keyset pagination)
+# -----------------------------
+def _asyncpg_params():
+    params = []
+
+    def param(value):
+        params.append(value)
+        return f"${len(params)}"
+
+    return params, param
+
+
+async def list_applications(fields: str | None = None, limit: int = 50, **filters):
+    limit = max(1, min(limit, LIST_MAX_LIMIT))
+    params, param = _asyncpg_params()
+    query = build_list_query(parse_fields(fields), param, limit=limit + 1, **filters)
+    async with transaction() as conn:
+        rows = [dict(r) for r in await conn.fetch(query, *params)]
+
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+async def iter_applications(fields: str | None = None, **filters):
+    """Stream matching rows through a server-side cursor on a dedicated pooled connection."""
+    params, param = _asyncpg_params()
+    query = build_list_query(parse_fields(fields), param, **filters)
+    pool = await get_pool()
+    async with pool.acquire(timeout=DB_POOL_TIMEOUT) as conn:
+        async with conn.transaction():
+            async for row in conn.cursor(query, *params, prefetch=LIST_STREAM_BATCH_SIZE):
+                yield dict(row)
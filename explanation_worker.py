@@ -0,0 +1,217 @@
+# explanation_worker.py
+"""
+Background generation of `llm_status_explanation`.
+
+Applications are persisted with llm_status_explanation_state = 'pending' and
+their ID is enqueued after commit; worker threads generate the explanation
+off the request path and mark the row 'ready' (or 'failed' once retries are
+exhausted). A periodic sweep re-enqueues rows left pending by a full queue,
+a restart or another process (e.g. the batch CLI).
+"""
+import os
+import queue
+import random
+import threading
+import time
+
+import metrics
+from db_postgres import transaction, get_application_with_history, PROMPT_COLUMNS
+from llm_service import generate_status_explanation, is_llm_failure
+
+EXPLAIN_WORKERS = int(os.getenv("EXPLAIN_WORKERS", "2"))
+EXPLAIN_QUEUE_DEPTH = int(os.getenv("EXPLAIN_QUEUE_DEPTH", "1000"))
+EXPLAIN_MAX_RETRIES = int(os.getenv("EXPLAIN_MAX_RETRIES", "3"))
+EXPLAIN_RETRY_BACKOFF = float(os.getenv("EXPLAIN_RETRY_BACKOFF", "2"))      # seconds, doubled per attempt
+EXPLAIN_SWEEP_INTERVAL = float(os.getenv("EXPLAIN_SWEEP_INTERVAL", "60"))   # seconds, 0 disables
+EXPLAIN_SWEEP_MIN_AGE = float(os.getenv("EXPLAIN_SWEEP_MIN_AGE", "30"))     # only sweep rows older than this
+
+_WORKER_COLUMNS = PROMPT_COLUMNS + ("llm_status_explanation_state",)
+
+
+class ExplanationWorkerPool:
+    def __init__(self, workers: int = EXPLAIN_WORKERS, queue_depth: int = EXPLAIN_QUEUE_DEPTH,
+                 max_retries: int = EXPLAIN_MAX_RETRIES, retry_backoff: float = EXPLAIN_RETRY_BACKOFF,
+                 sweep_interval: float = EXPLAIN_SWEEP_INTERVAL):
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.sweep_interval = sweep_interval
+
+        self._queue = queue.Queue(maxsize=queue_depth)
+        self._queued = set()            # application_ids waiting or in flight (dedupe)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._counters = {
+            "enqueued": 0,
+            "dropped": 0,               # queue full; the sweep picks these up later
+            "completed": 0,
+            "retried": 0,
+            "failed": 0,
+            "in_flight": 0,
+            "generate_seconds": 0.0,
+        }
+
+    # -----------------------------
+    # LIFECYCLE
+    # -----------------------------
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"explain-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        if self.sweep_interval > 0:
+            t = threading.Thread(target=self._sweep_loop, name="explain-sweeper", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads) and not self._stop.is_set()
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    # -----------------------------
+    # PRODUCER SIDE
+    # -----------------------------
+    def enqueue(self, application_id: str, attempt: int = 0) -> bool:
+        """Non-blocking; returns False if the queue is full (row stays pending for the sweep)."""
+        with self._lock:
+            if attempt == 0 and application_id in self._queued:
+                return True
+            self._queued.add(application_id)
+        try:
+            self._queue.put_nowait((application_id, attempt))
+        except queue.Full:
+            with self._lock:
+                self._queued.discard(application_id)
+                self._counters["dropped"] += 1
+            return False
+        with self._lock:
+            self._counters["enqueued"] += 1
+        return True
+
+    def sweep(self, limit: int = 500) -> int:
+        """Re-enqueue applications still pending after EXPLAIN_SWEEP_MIN_AGE seconds."""
+        with transaction() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT application_id FROM loan_applications
+                WHERE llm_status_explanation_state = 'pending'
+                AND created_at < (NOW() AT TIME ZONE 'UTC') - %s * INTERVAL '1 second'
+                ORDER BY created_at
+                LIMIT %s;
+            """, (EXPLAIN_SWEEP_MIN_AGE, limit))
+            ids = [row[0] for row in cur.fetchall()]
+        return sum(1 for application_id in ids if self.enqueue(application_id))
+
+    # -----------------------------
+    # CONSUMER SIDE
+    # -----------------------------
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                application_id, attempt = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            with self._lock:
+                self._counters["in_flight"] += 1
+            try:
+                succeeded = self._process(application_id, attempt)
+            except Exception as e:
+                print("🔥 EXPLANATION WORKER ERROR:", application_id, e)
+                succeeded = False
+            # never let the failure path (its DB write) end the thread: the row
+            # stays 'pending' and the sweep picks it up again
+            try:
+                if not succeeded:
+                    self._retry_or_fail(application_id, attempt)
+            except Exception as e:
+                print("🔥 EXPLANATION WORKER ERROR (marking failed):", application_id, e)
+            finally:
+                with self._lock:
+                    self._counters["in_flight"] -= 1
+                self._queue.task_done()
+
+    def _process(self, application_id: str, attempt: int) -> bool:
+        """False when the LLM call failed; the caller retries or gives up."""
+        app = get_application_with_history(application_id, _WORKER_COLUMNS)
+        if not app or app.get("llm_status_explanation_state") != "pending":
+            self._done(application_id)
+            return True
+        history = app.pop("history")
+
+        started = time.perf_counter()
+        explanation = generate_status_explanation(app, history)
+        with self._lock:
+            self._counters["generate_seconds"] += time.perf_counter() - started
+
+        if is_llm_failure(explanation):
+            return False
+
+        self._set_state(application_id, "ready", explanation)
+        with self._lock:
+            self._counters["completed"] += 1
+        self._done(application_id)
+        return True
+
+    def _retry_or_fail(self, application_id: str, attempt: int):
+        if attempt + 1 < self.max_retries and not self._stop.is_set():
+            delay = self.retry_backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+            with self._lock:
+                self._counters["retried"] += 1
+            timer = threading.Timer(delay, self.enqueue, (application_id, attempt + 1))
+            timer.daemon = True
+            timer.start()
+            return
+        try:
+            self._set_state(application_id, "failed", None)
+        finally:
+            with self._lock:
+                self._counters["failed"] += 1
+            self._done(application_id)
+
+    def _set_state(self, application_id: str, state: str, explanation: str | None):
+        with transaction() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                UPDATE loan_applications
+                SET llm_status_explanation = COALESCE(%s, llm_status_explanation),
+                    llm_status_explanation_state = %s
+                WHERE application_id = %s AND llm_status_explanation_state = 'pending';
+            """, (explanation, state, application_id))
+
+    def _done(self, application_id: str):
+        with self._lock:
+            self._queued.discard(application_id)
+
+    def _sweep_loop(self):
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print("⚠️ EXPLANATION SWEEP ERROR:", e)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["queue_capacity"] = self._queue.maxsize
+        stats["workers"] = self.workers
+        stats["running"] = self.running
+        return stats
+
+
+explanation_workers = ExplanationWorkerPool()
+
+metrics.Gauge(
+    "loan_explanation_queue_depth", "Explanation jobs waiting for a worker",
+    callback=lambda: explanation_workers._queue.qsize(),
+)
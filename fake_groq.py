@@ -0,0 +1,100 @@
+# fake_groq.py
+"""
+Local stand-in for the Groq chat-completions API, used to exercise the LLM
+client's deadlines, retries and circuit breaker without calling Groq.
+
+    uvicorn fake_groq:app --port 9999
+    GROQ_BASE_URL=http://localhost:9999 GROQ_API_KEY=fake uvicorn main_async:app
+
+Latency and errors are injected from env vars or at runtime:
+
+    curl -X POST localhost:9999/_control -H 'content-type: application/json' \
+         -d '{"latency": 3, "error_rate": 0.5, "error_status": 503}'
+"""
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI(title="Fake Groq")
+
+settings = {
+    "latency": float(os.getenv("FAKE_GROQ_LATENCY", "0.05")),            # seconds before the response
+    "token_delay": float(os.getenv("FAKE_GROQ_TOKEN_DELAY", "0.01")),    # seconds between streamed chunks
+    "error_rate": float(os.getenv("FAKE_GROQ_ERROR_RATE", "0")),
+    "error_status": int(os.getenv("FAKE_GROQ_ERROR_STATUS", "503")),
+}
+counters = {"requests": 0, "errors": 0}
+
+REPLY = "This is a simulated explanation from the fake Groq server."
+
+
+def _chunk(completion_id: str, model: str, delta: dict, finish_reason=None) -> str:
+    payload = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "fake")
+    counters["requests"] += 1
+
+    await asyncio.sleep(settings["latency"])
+
+    if random.random() < settings["error_rate"]:
+        counters["errors"] += 1
+        return JSONResponse(
+            {"error": {"message": "injected failure", "type": "fake_error"}},
+            status_code=settings["error_status"],
+        )
+
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+    if body.get("stream"):
+        async def events():
+            yield _chunk(completion_id, model, {"role": "assistant", "content": ""})
+            for word in REPLY.split(" "):
+                await asyncio.sleep(settings["token_delay"])
+                yield _chunk(completion_id, model, {"content": word + " "})
+            yield _chunk(completion_id, model, {}, finish_reason="stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": REPLY},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+@app.post("/_control")
+async def control(update: dict):
+    for name, value in update.items():
+        if name in settings:
+            settings[name] = type(settings[name])(value)
+    return {**settings, **counters}
+
+
+@app.get("/_control")
+async def control_state():
+    return {**settings, **counters}
@@ -0,0 +1,245 @@
+# history_partitions.py
+"""
+Monthly partitions of loan_status_history (migration 7).
+
+Partitions are named loan_status_history_pYYYYMM and cover one UTC calendar
+month of changed_at. init_db (every startup) and the daily maintainer create
+the current month plus HISTORY_PREMAKE_MONTHS ahead, so inserts never hit a
+missing partition. Archival detaches months older than the retention window
+(DETACH ... CONCURRENTLY, PostgreSQL 14+), exports each one to a gzipped CSV
+and drops it only once the file holds as many rows as the table.
+
+    python history_partitions.py list
+    python history_partitions.py ensure [--months-ahead 3]
+    python history_partitions.py archive --retention-months 24 [--dir archive] [--dry-run]
+"""
+import argparse
+import csv
+import gzip
+import json
+import os
+import tempfile
+import threading
+from datetime import date, datetime
+
+from db_postgres import transaction, get_connection
+
+HISTORY_PREMAKE_MONTHS = int(os.getenv("HISTORY_PREMAKE_MONTHS", "3"))
+HISTORY_RETENTION_MONTHS = int(os.getenv("HISTORY_RETENTION_MONTHS", "0"))          # 0 keeps every month
+HISTORY_ARCHIVE_DIR = os.getenv("HISTORY_ARCHIVE_DIR", "archive")
+HISTORY_MAINTENANCE_INTERVAL = float(os.getenv("HISTORY_MAINTENANCE_INTERVAL", "86400"))   # seconds, 0 disables
+
+PARTITION_PREFIX = "loan_status_history_p"
+ARCHIVE_LOCK_ID = 7_314_002     # one archive pass at a time across workers (migrations use 7_314_001)
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def _add_months(month: date, n: int) -> date:
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _month_of(name: str) -> date:
+    suffix = name[len(PARTITION_PREFIX):]
+    return date(int(suffix[:4]), int(suffix[4:6]), 1)
+
+
+def ensure_partitions(months_ahead: int = HISTORY_PREMAKE_MONTHS) -> int:
+    """Create any missing partition from this month to `months_ahead` months out."""
+    this_month = datetime.utcnow().date().replace(day=1)
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT loan_status_history_ensure_partitions(%s, %s);",
+            (this_month, _add_months(this_month, months_ahead)),
+        )
+        return cur.fetchone()[0]
+
+
+def list_partitions() -> list:
+    """
+    [{name, month, attached, detach_pending}] for every loan_status_history_pYYYYMM
+    table, oldest first. `detach_pending`: an interrupted DETACH ... CONCURRENTLY.
+    """
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT c.relname, c.relispartition, COALESCE(i.inhdetachpending, false)
+            FROM pg_class c
+            LEFT JOIN pg_inherits i ON i.inhrelid = c.oid
+            WHERE c.relkind = 'r' AND c.relname LIKE %s
+            ORDER BY c.relname;
+        """, (PARTITION_PREFIX.replace("_", r"\_") + "%",))
+        rows = cur.fetchall()
+    return [
+        {"name": name, "month": _month_of(name), "attached": attached, "detach_pending": pending}
+        for name, attached, pending in rows
+    ]
+
+
+def _count_csv_rows(path: str) -> int:
+    """Records in a gzipped CSV export, header excluded (quoted newlines count once)."""
+    with gzip.open(path, "rt", newline="") as f:
+        return max(sum(1 for _ in csv.reader(f)) - 1, 0)
+
+
+def _export(cur, name: str, archive_dir: str, expected_rows: int) -> str:
+    """
+    COPY one detached partition to <archive_dir>/<name>.csv.gz. Written under a
+    unique temp name (concurrent or crashed runs never share one), read back and
+    counted, and renamed into place only when it holds `expected_rows` rows.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.csv.gz")
+    fd, tmp = tempfile.mkstemp(prefix=f"{name}.", suffix=".csv.gz.tmp", dir=archive_dir)
+    try:
+        with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as f:
+            cur.copy_expert(
+                f'COPY (SELECT * FROM "{name}" ORDER BY changed_at, id) TO STDOUT WITH (FORMAT csv, HEADER)', f
+            )
+        exported = _count_csv_rows(tmp)
+        if exported != expected_rows:
+            raise ArchiveError(f"{name}: exported {exported} rows, table has {expected_rows}; not dropped")
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return path
+
+
+def _archive_partition(conn, partition: dict, archive_dir: str) -> str:
+    """Detach (if needed), export, verify and drop one month. `conn` is in autocommit mode."""
+    name = partition["name"]
+    cur = conn.cursor()
+    if partition["detach_pending"]:
+        cur.execute(f'ALTER TABLE loan_status_history DETACH PARTITION "{name}" FINALIZE;')
+    elif partition["attached"]:
+        # CONCURRENTLY: inserts into the current month are not blocked while it runs
+        cur.execute(f'ALTER TABLE loan_status_history DETACH PARTITION "{name}" CONCURRENTLY;')
+
+    conn.autocommit = False
+    try:
+        # nothing writes a detached month, but make the count and the COPY agree regardless
+        cur.execute(f'LOCK TABLE "{name}" IN ACCESS EXCLUSIVE MODE;')
+        cur.execute(f'SELECT COUNT(*) FROM "{name}";')
+        path = _export(cur, name, archive_dir, cur.fetchone()[0])
+        cur.execute(f'DROP TABLE "{name}";')
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.autocommit = True
+    return path
+
+
+def archive(retention_months: int = HISTORY_RETENTION_MONTHS, archive_dir: str = HISTORY_ARCHIVE_DIR,
+            dry_run: bool = False) -> dict:
+    """
+    Detach, export and drop every month older than `retention_months`. Each step
+    commits on its own, so a crash leaves at worst a detached (or detach-pending),
+    still-populated table; it is picked up again on the next run (and is no longer
+    read by queries). The whole pass holds a session advisory lock: when another
+    worker is already archiving, this call returns with `skipped` set.
+    """
+    if retention_months <= 0:
+        raise ValueError("retention_months must be positive")
+    cutoff = _add_months(datetime.utcnow().date().replace(day=1), -retention_months)
+    due = [p for p in list_partitions() if p["month"] < cutoff]
+    report = {"cutoff": cutoff.isoformat(), "archived": [], "dry_run": dry_run}
+    if dry_run:
+        report["archived"] = [p["name"] for p in due]
+        return report
+
+    if not due:
+        return report
+
+    # own unpooled connection: DETACH ... CONCURRENTLY cannot run inside a transaction block
+    conn = get_connection()
+    try:
+        conn.autocommit = True
+        cur = conn.cursor()
+        cur.execute("SELECT pg_try_advisory_lock(%s);", (ARCHIVE_LOCK_ID,))
+        if not cur.fetchone()[0]:
+            report["skipped"] = "another archive pass holds the lock"
+            return report
+        # re-read under the lock: the previous holder may have archived some of them
+        for partition in list_partitions():
+            if partition["month"] < cutoff:
+                path = _archive_partition(conn, partition, archive_dir)
+                report["archived"].append({"name": partition["name"], "file": path})
+    finally:
+        conn.close()        # ends the session, releasing the advisory lock
+    return report
+
+
+class HistoryMaintainer:
+    """Daily: create upcoming partitions; archive old ones when a retention is configured."""
+
+    def __init__(self, interval: float = HISTORY_MAINTENANCE_INTERVAL,
+                 retention_months: int = HISTORY_RETENTION_MONTHS):
+        self.interval = interval
+        self.retention_months = retention_months
+        self.last_report = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread or self.interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="history-maintainer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def run_once(self) -> dict:
+        report = {"created": ensure_partitions(), "at": datetime.utcnow().isoformat()}
+        if self.retention_months > 0:
+            report["archive"] = archive(self.retention_months)
+        self.last_report = report
+        return report
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print("⚠️ HISTORY PARTITION MAINTENANCE ERROR:", e)
+
+
+history_maintainer = HistoryMaintainer()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="loan_status_history partition maintenance.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="list monthly partitions")
+    ensure_cmd = sub.add_parser("ensure", help="create upcoming partitions")
+    ensure_cmd.add_argument("--months-ahead", type=int, default=HISTORY_PREMAKE_MONTHS)
+    archive_cmd = sub.add_parser("archive", help="detach, export and drop old partitions")
+    archive_cmd.add_argument("--retention-months", type=int, required=True)
+    archive_cmd.add_argument("--dir", default=HISTORY_ARCHIVE_DIR)
+    archive_cmd.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for p in list_partitions():
+            state = "DETACH PENDING" if p["detach_pending"] else "attached" if p["attached"] else "DETACHED"
+            print(p["name"], p["month"].isoformat(), state)
+    elif args.command == "ensure":
+        print("created partitions:", ensure_partitions(args.months_ahead))
+    else:
+        print(json.dumps(archive(args.retention_months, args.dir, args.dry_run), indent=2))
+
+
+if __name__ == "__main__":
+    main()
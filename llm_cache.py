@@ -0,0 +1,247 @@
+# llm_cache.py
+"""
+Content-addressed cache for LLM responses.
+
+Key = sha256(model, prompt, temperature, max_tokens), so any change in the
+prompt (new status, new timeline entry) naturally misses. Two tiers:
+- in-process LRU with TTL (per worker)
+- Postgres `llm_cache` table shared by all workers
+
+Entries can be tagged with an application_id and dropped explicitly with
+`invalidate_application()` when that application's status changes.
+Entries written with ttl=None never expire (explanations of terminal
+applications; chat replies always get LLM_CACHE_TTL).
+
+    python llm_cache.py purge     # delete expired rows from the persistent tier
+    python llm_cache.py stats
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from db_postgres import transaction
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PERSIST = os.getenv("LLM_CACHE_PERSIST", "true").lower() == "true"
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))          # seconds, non-terminal applications
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2048"))
+
+TERMINAL_STATUSES = ("approved", "rejected")
+
+
+def cache_key(model: str, prompt: str, temperature: float, max_tokens: int) -> str:
+    raw = json.dumps([model, prompt, temperature, max_tokens], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def ttl_for(application: dict | None, chat: bool = False) -> float | None:
+    """
+    Explanations of terminal applications never change again, so they never
+    expire. Chat replies depend on the conversation, are rarely asked twice
+    and would pile up forever, so they always get LLM_CACHE_TTL.
+    """
+    if not chat and application and application.get("status") in TERMINAL_STATUSES:
+        return None
+    return LLM_CACHE_TTL
+
+
+# -----------------------------
+# IN-PROCESS LRU TIER
+# -----------------------------
+class LRUCache:
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data = OrderedDict()     # key -> (value, expires_at | None, application_id)
+        self._by_app = {}              # application_id -> set(keys)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at, _ = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float | None, application_id: str | None = None):
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, expires_at, application_id)
+            if application_id:
+                self._by_app.setdefault(application_id, set()).add(key)
+            while len(self._data) > self.max_entries:
+                self._remove(next(iter(self._data)))
+
+    def invalidate_application(self, application_id: str) -> int:
+        with self._lock:
+            keys = self._by_app.pop(application_id, set())
+            for key in keys:
+                self._data.pop(key, None)
+            return len(keys)
+
+    def _remove(self, key: str):
+        _, _, application_id = self._data.pop(key)
+        if application_id and application_id in self._by_app:
+            self._by_app[application_id].discard(key)
+            if not self._by_app[application_id]:
+                del self._by_app[application_id]
+
+    def __len__(self):
+        return len(self._data)
+
+
+# -----------------------------
+# CACHE FACADE (both tiers + counters)
+# -----------------------------
+class LLMCache:
+    def __init__(self, persist: bool = LLM_CACHE_PERSIST):
+        self.memory = LRUCache()
+        self.persist = persist
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits_memory": 0,
+            "hits_persistent": 0,
+            "misses": 0,
+            "stores": 0,
+            "invalidations": 0,
+            "errors": 0,
+            "lookup_seconds": 0.0,
+            "generate_seconds": 0.0,   # time spent on LLM calls after a miss
+        }
+
+    def _count(self, name: str, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def get(self, key: str) -> str | None:
+        started = time.perf_counter()
+        try:
+            value = self.memory.get(key)
+            if value is not None:
+                self._count("hits_memory")
+                return value
+
+            if self.persist:
+                row = self._db_get(key)
+                if row is not None:
+                    value, application_id, expires_in = row
+                    self.memory.set(key, value, expires_in, application_id)
+                    self._count("hits_persistent")
+                    return value
+
+            self._count("misses")
+            return None
+        finally:
+            self._count("lookup_seconds", time.perf_counter() - started)
+
+    def set(self, key: str, value: str, ttl: float | None, application_id: str | None = None,
+            model: str = ""):
+        self.memory.set(key, value, ttl, application_id)
+        self._count("stores")
+        if self.persist:
+            self._db_set(key, value, ttl, application_id, model)
+
+    def record_generation(self, seconds: float):
+        self._count("generate_seconds", seconds)
+
+    def invalidate_application(self, application_id: str):
+        removed = self.memory.invalidate_application(application_id)
+        if self.persist:
+            try:
+                with transaction(independent=True) as conn:
+                    cur = conn.cursor()
+                    cur.execute("DELETE FROM llm_cache WHERE application_id = %s;", (application_id,))
+                    removed += cur.rowcount
+            except Exception as e:
+                self._count("errors")
+                print("⚠️ LLM cache invalidate failed:", e)
+        self._count("invalidations", removed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats["hits_memory"] + stats["hits_persistent"] + stats["misses"]
+        stats["memory_entries"] = len(self.memory)
+        stats["hit_ratio"] = round((lookups - stats["misses"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+    # ---- persistent tier (own connection: never joins / aborts the caller's transaction)
+    def _db_get(self, key: str):
+        try:
+            with transaction(independent=True) as conn:
+                cur = conn.cursor()
+                cur.execute("""
+                    SELECT response, application_id,
+                           EXTRACT(EPOCH FROM (expires_at - NOW()))
+                    FROM llm_cache
+                    WHERE key = %s AND (expires_at IS NULL OR expires_at > NOW());
+                """, (key,))
+                row = cur.fetchone()
+        except Exception as e:
+            self._count("errors")
+            print("⚠️ LLM cache read failed:", e)
+            return None
+        if row is None:
+            return None
+        value, application_id, expires_in = row
+        return value, application_id, None if expires_in is None else float(expires_in)
+
+    def _db_set(self, key, value, ttl, application_id, model):
+        try:
+            with transaction(independent=True) as conn:
+                cur = conn.cursor()
+                cur.execute("""
+                    INSERT INTO llm_cache (key, application_id, model, response, expires_at)
+                    VALUES (%s, %s, %s, %s,
+                            CASE WHEN %s::float IS NULL THEN NULL
+                                 ELSE NOW() + %s::float * INTERVAL '1 second' END)
+                    ON CONFLICT (key) DO UPDATE
+                    SET response = EXCLUDED.response,
+                        application_id = EXCLUDED.application_id,
+                        expires_at = EXCLUDED.expires_at,
+                        created_at = NOW();
+                """, (key, application_id, model, value, ttl, ttl))
+        except Exception as e:
+            self._count("errors")
+            print("⚠️ LLM cache write failed:", e)
+
+
+llm_cache = LLMCache()
+
+
+def invalidate_application(application_id: str):
+    if LLM_CACHE_ENABLED:
+        llm_cache.invalidate_application(application_id)
+
+
+def purge_expired() -> int:
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM llm_cache WHERE expires_at IS NOT NULL AND expires_at <= NOW();")
+        return cur.rowcount
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if command == "purge":
+        print("purged:", purge_expired())
+    else:
+        with transaction() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT COUNT(*), COUNT(*) FILTER (WHERE expires_at IS NULL),
+                       COUNT(DISTINCT application_id)
+                FROM llm_cache;
+            """)
+            total, permanent, applications = cur.fetchone()
+        print(json.dumps({"entries": total, "permanent": permanent, "applications": applications}))
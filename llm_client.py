@@ -0,0 +1,279 @@
+# llm_client.py
+"""
+Resilient wrapper around the async Groq client.
+
+- a semaphore caps concurrent LLM calls per process
+- every call has a deadline covering all of its attempts
+- retryable errors (429, 5xx, timeouts, connection errors) are retried with
+  jittered exponential backoff
+- a circuit breaker fails fast once the recent error rate crosses a threshold,
+  so callers drop straight to their "(LLM unavailable ...)" fallback instead of
+  piling up behind a slow or failing Groq
+
+The breaker is thread-safe and is shared with the sync `_generate` path.
+Point GROQ_BASE_URL at fake_groq.py to exercise latency and error handling locally.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import groq
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "20"))                 # seconds per call, all attempts
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.25"))       # seconds
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "4"))
+LLM_BREAKER_WINDOW = int(os.getenv("LLM_BREAKER_WINDOW", "20"))       # most recent calls considered
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "10"))
+LLM_BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))  # seconds open before a trial call
+
+RETRYABLE_ERRORS = (
+    groq.RateLimitError,
+    groq.APITimeoutError,
+    groq.APIConnectionError,
+    groq.InternalServerError,
+    asyncio.TimeoutError,
+)
+
+
+class LLMUnavailable(Exception):
+    pass
+
+
+class CircuitOpen(LLMUnavailable):
+    pass
+
+
+# -----------------------------
+# CIRCUIT BREAKER
+# -----------------------------
+class CircuitBreaker:
+    """
+    closed → open when the error rate over the last `window` calls reaches
+    `error_rate` (after at least `min_calls`); open → half_open after
+    `cooldown`, letting one trial call through; its outcome closes or re-opens.
+    Every allow() must end in record() or release(), or the trial slot stays taken.
+    """
+
+    def __init__(self, window: int = LLM_BREAKER_WINDOW, min_calls: int = LLM_BREAKER_MIN_CALLS,
+                 error_rate: float = LLM_BREAKER_ERROR_RATE, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self._outcomes = deque(maxlen=window)
+        self._state = "closed"
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == "closed":
+                return True
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.cooldown:
+                self._state = "half_open"
+                self._trial_in_flight = False
+            if self._state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, success: bool):
+        with self._lock:
+            if self._state == "half_open":
+                self._trial_in_flight = False
+                if success:
+                    self._state = "closed"
+                    self._outcomes.clear()
+                else:
+                    self._open()
+                return
+
+            self._outcomes.append(success)
+            failures = self._outcomes.count(False)
+            if (
+                self._state == "closed"
+                and len(self._outcomes) >= self.min_calls
+                and failures / len(self._outcomes) >= self.error_rate
+            ):
+                self._open()
+
+    def release(self):
+        """
+        The call ended without an outcome (client disconnected mid-stream, task
+        cancelled): says nothing about Groq, so only give back the trial slot.
+        """
+        with self._lock:
+            if self._state == "half_open":
+                self._trial_in_flight = False
+
+    def _open(self):
+        self._state = "open"
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+
+
+breaker = CircuitBreaker()
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    return isinstance(error, groq.APIStatusError) and error.status_code >= 500
+
+
+# -----------------------------
+# ASYNC CLIENT
+# -----------------------------
+class ResilientLLMClient:
+    def __init__(self, client: groq.AsyncGroq, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 deadline: float = LLM_DEADLINE, max_retries: int = LLM_MAX_RETRIES,
+                 circuit_breaker: CircuitBreaker = breaker):
+        self.client = client
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.breaker = circuit_breaker
+        self.max_concurrency = max_concurrency
+        self._semaphore = None      # created lazily inside the running event loop
+        self._counters = {"calls": 0, "failures": 0, "retries": 0, "timeouts": 0, "in_flight": 0}
+
+    def _sem(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def complete(self, **kwargs):
+        """chat.completions.create(**kwargs) with concurrency cap, deadline, retries and breaker."""
+        if not self.breaker.allow():
+            raise CircuitOpen("circuit open")
+
+        self._counters["calls"] += 1
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        settled = False
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError()
+                    async with self._sem():
+                        self._counters["in_flight"] += 1
+                        try:
+                            response = await asyncio.wait_for(
+                                self.client.chat.completions.create(**kwargs),
+                                timeout=deadline - time.monotonic(),
+                            )
+                        finally:
+                            self._counters["in_flight"] -= 1
+                    settled = True
+                    self.breaker.record(True)
+                    return response
+
+                except Exception as e:
+                    if isinstance(e, asyncio.TimeoutError):
+                        self._counters["timeouts"] += 1
+                    delay = backoff_delay(attempt)
+                    if (
+                        not is_retryable(e)
+                        or attempt >= self.max_retries
+                        or time.monotonic() + delay >= deadline
+                    ):
+                        self._counters["failures"] += 1
+                        settled = True
+                        self.breaker.record(False)
+                        raise LLMUnavailable(str(e) or type(e).__name__) from e
+                    self._counters["retries"] += 1
+                    attempt += 1
+                    await asyncio.sleep(delay)
+        finally:
+            if not settled:
+                # cancelled (CancelledError is not an Exception): free a half-open trial
+                self.breaker.release()
+
+    async def stream(self, **kwargs):
+        """
+        Streaming completion yielding content deltas. Retries only happen before
+        the first token; the deadline applies to the whole stream. A consumer
+        that stops early (aclose / GeneratorExit, cancellation) records no
+        outcome but releases the breaker's trial slot.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpen("circuit open")
+
+        self._counters["calls"] += 1
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        settled = False
+        async with self._sem():
+            self._counters["in_flight"] += 1
+            try:
+                while True:
+                    try:
+                        stream = await asyncio.wait_for(
+                            self.client.chat.completions.create(stream=True, **kwargs),
+                            timeout=max(deadline - time.monotonic(), 0),
+                        )
+                        break
+                    except Exception as e:
+                        delay = backoff_delay(attempt)
+                        if (
+                            not is_retryable(e)
+                            or attempt >= self.max_retries
+                            or time.monotonic() + delay >= deadline
+                        ):
+                            raise
+                        self._counters["retries"] += 1
+                        attempt += 1
+                        await asyncio.sleep(delay)
+
+                iterator = stream.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(
+                            iterator.__anext__(), timeout=max(deadline - time.monotonic(), 0)
+                        )
+                    except StopAsyncIteration:
+                        break
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+
+                settled = True
+                self.breaker.record(True)
+
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self._counters["timeouts"] += 1
+                self._counters["failures"] += 1
+                settled = True
+                self.breaker.record(False)
+                raise LLMUnavailable(str(e) or type(e).__name__) from e
+            finally:
+                self._counters["in_flight"] -= 1
+                if not settled:
+                    self.breaker.release()
+
+    def stats(self) -> dict:
+        return {
+            **self._counters,
+            "max_concurrency": self.max_concurrency,
+            "breaker_state": self.breaker.state,
+            "breaker_rejected": self.breaker.rejected,
+        }
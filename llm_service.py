@@ -1,145 +1,308 @@
 # llm_service.py (Groq-powered)
+import asyncio
 import os
-from groq import Groq
+import time
+from contextlib import aclosing
+from groq import Groq, AsyncGroq
 from dotenv import load_dotenv
 
+from llm_cache import llm_cache, cache_key, ttl_for, LLM_CACHE_ENABLED
+from llm_client import ResilientLLMClient, CircuitOpen, breaker, LLM_DEADLINE
+from metrics import LLM_CALL_SECONDS, LLM_PROMPT_CHARS, LLM_USAGE_TOKENS, LLM_FAILURES, LLM_IN_FLIGHT
+from prompts import decision_prompt, status_prompt, full_explanation_prompt, chat_prompt
+
 dotenv_path = os.path.join(os.path.dirname(__file__), ".env")
 load_dotenv(dotenv_path)
 
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None   # e.g. http://localhost:9999 for fake_groq.py
+
+# SDK retries are off for both clients: the breaker must see every failure, and
+# retries / deadlines for the async path are handled by ResilientLLMClient
+client = Groq(api_key=os.getenv("GROQ_API_KEY"), base_url=GROQ_BASE_URL, timeout=LLM_DEADLINE, max_retries=0)
+async_client = AsyncGroq(api_key=os.getenv("GROQ_API_KEY"), base_url=GROQ_BASE_URL, max_retries=0)
+resilient_client = ResilientLLMClient(async_client)
 MODEL = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
+TEMPERATURE = 0.2
+MAX_TOKENS = 300
+LLM_UNAVAILABLE_PREFIX = "(LLM unavailable"
+
+
+def is_llm_failure(text: str | None) -> bool:
+    return text is None or text.startswith(LLM_UNAVAILABLE_PREFIX)
+
+
+def _observe(mode: str, outcome: str, started: float):
+    LLM_CALL_SECONDS.observe(time.perf_counter() - started, mode, outcome)
+    if outcome in ("error", "circuit_open"):
+        LLM_FAILURES.inc(mode)
+
+
+def _content(response) -> str:
+    # FOR YOUR SDK → message.content is an attribute, not a dict
+    content = response.choices[0].message.content
+    return content.strip() if isinstance(content, str) else str(content)
+
+
+def _record_usage(mode: str, response):
+    """Groq's own token counts, to check the estimates in prompts.py against."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    LLM_USAGE_TOKENS.inc(mode, "prompt", amount=getattr(usage, "prompt_tokens", 0) or 0)
+    LLM_USAGE_TOKENS.inc(mode, "completion", amount=getattr(usage, "completion_tokens", 0) or 0)
 
 
 # ============================================================
-# GROQ LLM CALL
+# GROQ LLM CALL (cached, see llm_cache.py)
 # ============================================================
-def _generate(prompt: str) -> str:
+def _generate(prompt: str, application: dict | None = None, chat: bool = False) -> str:
+    """
+    `application` tags the cache entry (for invalidation on status change) and
+    decides its TTL: explanations of approved/rejected applications never
+    expire; `chat` replies always get LLM_CACHE_TTL.
+    """
+    started = time.perf_counter()
+    LLM_PROMPT_CHARS.observe(len(prompt), "sync")
+    key = cache_key(MODEL, prompt, TEMPERATURE, MAX_TOKENS) if LLM_CACHE_ENABLED else None
+    if key:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            _observe("sync", "cached", started)
+            return cached
+
+    if not breaker.allow():
+        _observe("sync", "circuit_open", started)
+        return "(LLM unavailable: circuit open)"
+
+    started = time.perf_counter()
     try:
-        response = client.chat.completions.create(
-            model=MODEL,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.2,
-            max_tokens=300,
-        )
-
-        # FOR YOUR SDK → message.content is an attribute, not a dict
-        content = response.choices[0].message.content
-
-        return content.strip() if isinstance(content, str) else str(content)
+        with LLM_IN_FLIGHT.track("sync"):
+            response = client.chat.completions.create(
+                model=MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=TEMPERATURE,
+                max_tokens=MAX_TOKENS,
+            )
+        content = _content(response)
+        breaker.record(True)
+        _observe("sync", "ok", started)
+        _record_usage("sync", response)
 
     except Exception as e:
+        breaker.record(False)
+        _observe("sync", "error", started)
         print("🔥 LLM ERROR:", e)
         return f"(LLM unavailable: {e})"
 
+    if key:
+        llm_cache.record_generation(time.perf_counter() - started)
+        llm_cache.set(key, content, ttl_for(application, chat), _application_id(application), MODEL)
+    return content
 
 
 # ============================================================
-# OLD FUNCTION (still used by agent)
+# GROQ LLM CALL (async, used by main_async)
 # ============================================================
-def generate_llm_explanation(application: dict, agent_result: dict) -> str:
-    prompt = f"""
-Explain this loan decision clearly:
+async def _agenerate(prompt: str, application: dict | None = None, chat: bool = False) -> str:
+    started = time.perf_counter()
+    LLM_PROMPT_CHARS.observe(len(prompt), "async")
+    key = cache_key(MODEL, prompt, TEMPERATURE, MAX_TOKENS) if LLM_CACHE_ENABLED else None
+    if key:
+        # the persistent tier is psycopg2; keep it off the event loop
+        cached = await asyncio.to_thread(llm_cache.get, key)
+        if cached is not None:
+            _observe("async", "cached", started)
+            return cached
+
+    started = time.perf_counter()
+    try:
+        with LLM_IN_FLIGHT.track("async"):
+            response = await resilient_client.complete(
+                model=MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=TEMPERATURE,
+                max_tokens=MAX_TOKENS,
+            )
+        content = _content(response)
+        _observe("async", "ok", started)
+        _record_usage("async", response)
+
+    except Exception as e:
+        _observe("async", "circuit_open" if isinstance(e, CircuitOpen) else "error", started)
+        print("🔥 LLM ERROR:", e)
+        return f"(LLM unavailable: {e})"
+
+    if key:
+        llm_cache.record_generation(time.perf_counter() - started)
+        await asyncio.to_thread(
+            llm_cache.set, key, content, ttl_for(application, chat), _application_id(application), MODEL
+        )
+    return content
 
-Applicant:
-Name: {application.get('name')}
-Age: {application.get('age')}
-Income: {application.get('income')}
-Loan Amount: {application.get('loan_amount')}
 
-Results:
-Credit score: {agent_result['credit_score']['credit_score']}
-Risk level: {agent_result['risk']['risk_level']}
-Decision: {"approved" if agent_result['decision']['approved'] else "rejected"}
-Reason: {agent_result['decision']['reason']}
-"""
-    return _generate(prompt)
+def _application_id(application: dict | None) -> str | None:
+    return application.get("application_id") if application else None
 
 
 # ============================================================
-# STATUS EXPLANATION
+# GROQ LLM CALL (streaming; tokens are yielded as they arrive,
+# the assembled text is cached at the end)
 # ============================================================
-def generate_status_explanation(application: dict, history: list) -> str:
-    timeline = "\n".join(
-        f"- {h['old_status']} → {h['new_status']} at {h['changed_at']}"
-        for h in history
-    )
+def _delta(chunk) -> str:
+    if not chunk.choices:
+        return ""
+    return chunk.choices[0].delta.content or ""
+
+
+def _generate_stream(prompt: str, application: dict | None = None, chat: bool = False):
+    started = time.perf_counter()
+    LLM_PROMPT_CHARS.observe(len(prompt), "stream")
+    key = cache_key(MODEL, prompt, TEMPERATURE, MAX_TOKENS) if LLM_CACHE_ENABLED else None
+    if key:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            _observe("stream", "cached", started)
+            yield cached
+            return
+
+    if not breaker.allow():
+        _observe("stream", "circuit_open", started)
+        yield "(LLM unavailable: circuit open)"
+        return
+
+    started = time.perf_counter()
+    parts = []
+    settled = False
+    LLM_IN_FLIGHT.inc("stream")
+    try:
+        stream = client.chat.completions.create(
+            model=MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=TEMPERATURE,
+            max_tokens=MAX_TOKENS,
+            stream=True,
+        )
+        for chunk in stream:
+            delta = _delta(chunk)
+            if delta:
+                parts.append(delta)
+                yield delta
+        settled = True
+        breaker.record(True)
+        _observe("stream", "ok", started)
 
-    prompt = f"""
-Explain this loan application's processing timeline.
+    except Exception as e:
+        settled = True
+        breaker.record(False)
+        _observe("stream", "error", started)
+        print("🔥 LLM ERROR:", e)
+        yield f"(LLM unavailable: {e})"
+        return
+    finally:
+        LLM_IN_FLIGHT.dec("stream")
+        if not settled:
+            # the SSE client went away mid-stream (GeneratorExit): free a half-open trial
+            breaker.release()
+
+    if key:
+        llm_cache.record_generation(time.perf_counter() - started)
+        llm_cache.set(key, "".join(parts).strip(), ttl_for(application, chat), _application_id(application), MODEL)
+
+
+async def _agenerate_stream(prompt: str, application: dict | None = None, chat: bool = False):
+    started = time.perf_counter()
+    LLM_PROMPT_CHARS.observe(len(prompt), "async_stream")
+    key = cache_key(MODEL, prompt, TEMPERATURE, MAX_TOKENS) if LLM_CACHE_ENABLED else None
+    if key:
+        cached = await asyncio.to_thread(llm_cache.get, key)
+        if cached is not None:
+            _observe("async_stream", "cached", started)
+            yield cached
+            return
+
+    started = time.perf_counter()
+    parts = []
+    LLM_IN_FLIGHT.inc("async_stream")
+    try:
+        # aclosing: a disconnect closes the client stream now (releasing its breaker
+        # trial), not whenever the abandoned generator is garbage collected
+        async with aclosing(resilient_client.stream(
+            model=MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=TEMPERATURE,
+            max_tokens=MAX_TOKENS,
+        )) as deltas:
+            async for delta in deltas:
+                parts.append(delta)
+                yield delta
+        _observe("async_stream", "ok", started)
 
-Application ID: {application['application_id']}
+    except Exception as e:
+        _observe("async_stream", "circuit_open" if isinstance(e, CircuitOpen) else "error", started)
+        print("🔥 LLM ERROR:", e)
+        yield f"(LLM unavailable: {e})"
+        return
+    finally:
+        LLM_IN_FLIGHT.dec("async_stream")
+
+    if key:
+        llm_cache.record_generation(time.perf_counter() - started)
+        await asyncio.to_thread(
+            llm_cache.set, key, "".join(parts).strip(), ttl_for(application, chat),
+            _application_id(application), MODEL,
+        )
 
-Timeline:
-{timeline}
 
-Write a short, friendly explanation for the customer.
-"""
-    return _generate(prompt)
+# ============================================================
+# OLD FUNCTION (still used by agent)
+# ============================================================
+def generate_llm_explanation(application: dict, agent_result: dict) -> str:
+    return _generate(decision_prompt(application, agent_result), application)
+
+
+# ============================================================
+# STATUS EXPLANATION
+# ============================================================
+def generate_status_explanation(application: dict, history: list) -> str:
+    return _generate(status_prompt(application, history), application)
 
 
 # ============================================================
 # FULL APPLICATION EXPLANATION (for /explain)
 # ============================================================
 def generate_full_explanation(app, agent_data, history):
-    timeline = "".join(
-        f"- {h['old_status']} → {h['new_status']} at {h['changed_at']}\n"
-        for h in history
-    )
-
-    prompt = f"""
-Provide a detailed explanation of this loan application:
+    return {"llm_explanation": _generate(full_explanation_prompt(app, agent_data, history), app)}
 
-Applicant: {app['name']}
-Age: {app['age']}
-Income: {app['income']}
-Loan Amount: {app['loan_amount']}
-PAN: {app['pan']}
 
-Internal Calculations:
-- Credit Score: {agent_data['credit_score']}
-- Risk Level: {agent_data['risk_level']}
-- Decision Reason: {agent_data['decision_reason']}
+async def agenerate_full_explanation(app, agent_data, history):
+    return {"llm_explanation": await _agenerate(full_explanation_prompt(app, agent_data, history), app)}
 
-Final Status: {app['status']}
 
-Timeline:
-{timeline}
+def stream_full_explanation(app, agent_data, history):
+    return _generate_stream(full_explanation_prompt(app, agent_data, history), app)
 
-Write a clear and structured explanation suitable for the customer.
-"""
 
-    return {"llm_explanation": _generate(prompt)}
+def astream_full_explanation(app, agent_data, history):
+    return _agenerate_stream(full_explanation_prompt(app, agent_data, history), app)
 
 
 # ============================================================
 # CUSTOMER CHAT
+# (`session` is a chat_sessions.ChatSession with its context attached)
 # ============================================================
-def generate_chat_response(app, history, message):
-    timeline = "".join(
-        f"- {h['old_status']} → {h['new_status']} at {h['changed_at']}\n"
-        for h in history
-    )
-
-    prompt = f"""
-You are a helpful loan assistant AI.
-
-Customer question:
-"{message}"
-
-Application details:
-- Name: {app['name']}
-- Age: {app['age']}
-- Income: {app['income']}
-- Loan Amount: {app['loan_amount']}
-- Current Status: {app['status']}
-- Credit Score: {app['credit_score']}
-- Risk Level: {app['risk_level']}
-- Decision Reason: {app['decision_reason']}
-
-Full Timeline:
-{timeline}
-
-Respond politely and clearly.
-"""
-
-    return {"response": _generate(prompt)}
+def generate_chat_response(session, message):
+    prompt = chat_prompt(session.context, session.turns, message)
+    return {"response": _generate(prompt, session.application, chat=True)}
+
+
+async def agenerate_chat_response(session, message):
+    prompt = chat_prompt(session.context, session.turns, message)
+    return {"response": await _agenerate(prompt, session.application, chat=True)}
+
+
+def stream_chat_response(session, message):
+    return _generate_stream(chat_prompt(session.context, session.turns, message), session.application, chat=True)
+
+
+def astream_chat_response(session, message):
+    return _agenerate_stream(chat_prompt(session.context, session.turns, message), session.application, chat=True)
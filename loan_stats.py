@@ -0,0 +1,208 @@
+# loan_stats.py
+"""
+Officer dashboard aggregates (loan_status_stats, migration 6).
+
+Triggers on loan_applications keep application counts per (UTC day, status,
+risk level), spread over 16 slots, in the same transaction as every status
+change. GET /loan/stats reads a window of that table plus the oldest
+manual-review row, so its cost does not grow with loan_applications. A
+background reconciler compares the counters with the base table and rewrites
+them only when they have drifted; an advisory lock lets one worker (or CLI run)
+reconcile at a time.
+
+    python loan_stats.py show --days 7
+    python loan_stats.py check                # compare counters with loan_applications
+    python loan_stats.py check --repair       # ... and rewrite them if they differ
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+
+from db_postgres import transaction
+
+STATS_DEFAULT_DAYS = 30
+STATS_MAX_DAYS = int(os.getenv("STATS_MAX_DAYS", "366"))
+STATS_RECONCILE_INTERVAL = float(os.getenv("STATS_RECONCILE_INTERVAL", "3600"))   # seconds, 0 disables
+RECONCILE_LOCK_ID = 7_314_003     # one full-table reconcile at a time across workers
+
+
+def dashboard_stats(days: int = STATS_DEFAULT_DAYS) -> dict:
+    """Counts by status, risk level and day over the last `days` days, plus the review backlog."""
+    days = max(1, min(days, STATS_MAX_DAYS))
+    now = datetime.utcnow()
+    since = now.date() - timedelta(days=days - 1)
+
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT day, status, risk_level, SUM(count)
+            FROM loan_status_stats
+            WHERE day >= %s
+            GROUP BY 1, 2, 3
+            HAVING SUM(count) <> 0
+            ORDER BY 1;
+        """, (since,))
+        rows = cur.fetchall()
+        cur.execute("""
+            SELECT
+                (SELECT COALESCE(SUM(count), 0) FROM loan_status_stats WHERE status = 'manual_review'),
+                (SELECT MIN(created_at) FROM loan_applications WHERE status = 'manual_review');
+        """)
+        pending, oldest = cur.fetchone()
+
+    by_status, by_risk, by_day = {}, {}, {}
+    for day, status, risk_level, n in rows:
+        n = int(n)
+        by_status[status] = by_status.get(status, 0) + n
+        by_risk[risk_level] = by_risk.get(risk_level, 0) + n
+        bucket = by_day.setdefault(day, {"day": day.isoformat(), "total": 0, "by_status": {}})
+        bucket["total"] += n
+        bucket["by_status"][status] = bucket["by_status"].get(status, 0) + n
+
+    decided = by_status.get("approved", 0) + by_status.get("rejected", 0)
+    return {
+        "days": days,
+        "since": since.isoformat(),
+        "total": sum(by_status.values()),
+        "by_status": by_status,
+        "by_risk_level": by_risk,
+        "by_day": list(by_day.values()),
+        "approval_rate": round(by_status.get("approved", 0) / decided, 4) if decided else None,
+        "manual_review": {
+            "pending": int(pending),
+            "oldest_created_at": oldest.isoformat() if oldest else None,
+            "queue_age_seconds": round((now - oldest).total_seconds(), 1) if oldest else None,
+        },
+    }
+
+
+# Counter rows that disagree with loan_applications
+_MISMATCHES = """
+    WITH base AS (
+        SELECT created_at::date AS day, status, COALESCE(risk_level, 'none') AS risk_level,
+               hashtext(application_id) & 15 AS slot, COUNT(*) AS n
+        FROM loan_applications
+        GROUP BY 1, 2, 3, 4
+    )
+    SELECT COALESCE(base.day, s.day), COALESCE(base.status, s.status),
+           COALESCE(base.risk_level, s.risk_level), COALESCE(base.slot, s.slot),
+           COALESCE(base.n, 0), COALESCE(s.count, 0)
+    FROM base
+    FULL JOIN loan_status_stats s
+      ON base.day = s.day AND base.status = s.status
+     AND base.risk_level = s.risk_level AND base.slot = s.slot
+    WHERE COALESCE(base.n, 0) <> COALESCE(s.count, 0)
+    ORDER BY 1, 2, 3, 4;
+"""
+
+
+def check(repair: bool = False) -> dict:
+    """
+    Reconcile the counters against the base table on one snapshot (REPEATABLE
+    READ). With `repair`, the counter table is locked against trigger writes
+    and the differing rows are rewritten; zero rows are dropped.
+    Holds a transaction-level advisory lock: while another worker is
+    reconciling, nothing is scanned and `skipped` is set (mismatches None).
+    """
+    with transaction(independent=True) as conn:
+        cur = conn.cursor()
+        if not repair:
+            cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ;")
+        cur.execute("SELECT pg_try_advisory_xact_lock(%s);", (RECONCILE_LOCK_ID,))
+        if not cur.fetchone()[0]:
+            return {"mismatches": None, "repaired": 0, "examples": [],
+                    "skipped": "another reconcile holds the lock"}
+        if repair:
+            # blocks status changes (their triggers) until commit
+            cur.execute("LOCK TABLE loan_status_stats IN EXCLUSIVE MODE;")
+        cur.execute(_MISMATCHES)
+        mismatches = cur.fetchall()
+
+        if repair and mismatches:
+            cur.executemany("""
+                INSERT INTO loan_status_stats (day, status, risk_level, slot, count)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (day, status, risk_level, slot) DO UPDATE SET count = EXCLUDED.count;
+            """, [m[:5] for m in mismatches])
+            cur.execute("DELETE FROM loan_status_stats WHERE count = 0;")
+
+    return {
+        "mismatches": len(mismatches),
+        "repaired": len(mismatches) if repair else 0,
+        "examples": [
+            {"day": day.isoformat(), "status": status, "risk_level": risk_level, "slot": slot,
+             "expected": expected, "counted": counted}
+            for day, status, risk_level, slot, expected, counted in mismatches[:20]
+        ],
+    }
+
+
+class StatsReconciler:
+    """
+    Periodic check; the locking repair only runs when drift was found. Every
+    API worker runs one, but the advisory lock in check() means concurrent
+    passes skip instead of scanning loan_applications side by side.
+    """
+
+    def __init__(self, interval: float = STATS_RECONCILE_INTERVAL):
+        self.interval = interval
+        self.last_report = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread or self.interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="stats-reconciler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def reconcile(self) -> dict:
+        report = check()
+        if report["mismatches"]:
+            print("⚠️ STATS DRIFT:", report["mismatches"], "counter rows; repairing")
+            report = check(repair=True)
+        self.last_report = {**report, "at": datetime.utcnow().isoformat()}
+        return self.last_report
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.reconcile()
+            except Exception as e:
+                print("⚠️ STATS RECONCILE ERROR:", e)
+
+
+stats_reconciler = StatsReconciler()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Officer dashboard aggregates.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    show_cmd = sub.add_parser("show", help="print the dashboard stats")
+    show_cmd.add_argument("--days", type=int, default=STATS_DEFAULT_DAYS)
+    check_cmd = sub.add_parser("check", help="reconcile counters against loan_applications")
+    check_cmd.add_argument("--repair", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.command == "show":
+        print(json.dumps(dashboard_stats(args.days), indent=2))
+        return
+
+    report = check(repair=args.repair)
+    print(json.dumps(report, indent=2))
+    if report["mismatches"] and not args.repair:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,85 +1,95 @@
 # main.py
-from fastapi import FastAPI, HTTPException
+"""
+Sync API: psycopg2 + the threadpool (API_MODE=sync, the default).
+
+Routes shared with main_async.py (ingestion, stats, live feed, /internal,
+/metrics) come from api_common.create_app; this module only adds the routes
+that go through db_postgres and the sync Groq client.
+
+    uvicorn main:app          # or: uvicorn asgi:app
+"""
+from fastapi import Depends, HTTPException
 import os
-from models import LoanApplicationCreate, LoanApplicationOut, ManualReviewRequest, ChatRequest
-from services import generate_application_data
-from fastapi.middleware.cors import CORSMiddleware
+from dotenv import load_dotenv
+
+from models import (
+    LoanApplicationOut,
+    ManualReviewRequest,
+    ManualReviewBatchRequest,
+    ManualReviewBatchResponse,
+    ChatRequest,
+)
+from services import after_status_change
 from db_postgres import (
-    init_db,
-    insert_application,
     get_application,
-    get_status_history,
-    record_manual_review,
-    log_status_change,
+    get_application_with_history,
+    PROMPT_COLUMNS,
+    review_applications,
+    list_applications,
+    iter_applications,
+    close_pool,
+)
+from llm_service import (
+    generate_full_explanation,
+    generate_chat_response,
+    stream_full_explanation,
+    stream_chat_response,
+)
+from chat_sessions import chat_store
+from api_common import (
+    create_app,
+    listing_params,
+    split_listing,
+    ndjson_response,
+    ndjson_line,
+    prompt_row_or_404,
+    agent_sim,
+    sse_relay,
+    sse_response,
+    chat_session_headers,
+    review_batch_decisions,
+    review_decisions_or_400,
+    review_batch_response,
+    review_not_applied,
 )
-from agent import run_agent
-from llm_service import generate_full_explanation, generate_chat_response
-from dotenv import load_dotenv
-from db_postgres import get_connection
 
 dotenv_path = os.path.join(os.path.dirname(__file__), ".env")
 load_dotenv(dotenv_path)
 
-app = FastAPI(title="Bank Loan STP API with GenAI")
+app = create_app("Bank Loan STP API with GenAI")
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],            # Allow all frontend origins
-    allow_credentials=True,
-    allow_methods=["*"],            # GET, POST, PUT, DELETE, OPTIONS
-    allow_headers=["*"],            # All headers
-)
 
-init_db()
+@app.on_event("shutdown")
+def shutdown():
+    close_pool()
+
 
 # ============================================================
-# CUSTOMER: CREATE APPLICATION
+# OFFICER DASHBOARD: LISTINGS
+# Keyset pagination on (created_at, application_id), `fields=` projection
+# (heavy LLM text columns excluded by default), filters, and an optional
+# NDJSON stream backed by a server-side cursor.
 # ============================================================
-@app.post("/loan/", response_model=LoanApplicationOut)
-def create_loan_application(request: LoanApplicationCreate):
+def _list_response(params: dict, status: str | None):
+    fields, limit, stream, filters = split_listing(params, status)
     try:
-        data = generate_application_data(request)
-        insert_application(data)
-    except Exception as e:
+        if stream:
+            return ndjson_response(ndjson_line(row) for row in iter_applications(fields, **filters))
+        items, next_cursor = list_applications(fields, limit, **filters)
+    except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-    record = {
-        **data,
-        "history": get_status_history(data["application_id"])
-    }
-    return LoanApplicationOut(**record)
+    return {"items": items, "next_cursor": next_cursor}
 
 
-# ============================================================
-# OFFICER DASHBOARD: GET ALL APPLICATIONS
-# ============================================================
 @app.get("/loan/all")
-def get_all_applications():
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM loan_applications ORDER BY created_at DESC")
-    rows = cur.fetchall()
-    conn.close()
-
-    return rows
+def get_all_applications(status: str | None = None, params: dict = Depends(listing_params)):
+    return _list_response(params, status)
 
 
-# ============================================================
-# OFFICER DASHBOARD: GET ALL MANUAL REVIEW APPLICATIONS
-# ============================================================
 @app.get("/loan/pending_review")
-def pending_manual_review():
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT * FROM loan_applications
-        WHERE status = 'manual_review'
-        ORDER BY created_at DESC
-    """)
-    rows = cur.fetchall()
-    conn.close()
-
-    return rows
+def pending_manual_review(params: dict = Depends(listing_params)):
+    return _list_response(params, "manual_review")
 
 
 # ============================================================
@@ -87,82 +97,83 @@ def pending_manual_review():
 # ============================================================
 @app.get("/loan/{application_id}", response_model=LoanApplicationOut)
 def get_application_status(application_id: str):
-    row = get_application(application_id)
+    row = get_application_with_history(application_id)
     if not row:
         raise HTTPException(status_code=404, detail="Application not found")
-
-    row["history"] = get_status_history(application_id)
     return LoanApplicationOut(**row)
 
 
 # ============================================================
 # CUSTOMER: ON-DEMAND LLM EXPLANATION
 # ============================================================
+def _load_with_history(application_id: str):
+    """Only the columns the explain / chat prompts use, plus the history, in one query."""
+    return prompt_row_or_404(get_application_with_history(application_id, PROMPT_COLUMNS))
+
+
 @app.get("/loan/{application_id}/explain")
 def explain_application(application_id: str):
-    row = get_application(application_id)
-    if not row:
-        raise HTTPException(status_code=404, detail="Application not found")
-
-    history = get_status_history(application_id)
+    row, history = _load_with_history(application_id)
+    return generate_full_explanation(row, agent_sim(row), history)
 
-    agent_sim = {
-        "credit_score": row["credit_score"],
-        "risk_level": row["risk_level"],
-        "decision_reason": row["decision_reason"]
-    }
 
-    return generate_full_explanation(row, agent_sim, history)
+@app.get("/loan/{application_id}/explain/stream")
+def explain_application_stream(application_id: str):
+    row, history = _load_with_history(application_id)
+    return sse_response(sse_relay(stream_full_explanation(row, agent_sim(row), history), "llm_explanation"))
 
 
 # ============================================================
 # CUSTOMER: CHAT WITH LLM ABOUT APPLICATION
 # ============================================================
+def _chat_session(application_id: str, session_id: str | None):
+    """Session with its application context; Postgres is read only when the context is not cached."""
+    session = chat_store.open(application_id, session_id)
+    if session.context is None:
+        row, history = _load_with_history(application_id)
+        chat_store.attach_context(session, row, history)
+    return session
+
+
 @app.post("/loan/{application_id}/chat")
 def chat_about_application(application_id: str, req: ChatRequest):
-    row = get_application(application_id)
-    if not row:
-        raise HTTPException(status_code=404, detail="Application not found")
+    session = _chat_session(application_id, req.session_id)
+    result = generate_chat_response(session, req.message)
+    chat_store.remember(session, req.message, result["response"])
+    return {**result, "session_id": session.session_id}
 
-    history = get_status_history(application_id)
 
-    return generate_chat_response(row, history, req.message)
+@app.post("/loan/{application_id}/chat/stream")
+def chat_about_application_stream(application_id: str, req: ChatRequest):
+    session = _chat_session(application_id, req.session_id)
+    chunks = chat_store.stream_turn(session, req.message, stream_chat_response(session, req.message))
+    return sse_response(
+        sse_relay(chunks, "response", {"session_id": session.session_id}), chat_session_headers(session)
+    )
 
 
 # ============================================================
 # OFFICER: MANUAL REVIEW APPROVE/REJECT
 # ============================================================
-@app.put("/loan/{application_id}/review")
-def review_application(application_id: str, req: ManualReviewRequest):
-    row = get_application(application_id)
-    if not row:
-        raise HTTPException(status_code=404, detail="Application not found")
+@app.put("/loan/review/batch", response_model=ManualReviewBatchResponse)
+def review_applications_batch(req: ManualReviewBatchRequest):
+    # one statement for the whole batch; rows no longer pending review are skipped
+    decisions = review_batch_decisions(req)
+    reviewed = {}
+    for row in review_applications(decisions):
+        reviewed[row["application_id"]] = row["status"]
+        after_status_change(row["application_id"], row["status"])
+    return review_batch_response(decisions, reviewed)
 
-    if row["status"] != "manual_review":
-        raise HTTPException(status_code=400, detail="Application is not pending manual review")
 
-    action = req.action.lower()
-    if action not in ("approve", "reject"):
-        raise HTTPException(status_code=400, detail="Action must be approve/reject")
-
-    new_status = "approved" if action == "approve" else "rejected"
-
-    record_manual_review(application_id, req.officer, new_status, req.notes)
-
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        UPDATE loan_applications
-        SET status=%s, officer_notes=%s, reviewed_by=%s
-        WHERE application_id=%s
-    """, (new_status, req.notes, req.officer, application_id))
-    conn.commit()
-    conn.close()
-
-    log_status_change(application_id, "manual_review", new_status)
-
-    updated = get_application(application_id)
-    updated["history"] = get_status_history(application_id)
+@app.put("/loan/{application_id}/review")
+def review_application(application_id: str, req: ManualReviewRequest):
+    # the UPDATE only matches while status = 'manual_review', so concurrent reviews cannot both apply
+    decisions = review_decisions_or_400([(application_id, req.action, req.notes)], req.officer)
+    rows = review_applications(decisions, with_history=True)
+    if not rows:
+        review_not_applied(bool(get_application(application_id)))
+
+    updated = rows[0]
+    after_status_change(application_id, updated["status"])
     return updated
-
-
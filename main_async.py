@@ -0,0 +1,191 @@
+# main_async.py
+"""
+Async variant of the API (same routes and payloads as main.py).
+
+Routes shared with main.py come from api_common.create_app. This module adds
+the routes that read and write through the asyncpg pool in db_postgres_async
+and call Groq through AsyncGroq, so a slow Groq call no longer pins a
+threadpool worker. What still runs on threads is listed in the README
+("Sync and async API").
+
+    uvicorn main_async:app          # or: API_MODE=async uvicorn asgi:app
+"""
+from fastapi import Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+import os
+from dotenv import load_dotenv
+
+from models import (
+    LoanApplicationOut,
+    ManualReviewRequest,
+    ManualReviewBatchRequest,
+    ManualReviewBatchResponse,
+    ChatRequest,
+)
+from services import after_status_change
+from db_postgres import close_pool as close_sync_pool, PROMPT_COLUMNS
+from db_postgres_async import (
+    init_pool,
+    close_pool,
+    get_application,
+    get_application_with_history,
+    review_applications,
+    list_applications,
+    iter_applications,
+)
+from llm_service import (
+    agenerate_full_explanation,
+    agenerate_chat_response,
+    astream_full_explanation,
+    astream_chat_response,
+)
+from chat_sessions import chat_store
+from api_common import (
+    create_app,
+    listing_params,
+    split_listing,
+    ndjson_response,
+    ndjson_line,
+    prompt_row_or_404,
+    agent_sim,
+    asse_relay,
+    sse_response,
+    chat_session_headers,
+    review_batch_decisions,
+    review_decisions_or_400,
+    review_batch_response,
+    review_not_applied,
+)
+
+dotenv_path = os.path.join(os.path.dirname(__file__), ".env")
+load_dotenv(dotenv_path)
+
+# asyncpg statements are not round-trip counted: no per-request query histogram here
+app = create_app("Bank Loan STP API with GenAI (async)", count_queries=False)
+
+
+@app.on_event("startup")
+async def startup():
+    await init_pool()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await close_pool()
+    close_sync_pool()
+
+
+# ============================================================
+# OFFICER DASHBOARD: LISTINGS (see main.py)
+# ============================================================
+async def _list_response(params: dict, status: str | None):
+    fields, limit, stream, filters = split_listing(params, status)
+    try:
+        if stream:
+            async def ndjson():
+                async for row in iter_applications(fields, **filters):
+                    yield ndjson_line(row)
+
+            return ndjson_response(ndjson())
+        items, next_cursor = await list_applications(fields, limit, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@app.get("/loan/all")
+async def get_all_applications(status: str | None = None, params: dict = Depends(listing_params)):
+    return await _list_response(params, status)
+
+
+@app.get("/loan/pending_review")
+async def pending_manual_review(params: dict = Depends(listing_params)):
+    return await _list_response(params, "manual_review")
+
+
+# ============================================================
+# CUSTOMER: GET APPLICATION STATUS
+# ============================================================
+@app.get("/loan/{application_id}", response_model=LoanApplicationOut)
+async def get_application_status(application_id: str):
+    row = await get_application_with_history(application_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Application not found")
+    return LoanApplicationOut(**row)
+
+
+# ============================================================
+# CUSTOMER: ON-DEMAND LLM EXPLANATION
+# ============================================================
+async def _load_with_history(application_id: str):
+    """Only the columns the explain / chat prompts use, plus the history, in one query."""
+    return prompt_row_or_404(await get_application_with_history(application_id, PROMPT_COLUMNS))
+
+
+@app.get("/loan/{application_id}/explain")
+async def explain_application(application_id: str):
+    row, history = await _load_with_history(application_id)
+    return await agenerate_full_explanation(row, agent_sim(row), history)
+
+
+@app.get("/loan/{application_id}/explain/stream")
+async def explain_application_stream(application_id: str):
+    row, history = await _load_with_history(application_id)
+    return sse_response(asse_relay(astream_full_explanation(row, agent_sim(row), history), "llm_explanation"))
+
+
+# ============================================================
+# CUSTOMER: CHAT WITH LLM ABOUT APPLICATION
+# ============================================================
+async def _chat_session(application_id: str, session_id: str | None):
+    """Session with its application context; Postgres is read only when the context is not cached."""
+    session = await chat_store.aopen(application_id, session_id)
+    if session.context is None:
+        row, history = await _load_with_history(application_id)
+        chat_store.attach_context(session, row, history)
+    return session
+
+
+@app.post("/loan/{application_id}/chat")
+async def chat_about_application(application_id: str, req: ChatRequest):
+    session = await _chat_session(application_id, req.session_id)
+    result = await agenerate_chat_response(session, req.message)
+    await chat_store.aremember(session, req.message, result["response"])
+    return {**result, "session_id": session.session_id}
+
+
+@app.post("/loan/{application_id}/chat/stream")
+async def chat_about_application_stream(application_id: str, req: ChatRequest):
+    session = await _chat_session(application_id, req.session_id)
+    chunks = chat_store.astream_turn(session, req.message, astream_chat_response(session, req.message))
+    return sse_response(
+        asse_relay(chunks, "response", {"session_id": session.session_id}), chat_session_headers(session)
+    )
+
+
+# ============================================================
+# OFFICER: MANUAL REVIEW APPROVE/REJECT
+# ============================================================
+@app.put("/loan/review/batch", response_model=ManualReviewBatchResponse)
+async def review_applications_batch(req: ManualReviewBatchRequest):
+    # one statement for the whole batch; rows no longer pending review are skipped
+    decisions = review_batch_decisions(req)
+    reviewed = {}
+    for row in await review_applications(decisions):
+        reviewed[row["application_id"]] = row["status"]
+        await run_in_threadpool(after_status_change, row["application_id"], row["status"])
+    return review_batch_response(decisions, reviewed)
+
+
+@app.put("/loan/{application_id}/review")
+async def review_application(application_id: str, req: ManualReviewRequest):
+    # the UPDATE only matches while status = 'manual_review', so concurrent reviews cannot both apply
+    decisions = review_decisions_or_400([(application_id, req.action, req.notes)], req.officer)
+    rows = await review_applications(decisions, with_history=True)
+    if not rows:
+        review_not_applied(bool(await get_application(application_id)))
+
+    updated = rows[0]
+    await run_in_threadpool(after_status_change, application_id, updated["status"])
+    return updated
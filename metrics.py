@@ -0,0 +1,230 @@
+# metrics.py
+"""
+In-process metrics in the Prometheus text exposition format (GET /metrics).
+
+Counters, gauges and histograms are plain Python objects guarded by one lock
+each; an observation is a bisect into the bucket bounds plus a few integer
+updates, so instrumentation stays enabled in production. Gauges can also be
+backed by a callback evaluated at scrape time (pool usage, queue depth).
+No project imports here, so any module can instrument itself.
+
+METRICS_ENABLED=false turns every observation into a no-op.
+"""
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# seconds: 0.5 ms … 30 s
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+SIZE_BUCKETS = (256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+TOKEN_BUCKETS = (32, 64, 128, 192, 256, 384, 512, 768, 1024, 2048, 4096)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _register(metric):
+    with _registry_lock:
+        _registry.append(metric)
+    return metric
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+        _register(self)
+
+    def inc(self, *labels, amount: float = 1):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield self.name + _labels(self.labelnames, labels), value
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), callback=None):
+        """`callback()` → {label_tuple: value} (or a number when there are no labels), read at scrape."""
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.callback = callback
+        self._values = {}
+        self._lock = threading.Lock()
+        _register(self)
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    @contextmanager
+    def track(self, *labels):
+        """+1 while the block runs (in-flight work)."""
+        self.inc(*labels)
+        try:
+            yield
+        finally:
+            self.dec(*labels)
+
+    def samples(self):
+        if self.callback is not None:
+            try:
+                values = self.callback()
+            except Exception:
+                return
+            items = values.items() if isinstance(values, dict) else [((), values)]
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        for labels, value in items:
+            yield self.name + _labels(self.labelnames, labels), value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}     # labels → [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        _register(self)
+
+    def observe(self, value: float, *labels):
+        if not METRICS_ENABLED:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                yield self.name + "_bucket" + _labels(self.labelnames, labels, f'le="{_number(bound)}"'), cumulative
+            yield self.name + "_sum" + _labels(self.labelnames, labels), series[-1]
+            yield self.name + "_count" + _labels(self.labelnames, labels), cumulative
+
+
+def timed(histogram: Histogram, label: str | None = None):
+    """Decorator: observe the wrapped function's duration (label defaults to its name)."""
+    def decorate(fn):
+        name = label or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not METRICS_ENABLED:
+                return fn(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started, name)
+        return wrapper
+    return decorate
+
+
+def render() -> str:
+    """All registered metrics in the Prometheus text format (version 0.0.4)."""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for sample, value in metric.samples():
+            lines.append(f"{sample} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# ============================================================
+# SHARED METRICS
+# ============================================================
+HTTP_REQUEST_SECONDS = Histogram(
+    "loan_http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+HTTP_REQUEST_QUERIES = Histogram(
+    "loan_http_request_db_queries", "DB round trips per HTTP request", ("method", "route"), COUNT_BUCKETS
+)
+PIPELINE_STAGE_SECONDS = Histogram(
+    "loan_pipeline_stage_duration_seconds", "generate_application_data stages", ("stage",)
+)
+AGENT_STEP_SECONDS = Histogram(
+    "loan_agent_step_duration_seconds", "run_agent steps", ("step",)
+)
+DB_HELPER_SECONDS = Histogram(
+    "loan_db_helper_duration_seconds", "db_postgres helper latency", ("helper",)
+)
+LLM_CALL_SECONDS = Histogram(
+    "loan_llm_call_duration_seconds", "LLM calls by mode and outcome", ("mode", "outcome")
+)
+LLM_PROMPT_CHARS = Histogram(
+    "loan_llm_prompt_chars", "LLM prompt size in characters", ("mode",), SIZE_BUCKETS
+)
+LLM_PROMPT_TOKENS = Histogram(
+    "loan_llm_prompt_tokens", "Estimated prompt tokens by endpoint (prompts.py)", ("endpoint",), TOKEN_BUCKETS
+)
+LLM_USAGE_TOKENS = Counter(
+    "loan_llm_usage_tokens_total", "Tokens billed by Groq (response usage)", ("mode", "kind")
+)
+LLM_FAILURES = Counter("loan_llm_failures_total", "LLM calls that fell back to '(LLM unavailable ...)'", ("mode",))
+LLM_IN_FLIGHT = Gauge("loan_llm_in_flight", "LLM requests currently waiting on Groq", ("mode",))
@@ -0,0 +1,845 @@
+# migrations.py
+"""
+Versioned schema migrations.
+
+    python migrations.py status
+    python migrations.py up [--target N]
+    python migrations.py down --target N
+    python migrations.py verify          # EXPLAIN the hot queries, fail if one stops using its index
+
+Applied versions are recorded in `schema_version`. `migrate()` runs at API
+startup (via db_postgres.init_db) and is a no-op once the schema is current;
+a Postgres advisory lock keeps concurrently starting workers from racing.
+Each migration runs in its own transaction.
+"""
+import argparse
+import json
+import sys
+from dataclasses import dataclass, field
+
+from db_postgres import get_connection, build_with_history_query, PROMPT_COLUMNS
+from pan_counts import PAN_COUNTS_RETAIN_DAYS
+
+MIGRATION_LOCK_ID = 7_314_001  # arbitrary, shared by every process running migrations
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    up: list = field(default_factory=list)     # SQL strings or callables taking a cursor
+    down: list = field(default_factory=list)
+
+
+# ============================================================
+# MIGRATIONS (append only; never edit an applied migration)
+# ============================================================
+MIGRATIONS = [
+    Migration(
+        1, "baseline schema",
+        up=[
+            # 1. Main loan application table
+            """
+            CREATE TABLE IF NOT EXISTS loan_applications (
+                application_id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                age INTEGER NOT NULL,
+                income REAL NOT NULL,
+                loan_amount REAL NOT NULL,
+                pan TEXT NOT NULL,
+                status TEXT NOT NULL,
+                credit_score INTEGER,
+                risk_level TEXT,
+                decision_reason TEXT,
+                llm_explanation TEXT,
+                llm_status_explanation TEXT,
+                officer_notes TEXT,
+                reviewed_by TEXT,
+                created_at TIMESTAMP NOT NULL
+            );
+            """,
+            # 2. Status history table
+            """
+            CREATE TABLE IF NOT EXISTS loan_status_history (
+                id SERIAL PRIMARY KEY,
+                application_id TEXT NOT NULL,
+                old_status TEXT,
+                new_status TEXT NOT NULL,
+                changed_at TIMESTAMP NOT NULL DEFAULT NOW()
+            );
+            """,
+            # 3. Officer review actions table
+            """
+            CREATE TABLE IF NOT EXISTS loan_manual_review (
+                id SERIAL PRIMARY KEY,
+                application_id TEXT NOT NULL,
+                officer TEXT NOT NULL,
+                action TEXT NOT NULL,        -- approved / rejected
+                notes TEXT,
+                reviewed_at TIMESTAMP NOT NULL DEFAULT NOW()
+            );
+            """,
+            # 4. Credit Score Profile Table
+            """
+            CREATE TABLE IF NOT EXISTS credit_profile (
+                pan TEXT PRIMARY KEY,
+                credit_score INTEGER NOT NULL,
+                last_updated TIMESTAMP NOT NULL
+            );
+            """,
+            # Index for searching PAN
+            "CREATE INDEX IF NOT EXISTS idx_pan ON loan_applications (pan);",
+            # PAN must be unique ONLY when active
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS unique_active_pan
+            ON loan_applications (pan)
+            WHERE status IN ('submitted','processing','manual_review');
+            """,
+        ],
+        down=[
+            "DROP TABLE IF EXISTS credit_profile;",
+            "DROP TABLE IF EXISTS loan_manual_review;",
+            "DROP TABLE IF EXISTS loan_status_history;",
+            "DROP TABLE IF EXISTS loan_applications;",
+        ],
+    ),
+    Migration(
+        2, "hot path indexes",
+        up=[
+            # get_status_history: WHERE application_id = ? ORDER BY changed_at, id
+            """
+            CREATE INDEX IF NOT EXISTS idx_status_history_app_changed
+            ON loan_status_history (application_id, changed_at, id);
+            """,
+            # PAN lookups over a created_at range: rescore.py's recompute mode counts a
+            # PAN's applications in the window before each one (WHERE pan = ? AND
+            # created_at in (?, ?]); replaces idx_pan. The live 30-day count reads
+            # pan_daily_counts (migration 5) and active-PAN checks use unique_active_pan
+            """
+            CREATE INDEX IF NOT EXISTS idx_loan_pan_created
+            ON loan_applications (pan, created_at);
+            """,
+            "DROP INDEX IF EXISTS idx_pan;",
+            # /loan/all keyset pagination
+            """
+            CREATE INDEX IF NOT EXISTS idx_loan_created_id
+            ON loan_applications (created_at DESC, application_id DESC);
+            """,
+            # /loan/all?status=... and /loan/pending_review keyset pagination
+            """
+            CREATE INDEX IF NOT EXISTS idx_loan_status_created_id
+            ON loan_applications (status, created_at DESC, application_id DESC);
+            """,
+            # /loan/pending_review: small partial index over the review queue only
+            # (dropped again by migration 11: idx_loan_status_created_id serves it)
+            """
+            CREATE INDEX IF NOT EXISTS idx_loan_manual_review_created_id
+            ON loan_applications (created_at DESC, application_id DESC)
+            WHERE status = 'manual_review';
+            """,
+        ],
+        down=[
+            "DROP INDEX IF EXISTS idx_loan_manual_review_created_id;",
+            "DROP INDEX IF EXISTS idx_loan_status_created_id;",
+            "DROP INDEX IF EXISTS idx_loan_created_id;",
+            "CREATE INDEX IF NOT EXISTS idx_pan ON loan_applications (pan);",
+            "DROP INDEX IF EXISTS idx_loan_pan_created;",
+            "DROP INDEX IF EXISTS idx_status_history_app_changed;",
+        ],
+    ),
+    Migration(
+        3, "llm response cache",
+        up=[
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,                -- sha256(model, prompt, temperature, max_tokens)
+                application_id TEXT,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+                expires_at TIMESTAMP                 -- NULL = never (terminal applications)
+            );
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_llm_cache_application ON llm_cache (application_id);",
+            "CREATE INDEX IF NOT EXISTS idx_llm_cache_expires ON llm_cache (expires_at) WHERE expires_at IS NOT NULL;",
+        ],
+        down=[
+            "DROP TABLE IF EXISTS llm_cache;",
+        ],
+    ),
+    Migration(
+        4, "background status explanations",
+        up=[
+            # pending / ready / failed; NULL when no explanation is due
+            "ALTER TABLE loan_applications ADD COLUMN IF NOT EXISTS llm_status_explanation_state TEXT;",
+            """
+            UPDATE loan_applications SET llm_status_explanation_state = 'ready'
+            WHERE llm_status_explanation IS NOT NULL AND llm_status_explanation_state IS NULL;
+            """,
+            # sweeper: pending explanations, oldest first
+            """
+            CREATE INDEX IF NOT EXISTS idx_loan_explanation_pending
+            ON loan_applications (created_at)
+            WHERE llm_status_explanation_state = 'pending';
+            """,
+        ],
+        down=[
+            "DROP INDEX IF EXISTS idx_loan_explanation_pending;",
+            "ALTER TABLE loan_applications DROP COLUMN IF EXISTS llm_status_explanation_state;",
+        ],
+    ),
+    Migration(
+        5, "per-PAN daily application counts",
+        up=[
+            # Sliding-window side table for the "multiple loans within 30 days" rule;
+            # day = UTC calendar day of created_at. Aged out by `python pan_counts.py compact`.
+            """
+            CREATE TABLE IF NOT EXISTS pan_daily_counts (
+                pan TEXT NOT NULL,
+                day DATE NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (pan, day)
+            );
+            """,
+            # Statement-level triggers with transition tables: one upsert per
+            # INSERT / COPY statement, however many rows it writes (bulk ingestion)
+            """
+            CREATE OR REPLACE FUNCTION pan_daily_counts_on_insert() RETURNS trigger AS $$
+            BEGIN
+                INSERT INTO pan_daily_counts (pan, day, count)
+                SELECT pan, created_at::date, COUNT(*) FROM new_rows GROUP BY 1, 2
+                ON CONFLICT (pan, day) DO UPDATE
+                SET count = pan_daily_counts.count + EXCLUDED.count;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            """,
+            """
+            CREATE OR REPLACE FUNCTION pan_daily_counts_on_delete() RETURNS trigger AS $$
+            BEGIN
+                UPDATE pan_daily_counts c
+                SET count = c.count - o.n
+                FROM (SELECT pan, created_at::date AS day, COUNT(*) AS n
+                      FROM old_rows GROUP BY 1, 2) o
+                WHERE c.pan = o.pan AND c.day = o.day;
+                DELETE FROM pan_daily_counts WHERE count <= 0;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            """,
+            "DROP TRIGGER IF EXISTS trg_pan_daily_counts_insert ON loan_applications;",
+            """
+            CREATE TRIGGER trg_pan_daily_counts_insert
+            AFTER INSERT ON loan_applications
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION pan_daily_counts_on_insert();
+            """,
+            "DROP TRIGGER IF EXISTS trg_pan_daily_counts_delete ON loan_applications;",
+            """
+            CREATE TRIGGER trg_pan_daily_counts_delete
+            AFTER DELETE ON loan_applications
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION pan_daily_counts_on_delete();
+            """,
+            # Backfill the retention window from the base table (same bound as
+            # pan_counts.compact / check, so a fresh backfill reconciles cleanly)
+            f"""
+            INSERT INTO pan_daily_counts (pan, day, count)
+            SELECT pan, created_at::date, COUNT(*) FROM loan_applications
+            WHERE created_at >= (NOW() AT TIME ZONE 'UTC')::date - {PAN_COUNTS_RETAIN_DAYS:d}
+            GROUP BY 1, 2
+            ON CONFLICT (pan, day) DO UPDATE SET count = EXCLUDED.count;
+            """,
+        ],
+        down=[
+            "DROP TRIGGER IF EXISTS trg_pan_daily_counts_delete ON loan_applications;",
+            "DROP TRIGGER IF EXISTS trg_pan_daily_counts_insert ON loan_applications;",
+            "DROP FUNCTION IF EXISTS pan_daily_counts_on_delete();",
+            "DROP FUNCTION IF EXISTS pan_daily_counts_on_insert();",
+            "DROP TABLE IF EXISTS pan_daily_counts;",
+        ],
+    ),
+    Migration(
+        6, "dashboard status aggregates",
+        up=[
+            # Application counts per (UTC day of created_at, status, risk level). Each
+            # key is split over 16 slots by application_id so concurrent transactions
+            # rarely wait on the same counter row; readers SUM over slots.
+            """
+            CREATE TABLE IF NOT EXISTS loan_status_stats (
+                day DATE NOT NULL,
+                status TEXT NOT NULL,
+                risk_level TEXT NOT NULL,          -- 'none' until scored
+                slot SMALLINT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (day, status, risk_level, slot)
+            );
+            """,
+            # manual-review backlog total across all days
+            "CREATE INDEX IF NOT EXISTS idx_loan_status_stats_status ON loan_status_stats (status, day);",
+            # Every status transition is an INSERT / UPDATE / DELETE on loan_applications,
+            # so the counters move in the same transaction as the change (and its
+            # status history rows). Deltas are applied in key order to avoid deadlocks
+            # between concurrent multi-row statements (bulk ingestion, batch review).
+            """
+            CREATE OR REPLACE FUNCTION loan_status_stats_apply() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    INSERT INTO loan_status_stats (day, status, risk_level, slot, count)
+                    SELECT created_at::date, status, COALESCE(risk_level, 'none'),
+                           hashtext(application_id) & 15, COUNT(*)
+                    FROM new_rows GROUP BY 1, 2, 3, 4 ORDER BY 1, 2, 3, 4
+                    ON CONFLICT (day, status, risk_level, slot) DO UPDATE
+                    SET count = loan_status_stats.count + EXCLUDED.count;
+                ELSIF TG_OP = 'DELETE' THEN
+                    INSERT INTO loan_status_stats (day, status, risk_level, slot, count)
+                    SELECT created_at::date, status, COALESCE(risk_level, 'none'),
+                           hashtext(application_id) & 15, -COUNT(*)
+                    FROM old_rows GROUP BY 1, 2, 3, 4 ORDER BY 1, 2, 3, 4
+                    ON CONFLICT (day, status, risk_level, slot) DO UPDATE
+                    SET count = loan_status_stats.count + EXCLUDED.count;
+                ELSE
+                    -- only rows whose status / risk level / day actually changed
+                    INSERT INTO loan_status_stats (day, status, risk_level, slot, count)
+                    SELECT day, status, risk_level, slot, SUM(delta)
+                    FROM (
+                        SELECT n.created_at::date AS day, n.status, COALESCE(n.risk_level, 'none') AS risk_level,
+                               hashtext(n.application_id) & 15 AS slot, 1 AS delta
+                        FROM old_rows o JOIN new_rows n USING (application_id)
+                        WHERE (o.status, o.risk_level, o.created_at) IS DISTINCT FROM (n.status, n.risk_level, n.created_at)
+                        UNION ALL
+                        SELECT o.created_at::date, o.status, COALESCE(o.risk_level, 'none'),
+                               hashtext(o.application_id) & 15, -1
+                        FROM old_rows o JOIN new_rows n USING (application_id)
+                        WHERE (o.status, o.risk_level, o.created_at) IS DISTINCT FROM (n.status, n.risk_level, n.created_at)
+                    ) deltas
+                    GROUP BY 1, 2, 3, 4 HAVING SUM(delta) <> 0 ORDER BY 1, 2, 3, 4
+                    ON CONFLICT (day, status, risk_level, slot) DO UPDATE
+                    SET count = loan_status_stats.count + EXCLUDED.count;
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            """,
+            "DROP TRIGGER IF EXISTS trg_loan_status_stats_insert ON loan_applications;",
+            """
+            CREATE TRIGGER trg_loan_status_stats_insert
+            AFTER INSERT ON loan_applications
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION loan_status_stats_apply();
+            """,
+            "DROP TRIGGER IF EXISTS trg_loan_status_stats_update ON loan_applications;",
+            """
+            CREATE TRIGGER trg_loan_status_stats_update
+            AFTER UPDATE ON loan_applications
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION loan_status_stats_apply();
+            """,
+            "DROP TRIGGER IF EXISTS trg_loan_status_stats_delete ON loan_applications;",
+            """
+            CREATE TRIGGER trg_loan_status_stats_delete
+            AFTER DELETE ON loan_applications
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION loan_status_stats_apply();
+            """,
+            """
+            INSERT INTO loan_status_stats (day, status, risk_level, slot, count)
+            SELECT created_at::date, status, COALESCE(risk_level, 'none'),
+                   hashtext(application_id) & 15, COUNT(*)
+            FROM loan_applications GROUP BY 1, 2, 3, 4
+            ON CONFLICT (day, status, risk_level, slot) DO UPDATE SET count = EXCLUDED.count;
+            """,
+        ],
+        down=[
+            "DROP TRIGGER IF EXISTS trg_loan_status_stats_delete ON loan_applications;",
+            "DROP TRIGGER IF EXISTS trg_loan_status_stats_update ON loan_applications;",
+            "DROP TRIGGER IF EXISTS trg_loan_status_stats_insert ON loan_applications;",
+            "DROP FUNCTION IF EXISTS loan_status_stats_apply();",
+            "DROP TABLE IF EXISTS loan_status_stats;",
+        ],
+    ),
+    Migration(
+        7, "monthly partitions for loan_status_history",
+        up=[
+            # Rebuild loan_status_history as RANGE (changed_at) partitioned by month.
+            # The partition key must be part of the primary key; ids come from the
+            # existing sequence, widened to bigint.
+            "ALTER TABLE loan_status_history RENAME TO loan_status_history_unpartitioned;",
+            """
+            ALTER TABLE loan_status_history_unpartitioned
+            RENAME CONSTRAINT loan_status_history_pkey TO loan_status_history_unpartitioned_pkey;
+            """,
+            "ALTER SEQUENCE loan_status_history_id_seq OWNED BY NONE;",
+            "ALTER SEQUENCE loan_status_history_id_seq AS BIGINT;",
+            """
+            CREATE TABLE loan_status_history (
+                id BIGINT NOT NULL DEFAULT nextval('loan_status_history_id_seq'),
+                application_id TEXT NOT NULL,
+                old_status TEXT,
+                new_status TEXT NOT NULL,
+                changed_at TIMESTAMP NOT NULL DEFAULT NOW(),
+                PRIMARY KEY (id, changed_at)
+            ) PARTITION BY RANGE (changed_at);
+            """,
+            "ALTER SEQUENCE loan_status_history_id_seq OWNED BY loan_status_history.id;",
+            # loan_status_history_pYYYYMM for every month in [first_month, last_month];
+            # called by history_partitions.ensure_partitions at startup and daily
+            """
+            CREATE OR REPLACE FUNCTION loan_status_history_ensure_partitions(first_month DATE, last_month DATE)
+            RETURNS INTEGER AS $$
+            DECLARE
+                month DATE := date_trunc('month', first_month)::date;
+                created INTEGER := 0;
+                part TEXT;
+            BEGIN
+                WHILE month <= last_month LOOP
+                    part := 'loan_status_history_p' || to_char(month, 'YYYYMM');
+                    IF to_regclass(part) IS NULL THEN
+                        EXECUTE format(
+                            'CREATE TABLE %I PARTITION OF loan_status_history FOR VALUES FROM (%L) TO (%L)',
+                            part, month, (month + interval '1 month')::date
+                        );
+                        created := created + 1;
+                    END IF;
+                    month := (month + interval '1 month')::date;
+                END LOOP;
+                RETURN created;
+            END;
+            $$ LANGUAGE plpgsql;
+            """,
+            """
+            SELECT loan_status_history_ensure_partitions(
+                COALESCE((SELECT MIN(changed_at) FROM loan_status_history_unpartitioned), NOW())::date,
+                GREATEST((SELECT MAX(changed_at) FROM loan_status_history_unpartitioned),
+                         NOW() + interval '3 months')::date
+            );
+            """,
+            """
+            INSERT INTO loan_status_history (id, application_id, old_status, new_status, changed_at)
+            SELECT id, application_id, old_status, new_status, changed_at
+            FROM loan_status_history_unpartitioned;
+            """,
+            "DROP TABLE loan_status_history_unpartitioned;",
+            # per-application lookups; created on every partition
+            """
+            CREATE INDEX IF NOT EXISTS idx_status_history_app_changed
+            ON loan_status_history (application_id, changed_at, id);
+            """,
+        ],
+        down=[
+            # Archived (dropped) months are not restored
+            """
+            CREATE TABLE loan_status_history_unpartitioned (
+                id BIGINT PRIMARY KEY DEFAULT nextval('loan_status_history_id_seq'),
+                application_id TEXT NOT NULL,
+                old_status TEXT,
+                new_status TEXT NOT NULL,
+                changed_at TIMESTAMP NOT NULL DEFAULT NOW()
+            );
+            """,
+            """
+            INSERT INTO loan_status_history_unpartitioned
+            SELECT id, application_id, old_status, new_status, changed_at FROM loan_status_history;
+            """,
+            "ALTER SEQUENCE loan_status_history_id_seq OWNED BY NONE;",
+            "DROP TABLE loan_status_history;",
+            "DROP FUNCTION IF EXISTS loan_status_history_ensure_partitions(DATE, DATE);",
+            "ALTER TABLE loan_status_history_unpartitioned RENAME TO loan_status_history;",
+            """
+            ALTER TABLE loan_status_history
+            RENAME CONSTRAINT loan_status_history_unpartitioned_pkey TO loan_status_history_pkey;
+            """,
+            "ALTER SEQUENCE loan_status_history_id_seq OWNED BY loan_status_history.id;",
+            """
+            CREATE INDEX IF NOT EXISTS idx_status_history_app_changed
+            ON loan_status_history (application_id, changed_at, id);
+            """,
+        ],
+    ),
+    Migration(
+        8, "status change outbox",
+        up=[
+            # Transactional outbox for the dashboard feed (status_events.py): one row per
+            # status history row, pruned after STATUS_EVENTS_RETENTION_HOURS
+            """
+            CREATE TABLE IF NOT EXISTS loan_status_events (
+                id BIGSERIAL PRIMARY KEY,
+                application_id TEXT NOT NULL,
+                old_status TEXT,
+                new_status TEXT NOT NULL,
+                changed_at TIMESTAMP NOT NULL,
+                created_at TIMESTAMP NOT NULL DEFAULT NOW()
+            );
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_loan_status_events_created ON loan_status_events (created_at);",
+            # Fires for every writer of loan_status_history (log_status_changes, batch
+            # COPY, officer review) inside the writer's transaction; NOTIFY is delivered
+            # on commit only, and once per statement.
+            """
+            CREATE OR REPLACE FUNCTION loan_status_events_capture() RETURNS trigger AS $$
+            BEGIN
+                INSERT INTO loan_status_events (application_id, old_status, new_status, changed_at)
+                SELECT application_id, old_status, new_status, changed_at
+                FROM new_rows ORDER BY changed_at, id;
+                PERFORM pg_notify('loan_status_events', '');
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            """,
+            "DROP TRIGGER IF EXISTS trg_loan_status_events ON loan_status_history;",
+            """
+            CREATE TRIGGER trg_loan_status_events
+            AFTER INSERT ON loan_status_history
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION loan_status_events_capture();
+            """,
+        ],
+        down=[
+            "DROP TRIGGER IF EXISTS trg_loan_status_events ON loan_status_history;",
+            "DROP FUNCTION IF EXISTS loan_status_events_capture();",
+            "DROP TABLE IF EXISTS loan_status_events;",
+        ],
+    ),
+    Migration(
+        9, "offline re-scoring",
+        up=[
+            # rescore.py: one row per run, one checkpoint per created_at-range shard,
+            # results in a shadow table (never touches loan_applications / credit_profile)
+            """
+            CREATE TABLE IF NOT EXISTS loan_rescore_runs (
+                run_id TEXT PRIMARY KEY,
+                policy_version TEXT NOT NULL,
+                credit_score_mode TEXT NOT NULL,     -- stored / recompute
+                shards INTEGER NOT NULL,
+                started_at TIMESTAMP NOT NULL DEFAULT NOW(),
+                finished_at TIMESTAMP
+            );
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS loan_rescore_shards (
+                run_id TEXT NOT NULL REFERENCES loan_rescore_runs (run_id) ON DELETE CASCADE,
+                shard INTEGER NOT NULL,
+                lower_bound TIMESTAMP,               -- created_at range [lower, upper); NULL = open
+                upper_bound TIMESTAMP,
+                last_created_at TIMESTAMP,           -- keyset checkpoint
+                last_application_id TEXT,
+                rows_done BIGINT NOT NULL DEFAULT 0,
+                finished BOOLEAN NOT NULL DEFAULT FALSE,
+                updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+                PRIMARY KEY (run_id, shard)
+            );
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS loan_rescore_results (
+                run_id TEXT NOT NULL,
+                application_id TEXT NOT NULL,
+                old_status TEXT,
+                new_status TEXT NOT NULL,
+                old_credit_score INTEGER,
+                new_credit_score INTEGER,
+                old_risk_level TEXT,
+                new_risk_level TEXT,
+                reason TEXT,
+                PRIMARY KEY (run_id, application_id)
+            );
+            """,
+        ],
+        down=[
+            "DROP TABLE IF EXISTS loan_rescore_results;",
+            "DROP TABLE IF EXISTS loan_rescore_shards;",
+            "DROP TABLE IF EXISTS loan_rescore_runs;",
+        ],
+    ),
+    Migration(
+        10, "chat sessions",
+        up=[
+            # chat_sessions.py with CHAT_SESSION_PERSIST=true: rolling window of turns
+            # shared by every worker; rows idle for longer than the TTL are purged
+            """
+            CREATE TABLE IF NOT EXISTS loan_chat_sessions (
+                session_id TEXT PRIMARY KEY,
+                application_id TEXT NOT NULL,
+                turns JSONB NOT NULL DEFAULT '[]',
+                created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+                updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+            );
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_loan_chat_sessions_updated ON loan_chat_sessions (updated_at);",
+        ],
+        down=[
+            "DROP TABLE IF EXISTS loan_chat_sessions;",
+        ],
+    ),
+    Migration(
+        11, "one review queue index",
+        up=[
+            # the partial index from migration 2 duplicated idx_loan_status_created_id
+            # (status, created_at DESC, application_id DESC), which the planner prefers
+            # once the table holds data; /loan/pending_review and the oldest-pending
+            # lookup use the composite one
+            "DROP INDEX IF EXISTS idx_loan_manual_review_created_id;",
+        ],
+        down=[
+            """
+            CREATE INDEX IF NOT EXISTS idx_loan_manual_review_created_id
+            ON loan_applications (created_at DESC, application_id DESC)
+            WHERE status = 'manual_review';
+            """,
+        ],
+    ),
+]
+
+
+# ============================================================
+# RUNNER
+# ============================================================
+def _run_steps(cur, steps):
+    for step in steps:
+        if callable(step):
+            step(cur)
+        else:
+            cur.execute(step)
+
+
+def _ensure_version_table(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+            );
+        """)
+    conn.commit()
+
+
+def _applied_versions(conn) -> set:
+    with conn.cursor() as cur:
+        cur.execute("SELECT version FROM schema_version;")
+        return {row[0] for row in cur.fetchall()}
+
+
+def _locked_connection():
+    conn = get_connection()
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s);", (MIGRATION_LOCK_ID,))
+    conn.commit()
+    _ensure_version_table(conn)
+    return conn
+
+
+def _unlock(conn):
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s);", (MIGRATION_LOCK_ID,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def migrate(target: int | None = None) -> list:
+    """Apply every pending migration up to `target` (default: latest). Returns applied versions."""
+    conn = _locked_connection()
+    applied = []
+    try:
+        done = _applied_versions(conn)
+        for m in MIGRATIONS:
+            if m.version in done or (target is not None and m.version > target):
+                continue
+            try:
+                with conn.cursor() as cur:
+                    _run_steps(cur, m.up)
+                    cur.execute(
+                        "INSERT INTO schema_version (version, name) VALUES (%s, %s);",
+                        (m.version, m.name),
+                    )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            applied.append(m.version)
+    finally:
+        _unlock(conn)
+    return applied
+
+
+def rollback(target: int) -> list:
+    """Revert applied migrations newer than `target`, newest first. Returns reverted versions."""
+    conn = _locked_connection()
+    reverted = []
+    try:
+        done = _applied_versions(conn)
+        for m in sorted(MIGRATIONS, key=lambda m: m.version, reverse=True):
+            if m.version <= target or m.version not in done:
+                continue
+            try:
+                with conn.cursor() as cur:
+                    _run_steps(cur, m.down)
+                    cur.execute("DELETE FROM schema_version WHERE version = %s;", (m.version,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            reverted.append(m.version)
+    finally:
+        _unlock(conn)
+    return reverted
+
+
+def status() -> list:
+    conn = get_connection()
+    try:
+        _ensure_version_table(conn)
+        done = _applied_versions(conn)
+    finally:
+        conn.close()
+    return [
+        {"version": m.version, "name": m.name, "applied": m.version in done}
+        for m in MIGRATIONS
+    ]
+
+
+# ============================================================
+# INDEX VERIFICATION (EXPLAIN)
+# ============================================================
+# name → (query, params, index the planner must be able to use)
+HOT_QUERIES = {
+    "get_status_history": (
+        """
+        SELECT old_status, new_status, changed_at FROM loan_status_history
+        WHERE application_id = %s AND changed_at >= NOW() - interval '1 day'
+        ORDER BY changed_at ASC, id ASC
+        """,
+        ("ln_explain",),
+        "idx_status_history_app_changed",
+    ),
+    "application_with_history": (
+        build_with_history_query("ln_explain", PROMPT_COLUMNS, lambda value: "%s"),
+        ("ln_explain",),
+        "idx_status_history_app_changed",
+    ),
+    "pending_review": (
+        """
+        SELECT application_id FROM loan_applications
+        WHERE status = 'manual_review'
+        ORDER BY created_at DESC, application_id DESC LIMIT 50
+        """,
+        (),
+        "idx_loan_status_created_id",
+    ),
+    "all_applications": (
+        """
+        SELECT application_id FROM loan_applications
+        ORDER BY created_at DESC, application_id DESC LIMIT 50
+        """,
+        (),
+        "idx_loan_created_id",
+    ),
+    "active_application_check": (
+        """
+        SELECT 1 FROM loan_applications
+        WHERE pan = %s AND status IN ('submitted', 'processing', 'manual_review') LIMIT 1
+        """,
+        ("ABCDE1234F",),
+        "unique_active_pan",
+    ),
+    "credit_score_recent_count": (
+        """
+        SELECT COALESCE(SUM(count), 0) FROM pan_daily_counts
+        WHERE pan = %s AND day > (NOW() AT TIME ZONE 'UTC')::date - 30
+        """,
+        ("ABCDE1234F",),
+        "pan_daily_counts_pkey",
+    ),
+    "dashboard_stats_window": (
+        """
+        SELECT day, status, risk_level, SUM(count) FROM loan_status_stats
+        WHERE day >= (NOW() AT TIME ZONE 'UTC')::date - 29 GROUP BY 1, 2, 3
+        """,
+        (),
+        "loan_status_stats_pkey",
+    ),
+    "manual_review_oldest": (
+        """
+        SELECT MIN(created_at) FROM loan_applications WHERE status = 'manual_review'
+        """,
+        (),
+        "idx_loan_status_created_id",
+    ),
+}
+
+
+_PARENT_INDEXES = """
+    SELECT child.relname, parent.relname
+    FROM pg_inherits i
+    JOIN pg_class child ON child.oid = i.inhrelid
+    JOIN pg_class parent ON parent.oid = i.inhparent
+    WHERE child.relkind = 'i';
+"""
+
+
+def _plan_indexes(plan: dict) -> set:
+    found = set()
+    if "Index Name" in plan:
+        found.add(plan["Index Name"])
+    for child in plan.get("Plans", []):
+        found |= _plan_indexes(child)
+    return found
+
+
+def verify_indexes() -> dict:
+    """
+    EXPLAIN every hot query and report whether its index is used.
+    Sequential scans are disabled for the check so that small or empty
+    tables still exercise the index path the planner would pick at scale.
+    """
+    conn = get_connection()
+    results = {}
+    try:
+        with conn.cursor() as cur:
+            # indexes on partitions count as the partitioned parent index
+            cur.execute(_PARENT_INDEXES)
+            parents = dict(cur.fetchall())
+            cur.execute("SET LOCAL enable_seqscan = off;")
+            for name, (query, params, index) in HOT_QUERIES.items():
+                cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+                plan = cur.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                used = _plan_indexes(plan[0]["Plan"])
+                used |= {parents[i] for i in used if i in parents}
+                results[name] = {"index": index, "used": index in used, "plan_indexes": sorted(used)}
+        conn.rollback()
+    finally:
+        conn.close()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Schema migrations")
+    sub = parser.add_subparsers(dest="command", required=True)
+    up = sub.add_parser("up", help="apply pending migrations")
+    up.add_argument("--target", type=int, default=None)
+    down = sub.add_parser("down", help="revert migrations newer than --target")
+    down.add_argument("--target", type=int, required=True)
+    sub.add_parser("status", help="list migrations and whether they are applied")
+    sub.add_parser("verify", help="EXPLAIN hot queries and check they use their indexes")
+    args = parser.parse_args(argv)
+
+    if args.command == "up":
+        print("applied:", migrate(args.target) or "nothing to do")
+    elif args.command == "down":
+        print("reverted:", rollback(args.target) or "nothing to do")
+    elif args.command == "status":
+        for row in status():
+            print(f"{row['version']:>4}  {'x' if row['applied'] else ' '}  {row['name']}")
+    elif args.command == "verify":
+        results = verify_indexes()
+        for name, res in results.items():
+            print(f"{'OK  ' if res['used'] else 'FAIL'} {name}: expects {res['index']}, plan uses {res['plan_indexes']}")
+        if not all(res["used"] for res in results.values()):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
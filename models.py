@@ -35,6 +35,8 @@ class LoanApplicationOut(LoanApplicationCreate):
     decision_reason: str | None = Field(None)
     llm_explanation: str | None = Field(None)
     llm_status_explanation: str | None = Field(None)
+    # pending → generated in the background; ready; failed; null if none is due
+    llm_status_explanation_state: str | None = Field(None, example="pending")
 
     # Manual review fields
     officer_notes: str | None = Field(None)
@@ -54,8 +56,60 @@ class ManualReviewRequest(BaseModel):
     officer: str = Field(..., example="LoanOfficer")
 
 
+# ============================================================
+# LOAN OFFICER BULK REVIEW
+# (Used by PUT /loan/review/batch)
+# ============================================================
+class ManualReviewItem(BaseModel):
+    application_id: str = Field(..., example="ln_abc123def456")
+    action: str = Field(..., example="approve")  # approve / reject
+    notes: str = Field(..., example="Everything verified.")
+
+
+class ManualReviewBatchRequest(BaseModel):
+    officer: str = Field(..., example="LoanOfficer")
+    reviews: list[ManualReviewItem]
+
+
+class ManualReviewBatchResult(BaseModel):
+    application_id: str = Field(..., example="ln_abc123def456")
+    status: str | None = Field(None, example="approved")  # None when not applied
+    error: str | None = Field(None)
+
+
+class ManualReviewBatchResponse(BaseModel):
+    total: int
+    reviewed: int
+    skipped: int
+    results: list[ManualReviewBatchResult] = Field(default_factory=list)
+
+
 # ============================================================
 # CUSTOMER CHAT REQUEST
 # ============================================================
 class ChatRequest(BaseModel):
     message: str = Field(..., example="Why is my loan still pending?")
+    session_id: str | None = Field(None, example="cs_3f2a9c0e8b7d4c1a9e6f5d4c3b2a1f0e")   # from the previous reply
+
+
+# ============================================================
+# BULK INGESTION RESULT
+# (Used by POST /loan/batch)
+# ============================================================
+class LoanBatchRowResult(BaseModel):
+    index: int = Field(..., example=0)
+    application_id: str | None = Field(None, example="ln_abc123def456")
+    status: str = Field(..., example="approved")  # approved / rejected / manual_review / invalid / conflict
+    credit_score: int | None = Field(None)
+    risk_level: str | None = Field(None)
+    decision_reason: str | None = Field(None)
+    error: str | None = Field(None)
+
+
+class LoanBatchResponse(BaseModel):
+    total: int
+    accepted: int
+    failed: int
+    elapsed_seconds: float
+    rows_per_sec: float
+    results: list[LoanBatchRowResult] = Field(default_factory=list)
@@ -0,0 +1,128 @@
+# pan_counts.py
+"""
+Per-PAN daily application counts (pan_daily_counts, migration 5).
+
+Triggers on loan_applications keep one row per (pan, UTC day); the
+"multiple loans within 30 days" rule sums at most RECENT_WINDOW_DAYS rows of
+the primary key instead of scanning the PAN's application history.
+
+    python pan_counts.py compact              # drop buckets older than PAN_COUNTS_RETAIN_DAYS
+    python pan_counts.py check                # compare buckets with loan_applications
+    python pan_counts.py check --repair       # ... and rewrite the ones that differ
+"""
+import argparse
+import json
+import os
+import sys
+
+from db_postgres import transaction
+
+RECENT_WINDOW_DAYS = 30
+PAN_COUNTS_RETAIN_DAYS = max(int(os.getenv("PAN_COUNTS_RETAIN_DAYS", "35")), RECENT_WINDOW_DAYS + 1)
+
+# Buckets in the window: today (UTC) and the RECENT_WINDOW_DAYS - 1 days before it
+RECENT_DAY_FILTER = "day > (NOW() AT TIME ZONE 'UTC')::date - %(window_days)s"
+
+
+def recent_counts(cur, pans: list) -> dict:
+    """pan → applications in the last RECENT_WINDOW_DAYS days, for many PANs at once."""
+    cur.execute(f"""
+        SELECT pan, SUM(count) FROM pan_daily_counts
+        WHERE pan = ANY(%(pans)s) AND {RECENT_DAY_FILTER}
+        GROUP BY pan;
+    """, {"pans": pans, "window_days": RECENT_WINDOW_DAYS})
+    return {pan: int(n) for pan, n in cur.fetchall()}
+
+
+def compact(retain_days: int = PAN_COUNTS_RETAIN_DAYS) -> int:
+    """Delete buckets that can no longer fall inside the window."""
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            DELETE FROM pan_daily_counts
+            WHERE day < (NOW() AT TIME ZONE 'UTC')::date - %s;
+        """, (retain_days,))
+        return cur.rowcount
+
+
+# Buckets that disagree with loan_applications over the retained days
+_MISMATCHES = """
+    WITH base AS (
+        SELECT pan, created_at::date AS day, COUNT(*) AS n
+        FROM loan_applications
+        WHERE created_at >= (NOW() AT TIME ZONE 'UTC')::date - %(days)s
+        GROUP BY 1, 2
+    ),
+    side AS (
+        SELECT pan, day, count AS n FROM pan_daily_counts
+        WHERE day >= (NOW() AT TIME ZONE 'UTC')::date - %(days)s
+    )
+    SELECT COALESCE(base.pan, side.pan), COALESCE(base.day, side.day),
+           COALESCE(base.n, 0), COALESCE(side.n, 0)
+    FROM base FULL JOIN side ON base.pan = side.pan AND base.day = side.day
+    WHERE COALESCE(base.n, 0) <> COALESCE(side.n, 0)
+    ORDER BY 2, 1;
+"""
+
+
+def check(repair: bool = False, retain_days: int = PAN_COUNTS_RETAIN_DAYS) -> dict:
+    """
+    Reconcile the buckets against the base table. Runs on one snapshot
+    (REPEATABLE READ), so concurrent inserts never show up as drift; with
+    `repair`, the table is locked against trigger writes while buckets are
+    rewritten from the base counts.
+    """
+    with transaction(independent=True) as conn:
+        cur = conn.cursor()
+        if repair:
+            # blocks loan_applications inserts (their trigger) until commit
+            cur.execute("LOCK TABLE pan_daily_counts IN EXCLUSIVE MODE;")
+        else:
+            cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ;")
+        cur.execute(_MISMATCHES, {"days": retain_days})
+        mismatches = cur.fetchall()
+
+        if repair and mismatches:
+            cur.execute("""
+                DELETE FROM pan_daily_counts
+                WHERE (pan, day) IN (SELECT * FROM UNNEST(%s::text[], %s::date[]));
+            """, ([m[0] for m in mismatches], [m[1] for m in mismatches]))
+            rows = [(pan, day, expected) for pan, day, expected, _ in mismatches if expected > 0]
+            if rows:
+                cur.executemany(
+                    "INSERT INTO pan_daily_counts (pan, day, count) VALUES (%s, %s, %s);", rows
+                )
+
+    return {
+        "retain_days": retain_days,
+        "mismatches": len(mismatches),
+        "repaired": len(mismatches) if repair else 0,
+        "examples": [
+            {"pan": pan, "day": day.isoformat(), "expected": expected, "counted": counted}
+            for pan, day, expected, counted in mismatches[:20]
+        ],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-PAN daily application counters.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    compact_cmd = sub.add_parser("compact", help="delete buckets outside the retention window")
+    compact_cmd.add_argument("--retain-days", type=int, default=PAN_COUNTS_RETAIN_DAYS)
+    check_cmd = sub.add_parser("check", help="reconcile buckets against loan_applications")
+    check_cmd.add_argument("--repair", action="store_true")
+    check_cmd.add_argument("--retain-days", type=int, default=PAN_COUNTS_RETAIN_DAYS)
+    args = parser.parse_args(argv)
+
+    if args.command == "compact":
+        print("deleted buckets:", compact(max(args.retain_days, RECENT_WINDOW_DAYS + 1)))
+        return
+
+    report = check(repair=args.repair, retain_days=args.retain_days)
+    print(json.dumps(report, indent=2))
+    if report["mismatches"] and not args.repair:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
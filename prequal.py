@@ -0,0 +1,112 @@
+# prequal.py
+"""
+Vectorized pre-qualification over the decision policy.
+
+Evaluates validation → risk rules → decision for whole columns at once
+(age, income, loan_amount, credit_score) with NumPy, instead of one
+`run_agent` call (and four pydantic models) per prospect. Both paths run the
+same compiled policy (rule_engine.py); tests/test_prequal.py asserts they agree.
+
+    python prequal.py score prospects.csv -o results.csv   # columns: age,income,loan_amount,credit_score
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+
+import numpy as np
+
+from rule_engine import rule_engine, CompiledPolicy
+
+
+def prequalify(age, income, loan_amount, credit_score, policy: CompiledPolicy | None = None) -> dict:
+    """
+    Evaluate the decision policy for equal-length columns.
+
+    Returns arrays: `valid` (bool), `status`, `risk_level` ("" where validation
+    failed, i.e. run_agent's None) and `reason` (the decision reason, or the
+    validation message for invalid rows — as in run_agent's result["decision"]).
+    """
+    policy = policy or rule_engine.policy
+    age = np.asarray(age, dtype=np.float64)
+    income = np.asarray(income, dtype=np.float64)
+    loan_amount = np.asarray(loan_amount, dtype=np.float64)
+    credit_score = np.asarray(credit_score, dtype=np.float64)
+    if not (age.shape == income.shape == loan_amount.shape == credit_score.shape):
+        raise ValueError("age, income, loan_amount and credit_score must have the same shape")
+
+    # 1️⃣ Validation
+    validation = policy.tables["validation"]
+    index = validation.match_vector({"age": age, "income": income, "loan_amount": loan_amount})
+    valid = validation.outcome_column("success", index).astype(bool)
+    message = validation.outcome_column("message", index)
+
+    # Invalid rows are auto-rejected with the validation message and no risk assessment
+    status = np.full(age.shape, "rejected", dtype="<U13")
+    risk_level = np.full(age.shape, "", dtype=object)
+    reason = message.astype(object)
+
+    if valid.any():
+        income, loan_amount, credit_score = income[valid], loan_amount[valid], credit_score[valid]
+
+        # 2️⃣ Risk
+        risk = policy.tables["risk"]
+        index = risk.match_vector({"income": income, "loan_amount": loan_amount, "credit_score": credit_score})
+        level = risk.outcome_column("risk_level", index)
+
+        # 3️⃣ Decision (manual review → approved / rejected, as in run_agent)
+        decision = policy.tables["decision"]
+        index = decision.match_vector({"credit_score": credit_score, "risk_level": level})
+        manual_review = decision.outcome_column("manual_review", index).astype(bool)
+        approved = decision.outcome_column("approved", index).astype(bool)
+
+        status[valid] = np.where(manual_review, "manual_review", np.where(approved, "approved", "rejected"))
+        risk_level[valid] = level
+        reason[valid] = decision.outcome_column("reason", index)
+
+    return {"valid": valid, "status": status, "risk_level": risk_level, "reason": reason}
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def score_csv(path: str, out):
+    source = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+    with source:
+        reader = csv.DictReader(source)
+        rows = list(reader)
+    columns = {
+        c: np.fromiter((float(r[c]) for r in rows), dtype=np.float64, count=len(rows))
+        for c in ("age", "income", "loan_amount", "credit_score")
+    }
+    result = prequalify(**columns)
+
+    writer = csv.writer(out)
+    writer.writerow([*reader.fieldnames, "status", "risk_level", "reason"])
+    for i, row in enumerate(rows):
+        writer.writerow([*row.values(), result["status"][i], result["risk_level"][i], result["reason"][i]])
+    return len(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Vectorized loan pre-qualification.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    score = sub.add_parser("score", help="score a CSV (age,income,loan_amount,credit_score)")
+    score.add_argument("path", help="input CSV, or - for stdin")
+    score.add_argument("-o", "--output", help="output CSV (default stdout)")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    if args.output:
+        with open(args.output, "w", newline="", encoding="utf-8") as out:
+            count = score_csv(args.path, out)
+    else:
+        count = score_csv(args.path, sys.stdout)
+    elapsed = time.perf_counter() - started
+    print(json.dumps({"rows": count, "elapsed_seconds": round(elapsed, 4)}), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
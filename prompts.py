@@ -0,0 +1,337 @@
+# prompts.py
+"""
+Prompt templates for every LLM endpoint, sized against a token budget.
+
+The templates are module constants (one shared applicant line, one instruction
+line each), so a prompt is a single str.format with no repeated boilerplate;
+fields the answer does not use (PAN) are left out. The status timeline is the
+only part that grows with the application; when the rendered prompt would
+exceed the endpoint's budget, the middle of the timeline is collapsed into a
+"… N earlier changes …" line, keeping the submission and the newest changes.
+Chat questions are capped at PROMPT_MESSAGE_MAX_TOKENS and remembered turns
+(chat_sessions.py) at PROMPT_CONVERSATION_MAX_TOKENS.
+
+Token counts use tiktoken's cl100k_base when it is installed (close to the
+Llama 3 tokenizer for English); otherwise a regex approximation of BPE pieces.
+Groq's own `usage.prompt_tokens` is recorded separately in llm_service.
+
+    python prompts.py compare --history 40        # old vs new prompt sizes
+"""
+import argparse
+import math
+import os
+import re
+from datetime import datetime
+
+from metrics import LLM_PROMPT_TOKENS
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "600"))               # default for every endpoint
+PROMPT_MESSAGE_MAX_TOKENS = int(os.getenv("PROMPT_MESSAGE_MAX_TOKENS", "250"))   # customer chat question
+PROMPT_CONVERSATION_MAX_TOKENS = int(os.getenv("PROMPT_CONVERSATION_MAX_TOKENS", "400"))   # earlier chat turns
+PROMPT_TIMELINE_KEEP_FIRST = 1                                                    # submission line survives trimming
+
+# Per-endpoint override: PROMPT_TOKEN_BUDGET_CHAT=400 etc.
+ENDPOINTS = ("decision", "status", "full_explanation", "chat")
+PROMPT_BUDGETS = {
+    name: int(os.getenv(f"PROMPT_TOKEN_BUDGET_{name.upper()}", PROMPT_TOKEN_BUDGET))
+    for name in ENDPOINTS
+}
+
+
+# -----------------------------
+# 🔢 TOKEN ESTIMATE
+# -----------------------------
+try:
+    import tiktoken     # optional, not in requirements.txt
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _ENCODING = None
+
+# words split into ≤4-char pieces, digits in groups of 3, each symbol alone
+_PIECE_RE = re.compile(r"[A-Za-z]{1,4}|\d{1,3}|[^\sA-Za-z\d]")
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return len(_PIECE_RE.findall(text))
+
+
+def tokenizer_name() -> str:
+    return "tiktoken/cl100k_base" if _ENCODING is not None else "regex-approx"
+
+
+# -----------------------------
+# 🧩 TEMPLATES
+# -----------------------------
+_APPLICANT = "Applicant: {name}, age {age}, income {income}, loan amount {loan_amount}."
+
+TEMPLATES = {
+    "decision": (
+        "Explain this loan decision clearly to the applicant.\n"
+        + _APPLICANT + "\n"
+        "Credit score {credit_score}; risk {risk_level}; decision {decision}.\n"
+        "Reason: {reason}"
+    ),
+    "status": (
+        "Write a short, friendly explanation of this loan application's processing timeline for the customer.\n"
+        "Application {application_id}. Timeline:\n"
+        "{timeline}"
+    ),
+    "full_explanation": (
+        "Write a clear, structured explanation of this loan application for the customer.\n"
+        + _APPLICANT + "\n"
+        "Credit score {credit_score}; risk {risk_level}; final status {status}.\n"
+        "Decision reason: {decision_reason}\n"
+        "Timeline:\n"
+        "{timeline}"
+    ),
+    # application part only; chat_sessions caches it, the question goes in CHAT_TURN_TEMPLATE
+    "chat": (
+        "You are a helpful loan assistant. Answer the customer politely and clearly.\n"
+        + _APPLICANT + "\n"
+        "Status {status}; credit score {credit_score}; risk {risk_level}.\n"
+        "Decision reason: {decision_reason}\n"
+        "Timeline:\n"
+        "{timeline}"
+    ),
+}
+CHAT_TURN_TEMPLATE = '{context}\n{conversation}Customer question: "{message}"'
+
+_FIELDS = {
+    name: set(re.findall(r"{(\w+)}", template)) for name, template in TEMPLATES.items()
+}
+
+
+def _value(value) -> str:
+    """Compact rendering: 50000.0 → 50000, None → n/a."""
+    if value is None:
+        return "n/a"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _when(changed_at) -> str:
+    if isinstance(changed_at, datetime):
+        return changed_at.strftime("%Y-%m-%d %H:%M")
+    return str(changed_at)[:16]
+
+
+# -----------------------------
+# 🕒 TIMELINE UNDER A BUDGET
+# -----------------------------
+def timeline_lines(history: list) -> list:
+    return [
+        f"- {h['new_status']} ({_when(h['changed_at'])})" if h.get("old_status") is None
+        else f"- {h['old_status']} → {h['new_status']} ({_when(h['changed_at'])})"
+        for h in history
+    ]
+
+
+def fit_timeline(history: list, budget: int) -> str:
+    """
+    Every transition when it fits in `budget` tokens; otherwise the first
+    PROMPT_TIMELINE_KEEP_FIRST lines, a count of the omitted middle and as many
+    of the newest lines as fit (always at least the latest one).
+    """
+    lines = timeline_lines(history)
+    if not lines:
+        return "- no status changes recorded"
+    costs = [estimate_tokens(line) + 1 for line in lines]
+    if sum(costs) <= budget or len(lines) <= PROMPT_TIMELINE_KEEP_FIRST + 1:
+        return "\n".join(lines)
+
+    head = lines[:PROMPT_TIMELINE_KEEP_FIRST]
+    remaining = budget - sum(costs[:PROMPT_TIMELINE_KEEP_FIRST]) - costs[-1]
+    remaining -= estimate_tokens(f"- … {len(lines)} earlier changes …") + 1
+    tail_start = len(lines) - 1
+    while tail_start > len(head) and costs[tail_start - 1] <= remaining:
+        tail_start -= 1
+        remaining -= costs[tail_start]
+    omitted = tail_start - len(head)
+    middle = [f"- … {omitted} earlier changes …"] if omitted else []
+    return "\n".join(head + middle + lines[tail_start:])
+
+
+def truncate(text: str, max_tokens: int) -> str:
+    """Cut `text` to about `max_tokens`, on a word boundary."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    words = text.split()
+    low, high = 0, len(words)
+    while low < high:       # longest word prefix that fits
+        mid = (low + high + 1) // 2
+        if estimate_tokens(" ".join(words[:mid])) + 1 <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return " ".join(words[:low]) + " …"
+
+
+def fit_conversation(turns, budget: int = PROMPT_CONVERSATION_MAX_TOKENS) -> str:
+    """The newest [{role, text}] turns that fit in `budget`, oldest first; "" when there are none."""
+    lines, remaining = [], budget
+    for turn in reversed(list(turns)):
+        line = f"{'Customer' if turn['role'] == 'customer' else 'Assistant'}: {turn['text']}"
+        cost = estimate_tokens(line) + 1
+        if cost > remaining:
+            break
+        lines.append(line)
+        remaining -= cost
+    if not lines:
+        return ""
+    return "Earlier in this conversation:\n" + "\n".join(reversed(lines)) + "\n"
+
+
+def _fill(endpoint: str, history: list | None = None, **fields) -> str:
+    fields = {k: _value(v) for k, v in fields.items()}
+    if "timeline" in _FIELDS[endpoint]:
+        fixed = estimate_tokens(TEMPLATES[endpoint].format(timeline="", **fields))
+        fields["timeline"] = fit_timeline(history or [], PROMPT_BUDGETS[endpoint] - fixed)
+    return TEMPLATES[endpoint].format(**fields)
+
+
+def render(endpoint: str, history: list | None = None, **fields) -> str:
+    """Fill the endpoint's template; the timeline gets whatever the budget leaves."""
+    prompt = _fill(endpoint, history, **fields)
+    LLM_PROMPT_TOKENS.observe(estimate_tokens(prompt), endpoint)
+    return prompt
+
+
+# -----------------------------
+# 🏗️ ENDPOINT BUILDERS
+# -----------------------------
+def _applicant(app: dict) -> dict:
+    return {k: app.get(k) for k in ("name", "age", "income", "loan_amount")}
+
+
+def decision_prompt(application: dict, agent_result: dict) -> str:
+    return render(
+        "decision",
+        **_applicant(application),
+        credit_score=agent_result["credit_score"]["credit_score"],
+        risk_level=agent_result["risk"]["risk_level"],
+        decision="approved" if agent_result["decision"]["approved"] else "rejected",
+        reason=agent_result["decision"]["reason"],
+    )
+
+
+def status_prompt(application: dict, history: list) -> str:
+    return render("status", history, application_id=application["application_id"])
+
+
+def full_explanation_prompt(app: dict, agent_data: dict, history: list) -> str:
+    return render(
+        "full_explanation", history,
+        **_applicant(app),
+        credit_score=agent_data["credit_score"],
+        risk_level=agent_data["risk_level"],
+        decision_reason=agent_data["decision_reason"],
+        status=app["status"],
+    )
+
+
+def chat_context(app: dict, history: list) -> str:
+    """Application part of the chat prompt (PROMPT_TOKEN_BUDGET_CHAT bounds it)."""
+    return _fill(
+        "chat", history,
+        **_applicant(app),
+        status=app["status"],
+        credit_score=app["credit_score"],
+        risk_level=app["risk_level"],
+        decision_reason=app["decision_reason"],
+    )
+
+
+def chat_prompt(context: str, turns, message: str) -> str:
+    """Cached context + the remembered turns + the (capped) new question."""
+    prompt = CHAT_TURN_TEMPLATE.format(
+        context=context,
+        conversation=fit_conversation(turns),
+        message=truncate(message.strip(), PROMPT_MESSAGE_MAX_TOKENS),
+    )
+    LLM_PROMPT_TOKENS.observe(estimate_tokens(prompt), "chat")
+    return prompt
+
+
+# -----------------------------
+# 📏 CLI: old vs new sizes
+# -----------------------------
+def _legacy_full_explanation(app, agent_data, history) -> str:
+    """The pre-budget /explain prompt, kept only for `compare`."""
+    timeline = "".join(f"- {h['old_status']} → {h['new_status']} at {h['changed_at']}\n" for h in history)
+    return f"""
+Provide a detailed explanation of this loan application:
+
+Applicant: {app['name']}
+Age: {app['age']}
+Income: {app['income']}
+Loan Amount: {app['loan_amount']}
+PAN: {app['pan']}
+
+Internal Calculations:
+- Credit Score: {agent_data['credit_score']}
+- Risk Level: {agent_data['risk_level']}
+- Decision Reason: {agent_data['decision_reason']}
+
+Final Status: {app['status']}
+
+Timeline:
+{timeline}
+
+Write a clear and structured explanation suitable for the customer.
+"""
+
+
+def _sample(history_len: int):
+    app = {
+        "application_id": "APP-SAMPLE", "name": "Asha Verma", "age": 34, "income": 85000.0,
+        "loan_amount": 250000.0, "pan": "ABCDE1234F", "status": "approved", "credit_score": 742,
+        "risk_level": "low", "decision_reason": "Credit score and income meet policy thresholds",
+    }
+    statuses = ["submitted", "processing", "manual_review", "processing"]
+    history = [{"old_status": None, "new_status": "submitted",
+                "changed_at": datetime(2026, 1, 5, 9, 30, 12, 345678)}]
+    for i in range(1, history_len):
+        history.append({
+            "old_status": history[-1]["new_status"],
+            "new_status": "approved" if i == history_len - 1 else statuses[i % len(statuses)],
+            "changed_at": datetime(2026, 1, 5, 9, 30 + i % 30, 12, 345678),
+        })
+    agent_data = {k: app[k] for k in ("credit_score", "risk_level", "decision_reason")}
+    return app, agent_data, history
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prompt templates and token budgets.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    compare_cmd = sub.add_parser("compare", help="token counts of the old and new /explain prompt")
+    compare_cmd.add_argument("--history", type=int, default=4, help="status changes in the sample timeline")
+    show_cmd = sub.add_parser("show", help="print one rendered sample prompt")
+    show_cmd.add_argument("endpoint", choices=("status", "full_explanation", "chat"))
+    show_cmd.add_argument("--history", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    app, agent_data, history = _sample(max(1, args.history))
+    if args.command == "show":
+        if args.endpoint == "status":
+            print(status_prompt(app, history))
+        elif args.endpoint == "full_explanation":
+            print(full_explanation_prompt(app, agent_data, history))
+        else:
+            turns = [{"role": "customer", "text": "Is my loan approved?"},
+                     {"role": "assistant", "text": "Yes, your application was approved."}]
+            print(chat_prompt(chat_context(app, history), turns, "When will it be disbursed?"))
+        return
+
+    old = estimate_tokens(_legacy_full_explanation(app, agent_data, history))
+    new = estimate_tokens(full_explanation_prompt(app, agent_data, history))
+    print(f"tokenizer: {tokenizer_name()}  budget: {PROMPT_BUDGETS['full_explanation']}")
+    print(f"history={len(history)}  old={old}  new={new}  saved={old - new} ({math.floor(100 * (old - new) / old)}%)")
+
+
+if __name__ == "__main__":
+    main()
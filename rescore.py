@@ -0,0 +1,339 @@
+# rescore.py
+"""
+Offline re-scoring of historical applications (migration 9).
+
+Re-runs validation → risk → decision (run_agent, no LLM) over loan_applications
+with the current policy, or a candidate one via --policy, and writes the outcome
+next to the original into the shadow table loan_rescore_results. Nothing in
+loan_applications or credit_profile is modified.
+
+The table is split into created_at ranges (shards). Each shard streams through
+a server-side cursor in --batch-size chunks. Every chunk's results are COPYed
+in the same transaction that advances the shard's keyset checkpoint, so a
+killed run resumes exactly where it stopped. Shards run in a process pool,
+one policy evaluation per core.
+
+    python rescore.py run --workers 8 [--shards 32] [--policy candidate.json] [--credit-score recompute]
+    python rescore.py resume --run-id rs_...
+    python rescore.py report --run-id rs_...
+    python rescore.py drop --run-id rs_...
+
+--credit-score stored (default) keeps each application's recorded score, so
+only policy changes show up. `recompute` applies the current credit rules
+(utils.apply_credit_rules) to the PAN's current profile score, with the number
+of other applications in the 30 days before the application. It reads
+credit_profile and never writes to it.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from psycopg2.extras import RealDictCursor
+
+from agent import run_agent
+from db_postgres import get_connection, transaction, copy_rows
+from pan_counts import RECENT_WINDOW_DAYS
+from rule_engine import rule_engine, load_policy, PolicyError, POLICY_PATH
+from utils import apply_credit_rules
+
+RESCORE_BATCH_SIZE = int(os.getenv("RESCORE_BATCH_SIZE", "2000"))
+CREDIT_SCORE_MODES = ("stored", "recompute")
+
+RESULT_COLUMNS = (
+    "run_id", "application_id", "old_status", "new_status", "old_credit_score",
+    "new_credit_score", "old_risk_level", "new_risk_level", "reason",
+)
+
+
+# -----------------------------
+# RUN SETUP
+# -----------------------------
+def shard_bounds(shards: int) -> list:
+    """[(lower, upper)] created_at ranges with roughly equal row counts (None = open end)."""
+    if shards <= 1:
+        return [(None, None)]
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT percentile_disc(%s::float8[]) WITHIN GROUP (ORDER BY created_at)
+            FROM loan_applications;
+        """, ([i / shards for i in range(1, shards)],))
+        cuts = cur.fetchone()[0] or []
+    cuts = sorted(set(c for c in cuts if c is not None))
+    edges = [None] + cuts + [None]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def create_run(run_id: str, policy_version: str, mode: str, shards: int) -> int:
+    bounds = shard_bounds(shards)
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO loan_rescore_runs (run_id, policy_version, credit_score_mode, shards)
+            VALUES (%s, %s, %s, %s);
+        """, (run_id, policy_version, mode, len(bounds)))
+        cur.executemany("""
+            INSERT INTO loan_rescore_shards (run_id, shard, lower_bound, upper_bound)
+            VALUES (%s, %s, %s, %s);
+        """, [(run_id, i, lower, upper) for i, (lower, upper) in enumerate(bounds)])
+    return len(bounds)
+
+
+def pending_shards(run_id: str) -> list:
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT shard FROM loan_rescore_shards
+            WHERE run_id = %s AND NOT finished ORDER BY shard;
+        """, (run_id,))
+        return [row[0] for row in cur.fetchall()]
+
+
+# -----------------------------
+# SHARD WORKER (runs in a pool process)
+# -----------------------------
+def _shard_query(state: dict, param) -> str:
+    # placeholders are registered in text order: select list first, then WHERE
+    recent = ""
+    if state["credit_score_mode"] == "recompute":
+        recent = f""",
+            (SELECT COUNT(*) FROM loan_applications r
+             WHERE r.pan = a.pan AND r.application_id <> a.application_id
+               AND r.created_at > a.created_at - make_interval(days => {param(RECENT_WINDOW_DAYS)})
+               AND r.created_at <= a.created_at) AS recent"""
+    where = []
+    if state["lower_bound"] is not None:
+        where.append(f"a.created_at >= {param(state['lower_bound'])}")
+    if state["upper_bound"] is not None:
+        where.append(f"a.created_at < {param(state['upper_bound'])}")
+    if state["last_created_at"] is not None:
+        where.append(
+            f"(a.created_at, a.application_id) > "
+            f"({param(state['last_created_at'])}, {param(state['last_application_id'])})"
+        )
+    return f"""
+        SELECT a.application_id, a.name, a.age, a.income, a.loan_amount, a.pan,
+               a.status, a.credit_score, a.risk_level, a.created_at,
+               cp.credit_score AS profile_score{recent}
+        FROM loan_applications a
+        LEFT JOIN credit_profile cp ON cp.pan = a.pan
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY a.created_at, a.application_id
+    """
+
+
+def rescore_row(run_id: str, row: dict, mode: str) -> tuple:
+    """One application through run_agent with a read-only credit score; returns a result tuple."""
+    if mode == "recompute" and row["profile_score"] is not None:
+        score = apply_credit_rules(row["profile_score"], row["recent"], row["income"], row["loan_amount"])
+    else:
+        score = row["credit_score"] if row["credit_score"] is not None else row["profile_score"]
+
+    def credit_score_fn(pan, income, loan_amount):
+        if score is None:
+            raise LookupError("No credit score on record")
+        return {"credit_score": score}
+
+    try:
+        result = run_agent(row, use_llm=False, credit_score_fn=credit_score_fn)
+    except LookupError as e:
+        return (run_id, row["application_id"], row["status"], "unscored", row["credit_score"],
+                None, row["risk_level"], None, str(e))
+    return (
+        run_id, row["application_id"], row["status"], result["status"], row["credit_score"],
+        result["credit_score"]["credit_score"] if result["credit_score"] else None,
+        row["risk_level"], result["risk"]["risk_level"] if result["risk"] else None,
+        result["decision"]["reason"],
+    )
+
+
+def run_shard(run_id: str, shard: int, batch_size: int = RESCORE_BATCH_SIZE) -> dict:
+    """Stream one shard from its checkpoint; each batch commits results + checkpoint together."""
+    with transaction() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute("""
+            SELECT s.*, r.policy_version, r.credit_score_mode
+            FROM loan_rescore_shards s JOIN loan_rescore_runs r USING (run_id)
+            WHERE s.run_id = %s AND s.shard = %s;
+        """, (run_id, shard))
+        state = cur.fetchone()
+    if state is None or state["finished"]:
+        return {"shard": shard, "rows": 0}
+
+    params = []
+
+    def param(value):
+        params.append(value)
+        return "%s"
+
+    query = _shard_query(state, param)
+    mode = state["credit_score_mode"]
+    rows_done = 0
+    started = time.perf_counter()
+
+    reader = get_connection()
+    try:
+        with reader.cursor(name=f"rescore_{shard}", cursor_factory=RealDictCursor) as cur:
+            cur.itersize = batch_size
+            cur.execute(query, params)
+            while True:
+                batch = cur.fetchmany(batch_size)
+                if not batch:
+                    break
+                # a hot reload mid-run would mix two policies in one run (no watcher
+                # thread in the workers: check the file once per batch)
+                rule_engine.reload()
+                if rule_engine.policy.version != state["policy_version"]:
+                    raise PolicyError(
+                        f"policy changed to {rule_engine.policy.version} during run "
+                        f"(run uses {state['policy_version']})"
+                    )
+                results = [rescore_row(run_id, row, mode) for row in batch]
+                last = batch[-1]
+                with transaction() as conn:
+                    wcur = conn.cursor()
+                    copy_rows(wcur, "loan_rescore_results", RESULT_COLUMNS, results)
+                    wcur.execute("""
+                        UPDATE loan_rescore_shards
+                        SET last_created_at = %s, last_application_id = %s,
+                            rows_done = rows_done + %s, updated_at = NOW()
+                        WHERE run_id = %s AND shard = %s;
+                    """, (last["created_at"], last["application_id"], len(batch), run_id, shard))
+                rows_done += len(batch)
+        reader.rollback()
+    finally:
+        reader.close()
+
+    with transaction() as conn:
+        conn.cursor().execute("""
+            UPDATE loan_rescore_shards SET finished = TRUE, updated_at = NOW()
+            WHERE run_id = %s AND shard = %s;
+        """, (run_id, shard))
+    return {"shard": shard, "rows": rows_done, "seconds": round(time.perf_counter() - started, 2)}
+
+
+# -----------------------------
+# DRIVER
+# -----------------------------
+def execute(run_id: str, workers: int, batch_size: int = RESCORE_BATCH_SIZE) -> dict:
+    """Run every unfinished shard of `run_id` across `workers` processes."""
+    shards = pending_shards(run_id)
+    started = time.perf_counter()
+    rows, failed = 0, []
+    # spawn: children must not inherit the parent's pooled connections
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max(1, workers), mp_context=context) as pool:
+        futures = {pool.submit(run_shard, run_id, shard, batch_size): shard for shard in shards}
+        for future in as_completed(futures):
+            try:
+                done = future.result()
+            except Exception as e:
+                failed.append({"shard": futures[future], "error": str(e)})
+                print(f"⚠️ shard {futures[future]} failed:", e, file=sys.stderr)
+                continue
+            rows += done["rows"]
+            print(f"shard {done['shard']}: {done['rows']} rows", file=sys.stderr)
+
+    if not failed:
+        with transaction() as conn:
+            conn.cursor().execute(
+                "UPDATE loan_rescore_runs SET finished_at = NOW() WHERE run_id = %s;", (run_id,)
+            )
+    elapsed = time.perf_counter() - started
+    return {
+        "run_id": run_id,
+        "shards": len(shards),
+        "rows": rows,
+        "seconds": round(elapsed, 2),
+        "rows_per_sec": round(rows / elapsed, 1) if elapsed > 0 else None,
+        "failed": failed,
+    }
+
+
+def report(run_id: str) -> dict:
+    """Progress and the old → new status transitions of a run."""
+    with transaction() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute("SELECT * FROM loan_rescore_runs WHERE run_id = %s;", (run_id,))
+        run = cur.fetchone()
+        if run is None:
+            raise ValueError(f"Unknown run {run_id}")
+        cur.execute("""
+            SELECT COUNT(*) AS shards, COUNT(*) FILTER (WHERE finished) AS finished,
+                   COALESCE(SUM(rows_done), 0) AS rows
+            FROM loan_rescore_shards WHERE run_id = %s;
+        """, (run_id,))
+        progress = cur.fetchone()
+        cur.execute("""
+            SELECT old_status, new_status, COUNT(*) AS n
+            FROM loan_rescore_results WHERE run_id = %s
+            GROUP BY 1, 2 ORDER BY 3 DESC;
+        """, (run_id,))
+        transitions = cur.fetchall()
+    return {
+        **run,
+        "progress": {k: int(v) for k, v in progress.items()},
+        "transitions": [{**t, "n": int(t["n"])} for t in transitions],
+        "changed": sum(int(t["n"]) for t in transitions if t["old_status"] != t["new_status"]),
+    }
+
+
+def drop(run_id: str):
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM loan_rescore_results WHERE run_id = %s;", (run_id,))
+        cur.execute("DELETE FROM loan_rescore_runs WHERE run_id = %s;", (run_id,))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline re-scoring into loan_rescore_results.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_cmd = sub.add_parser("run", help="start a new run")
+    run_cmd.add_argument("--run-id", default=None)
+    run_cmd.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    run_cmd.add_argument("--shards", type=int, default=None, help="default: 4 × workers")
+    run_cmd.add_argument("--batch-size", type=int, default=RESCORE_BATCH_SIZE)
+    run_cmd.add_argument("--credit-score", choices=CREDIT_SCORE_MODES, default="stored")
+    run_cmd.add_argument("--policy", default=None, help="candidate policy.json (default: POLICY_PATH)")
+    resume_cmd = sub.add_parser("resume", help="continue the unfinished shards of a run")
+    resume_cmd.add_argument("--run-id", required=True)
+    resume_cmd.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    resume_cmd.add_argument("--batch-size", type=int, default=RESCORE_BATCH_SIZE)
+    resume_cmd.add_argument("--policy", default=None, help="must be the run's policy version")
+    for name in ("report", "drop"):
+        cmd = sub.add_parser(name)
+        cmd.add_argument("--run-id", required=True)
+    args = parser.parse_args(argv)
+
+    if args.command == "report":
+        print(json.dumps(report(args.run_id), indent=2, default=str))
+        return
+    if args.command == "drop":
+        drop(args.run_id)
+        return
+
+    if args.policy:
+        # spawned workers inherit the environment, so their rule_engine loads this file
+        os.environ["POLICY_PATH"] = os.path.abspath(args.policy)
+    version = load_policy(os.environ.get("POLICY_PATH", POLICY_PATH)).version
+
+    if args.command == "run":
+        run_id = args.run_id or f"rs_{datetime.utcnow():%Y%m%d%H%M%S}"
+        shards = create_run(run_id, version, args.credit_score, args.shards or 4 * max(1, args.workers))
+        print(f"🧮 {run_id}: policy {version}, {shards} shards, {args.workers} workers", file=sys.stderr)
+    else:
+        run_id = args.run_id
+
+    summary = execute(run_id, args.workers, args.batch_size)
+    print(json.dumps(summary, indent=2))
+    if summary["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
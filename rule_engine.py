@@ -0,0 +1,405 @@
+# rule_engine.py
+"""
+Declarative decision policy (policy.json) compiled into ordered decision tables.
+
+Each section (validation, risk, decision) is a list of rules evaluated top to
+bottom; the first rule whose `when` matches supplies the outcome (`then`),
+otherwise the section `default` does. Each section is compiled once at load
+time into a generated Python if-chain (no per-rule calls or interpretation
+at evaluation time). The same conditions are also compiled for NumPy
+columns (prequal.py).
+
+Condition forms:
+    {"field": "age", "op": "<", "value": 18}
+    {"field": "loan_amount", "op": ">", "value": 5, "times": "income"}   # loan_amount > income * 5
+    {"any": [cond, ...]} / {"all": [cond, ...]}
+
+The policy file is re-read when its mtime changes, checked every
+POLICY_RELOAD_INTERVAL seconds by a background watcher thread (never on the
+evaluation path); a policy that fails to compile is rejected and the previous
+one stays active. Rule hits are counted (prequal's vector runs in a separate
+`vector_hits` counter, so bulk what-if runs do not skew live stats), and every
+POLICY_SAMPLE_EVERY-th evaluation is timed per rule against
+POLICY_RULE_BUDGET_NS.
+
+    python rule_engine.py check [policy.json]   # compile only
+    python rule_engine.py bench [--n 200000]    # ns per application
+    python rule_engine.py stats
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+
+POLICY_PATH = os.getenv("POLICY_PATH", os.path.join(os.path.dirname(__file__), "policy.json"))
+POLICY_RELOAD_INTERVAL = float(os.getenv("POLICY_RELOAD_INTERVAL", "5"))    # seconds, 0 disables
+POLICY_SAMPLE_EVERY = int(os.getenv("POLICY_SAMPLE_EVERY", "1000"))         # 0 disables timing
+POLICY_RULE_BUDGET_NS = int(os.getenv("POLICY_RULE_BUDGET_NS", "1000"))
+
+OPERATORS = ("<", "<=", ">", ">=", "==", "!=")
+
+# Facts each section may reference and the outcome keys each rule must supply
+SECTIONS = {
+    "validation": {"facts": ("age", "income", "loan_amount"), "outcome": ("success", "message")},
+    "risk": {"facts": ("income", "loan_amount", "credit_score"), "outcome": ("risk_level", "reason")},
+    "decision": {"facts": ("credit_score", "risk_level"), "outcome": ("approved", "manual_review", "reason")},
+}
+
+
+class PolicyError(Exception):
+    pass
+
+
+# -----------------------------
+# COMPILER
+# -----------------------------
+def _literal(value) -> str:
+    if isinstance(value, bool) or isinstance(value, str):
+        return repr(value)
+    if isinstance(value, (int, float)) and math.isfinite(value):
+        return repr(value)
+    raise PolicyError(f"unsupported value {value!r}")
+
+
+def condition_source(spec: dict, facts: tuple, used: set, vector: bool = False) -> str:
+    """
+    Condition spec → Python expression over fact names (collected in `used`).
+    Scalar expressions short-circuit with and/or; vector ones combine with & / |.
+    """
+    if not isinstance(spec, dict):
+        raise PolicyError(f"condition must be an object, got {spec!r}")
+    if "any" in spec or "all" in spec:
+        kind = "any" if "any" in spec else "all"
+        parts = [condition_source(s, facts, used, vector) for s in spec[kind]]
+        if not parts:
+            raise PolicyError(f"empty '{kind}' condition")
+        if vector:
+            joiner = " | " if kind == "any" else " & "
+        else:
+            joiner = " or " if kind == "any" else " and "
+        return "(" + joiner.join(f"({p})" for p in parts) + ")"
+
+    field, op = spec.get("field"), spec.get("op")
+    if field not in facts:
+        raise PolicyError(f"unknown field {field!r} (allowed: {', '.join(facts)})")
+    if op not in OPERATORS:
+        raise PolicyError(f"unknown operator {op!r}")
+    if "value" not in spec:
+        raise PolicyError(f"condition on {field!r} has no value")
+    used.add(field)
+
+    rhs = _literal(spec["value"])
+    times = spec.get("times")
+    if times is not None:
+        if times not in facts:
+            raise PolicyError(f"unknown field {times!r} in 'times'")
+        used.add(times)
+        rhs = f"{times} * {rhs}"
+    return f"{field} {op} {rhs}"
+
+
+def _build(name: str, body: list, used: set, env: dict | None = None):
+    """
+    Compile a generated function `name(f)` that unpacks the facts it needs from
+    dict `f`; `env` holds the extra globals the body refers to.
+    """
+    loads = [f"    {fact} = f[{fact!r}]" for fact in sorted(used)]
+    source = "\n".join([f"def {name}(f):", *loads, *body])
+    namespace = {}
+    exec(compile(source, f"<policy:{name}>", "exec"), {"__builtins__": {}, **(env or {})}, namespace)
+    return namespace[name], source
+
+
+class DecisionTable:
+    """
+    Ordered rules for one section, compiled into a single if-chain function
+    plus one function per rule for sampled timing and vector runs.
+
+    `evaluate(facts)` is the generated if-chain itself: it bumps the matching
+    rule's hit counter and returns its outcome (shared dict: do not mutate).
+    Hits are counted without a lock to keep this path cheap; under heavy thread
+    contention an occasional increment may be lost.
+    """
+
+    def __init__(self, name: str, spec: dict):
+        section = SECTIONS[name]
+        self.name = name
+        self.rule_ids = []
+        self.outcomes = []
+        self.predicates = []           # per-rule scalar predicates (timed path)
+        self.vector_predicates = []    # per-rule NumPy predicates
+
+        chain, chain_facts = [], set()
+        for rule in spec.get("rules", []):
+            rule_id = rule.get("id") if isinstance(rule, dict) else None
+            if not rule_id or rule_id in self.rule_ids:
+                raise PolicyError(f"{name}: every rule needs a unique id (got {rule_id!r})")
+            try:
+                used = set()
+                expression = condition_source(rule["when"], section["facts"], used)
+                vector_expression = condition_source(rule["when"], section["facts"], set(), vector=True)
+            except (KeyError, PolicyError) as e:
+                raise PolicyError(f"{name}.{rule_id}: {e}") from e
+
+            index = len(self.rule_ids)
+            chain.append(f"    if {expression}:\n        hits[{index}] += 1\n        return outcomes[{index}]")
+            chain_facts |= used
+            self.predicates.append(_build(f"rule_{index}", [f"    return {expression}"], used)[0])
+            self.vector_predicates.append(
+                _build(f"rule_{index}", [f"    return {vector_expression}"], used)[0]
+            )
+            self.rule_ids.append(rule_id)
+            self.outcomes.append(self._outcome(rule_id, rule.get("then"), section))
+
+        self.default = self._outcome("default", spec.get("default"), section)
+        chain.append(f"    hits[{len(self.rule_ids)}] += 1\n    return outcomes[{len(self.rule_ids)}]")
+        self.rule_ids.append("default")
+        self.outcomes.append(self.default)
+
+        size = len(self.rule_ids)
+        self.hits = [0] * size         # mutated in place only: the generated chain holds this list
+        self.evaluate, self.source = _build(
+            f"evaluate_{name}", chain, chain_facts, {"hits": self.hits, "outcomes": self.outcomes}
+        )
+        self.vector_hits = [0] * size      # match_vector() rows, kept out of the live hit counts
+        self.sampled = [0] * size          # timed evaluations per rule
+        self.sampled_ns = [0] * size
+        self.max_ns = [0] * size
+        self.over_budget = [0] * size
+        self._lock = threading.Lock()
+
+    def _outcome(self, rule_id, then, section) -> dict:
+        if not isinstance(then, dict):
+            raise PolicyError(f"{self.name}.{rule_id}: missing outcome")
+        missing = [k for k in section["outcome"] if k not in then]
+        if missing:
+            raise PolicyError(f"{self.name}.{rule_id}: outcome missing {', '.join(missing)}")
+        return then
+
+    def evaluate_timed(self, facts: dict, budget_ns: int) -> dict:
+        """Same as evaluate(), timing each rule it has to try."""
+        i = len(self.predicates)
+        timings = []
+        for j, predicate in enumerate(self.predicates):
+            started = time.perf_counter_ns()
+            matched = predicate(facts)
+            timings.append(time.perf_counter_ns() - started)
+            if matched:
+                i = j
+                break
+        with self._lock:
+            self.hits[i] += 1
+            for j, elapsed in enumerate(timings):
+                self.sampled[j] += 1
+                self.sampled_ns[j] += elapsed
+                self.max_ns[j] = max(self.max_ns[j], elapsed)
+                if elapsed > budget_ns:
+                    self.over_budget[j] += 1
+        return self.outcomes[i]
+
+    def match_vector(self, facts: dict):
+        """Index of the matching rule for every row (len(rules) = default)."""
+        import numpy as np
+
+        shape = np.broadcast(*facts.values()).shape
+        conditions = [np.broadcast_to(np.asarray(p(facts), dtype=bool), shape) for p in self.vector_predicates]
+        if conditions:
+            index = np.select(conditions, np.arange(len(conditions)), default=len(conditions))
+        else:
+            index = np.zeros(shape, dtype=np.int64)
+        with self._lock:
+            for i, n in enumerate(np.bincount(index, minlength=len(self.rule_ids))):
+                self.vector_hits[i] += int(n)
+        return index
+
+    def outcome_column(self, key: str, index):
+        """Outcome value `key` for each row of match_vector()'s result."""
+        import numpy as np
+
+        return np.asarray([outcome[key] for outcome in self.outcomes])[index]
+
+    def stats(self) -> list:
+        with self._lock:
+            return [
+                {
+                    "rule": rule_id,
+                    "hits": self.hits[i],
+                    "vector_hits": self.vector_hits[i],
+                    "sampled": self.sampled[i],
+                    "avg_ns": round(self.sampled_ns[i] / self.sampled[i], 1) if self.sampled[i] else None,
+                    "max_ns": self.max_ns[i],
+                    "over_budget": self.over_budget[i],
+                }
+                for i, rule_id in enumerate(self.rule_ids)
+            ]
+
+
+class CompiledPolicy:
+    def __init__(self, spec: dict, source: str | None = None):
+        if not isinstance(spec, dict) or not spec.get("version"):
+            raise PolicyError("policy needs a 'version'")
+        self.version = str(spec["version"])
+        self.spec = spec
+        self.source = source
+        self.loaded_at = time.time()
+        self.tables = {}
+        for name in SECTIONS:
+            if name not in spec:
+                raise PolicyError(f"policy has no '{name}' section")
+            self.tables[name] = DecisionTable(name, spec[name])
+        self.evaluators = {name: table.evaluate for name, table in self.tables.items()}
+
+
+def load_policy(path: str = POLICY_PATH) -> CompiledPolicy:
+    try:
+        with open(path, encoding="utf-8") as f:
+            spec = json.load(f)
+    except (OSError, ValueError) as e:
+        raise PolicyError(f"cannot read {path}: {e}") from e
+    return CompiledPolicy(spec, source=path)
+
+
+# -----------------------------
+# ENGINE (active policy + hot reload)
+# -----------------------------
+class RuleEngine:
+    """
+    `policy` is a plain attribute holding an immutable CompiledPolicy; reload()
+    swaps the whole reference, so evaluate() never stats the file, takes a lock
+    or checks a clock. start() runs the mtime watcher that calls reload().
+    """
+
+    def __init__(self, path: str = POLICY_PATH, reload_interval: float = POLICY_RELOAD_INTERVAL,
+                 sample_every: int = POLICY_SAMPLE_EVERY, budget_ns: int = POLICY_RULE_BUDGET_NS):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.sample_every = sample_every
+        self.budget_ns = budget_ns
+        # evaluations left until the next timed one (0 disables timing: never reached)
+        self._countdown = sample_every or sys.maxsize
+        self._mtime = None
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.reloads = 0
+        self.reload_errors = 0
+        self.last_error = None
+        self.policy = None
+        self.reload(force=True)
+
+    def reload(self, force: bool = False) -> bool:
+        """Recompile if the policy file changed; keeps the active policy on error."""
+        with self._reload_lock:
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError as e:
+                if self.policy is None:
+                    raise PolicyError(f"cannot read {self.path}: {e}") from e
+                return False
+            if not force and mtime == self._mtime:
+                return False
+            try:
+                policy = load_policy(self.path)
+            except PolicyError as e:
+                self._mtime = mtime         # don't retry until the file changes again
+                self.reload_errors += 1
+                self.last_error = str(e)
+                if self.policy is None:
+                    raise
+                print("⚠️ POLICY RELOAD FAILED (keeping version", self.policy.version + "):", e)
+                return False
+            previous = self.policy
+            self.policy, self._mtime = policy, mtime
+            self.reloads += 1
+            self.last_error = None
+            if previous is not None:
+                print(f"🔁 Policy reloaded: {previous.version} → {policy.version}")
+            return True
+
+    # ---- mtime watcher
+    def start(self):
+        if self._thread or self.reload_interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="policy-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _watch(self):
+        while not self._stop.wait(self.reload_interval):
+            try:
+                self.reload()
+            except Exception as e:
+                print("⚠️ POLICY WATCHER ERROR:", e)
+
+    def evaluate(self, section: str, facts: dict) -> dict:
+        # unlocked countdown: a lost decrement only delays the next sample
+        self._countdown -= 1
+        if self._countdown > 0:
+            return self.policy.evaluators[section](facts)
+        self._countdown = self.sample_every or sys.maxsize
+        return self.policy.tables[section].evaluate_timed(facts, self.budget_ns)
+
+    def stats(self) -> dict:
+        policy = self.policy
+        return {
+            "version": policy.version,
+            "source": policy.source,
+            "loaded_at": policy.loaded_at,
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+            "last_error": self.last_error,
+            "sample_every": self.sample_every,
+            "rule_budget_ns": self.budget_ns,
+            "sections": {name: table.stats() for name, table in policy.tables.items()},
+        }
+
+
+rule_engine = RuleEngine()
+
+
+def bench(n: int) -> dict:
+    """Average ns for validation + risk + decision on a fixed valid application."""
+    engine = RuleEngine(reload_interval=0, sample_every=0)
+    application = {"age": 35, "income": 50000.0, "loan_amount": 120000.0, "credit_score": 640}
+    started = time.perf_counter_ns()
+    for _ in range(n):
+        engine.evaluate("validation", application)
+        risk = engine.evaluate("risk", application)
+        engine.evaluate("decision", {"credit_score": application["credit_score"],
+                                     "risk_level": risk["risk_level"]})
+    elapsed = time.perf_counter_ns() - started
+    return {"applications": n, "ns_per_application": round(elapsed / n, 1),
+            "version": engine.policy.version}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Decision policy tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    check_cmd = sub.add_parser("check", help="compile a policy file without activating it")
+    check_cmd.add_argument("path", nargs="?", default=POLICY_PATH)
+    bench_cmd = sub.add_parser("bench", help="measure evaluation cost per application")
+    bench_cmd.add_argument("--n", type=int, default=200000)
+    sub.add_parser("stats", help="compiled policy summary")
+    args = parser.parse_args()
+
+    if args.command == "check":
+        try:
+            policy = load_policy(args.path)
+        except PolicyError as e:
+            print("❌", e)
+            sys.exit(1)
+        print(f"✅ {args.path}: version {policy.version}, "
+              + ", ".join(f"{n}={len(t.predicates)} rules" for n, t in policy.tables.items()))
+    elif args.command == "bench":
+        print(json.dumps(bench(args.n)))
+    else:
+        print(json.dumps(rule_engine.stats(), indent=2))
@@ -1,106 +1,236 @@
 # services.py
 from datetime import datetime
+from functools import partial
+import os
+import threading
+import time
 import uuid
 
 from agent import run_agent
+from agent_tools import credit_score_tool
 from db_postgres import (
-    check_active_application,
-    log_status_change,
-    get_status_history,
+    transaction,
+    reserve_application,
+    finalize_application,
+    log_status_changes,
 )
-from llm_service import generate_status_explanation
+from llm_cache import invalidate_application, TERMINAL_STATUSES
+from chat_sessions import chat_store
+from explanation_worker import explanation_workers
+from metrics import PIPELINE_STAGE_SECONDS
 
+ACTIVE_STATUSES = ("submitted", "processing", "manual_review")
 
-def generate_application_data(req, use_llm: bool = False):
+# Seconds a PAN rejected as a duplicate is rejected again without touching the DB (0 disables)
+ADMISSION_NEGATIVE_TTL = float(os.getenv("ADMISSION_NEGATIVE_TTL", "2"))
+ADMISSION_NEGATIVE_MAX = int(os.getenv("ADMISSION_NEGATIVE_MAX", "10000"))
+
+REVIEW_ACTIONS = {"approve": "approved", "reject": "rejected"}
+REVIEW_BATCH_MAX = int(os.getenv("REVIEW_BATCH_MAX", "500"))       # decisions per PUT /loan/review/batch
+
+
+class DuplicateApplicationError(Exception):
+    """The PAN already has an active application (→ 409)."""
+
+    def __init__(self, pan: str):
+        super().__init__(f"Active application already exists for PAN {pan}")
+        self.pan = pan
+
+
+class NegativeAdmissionCache:
     """
-    FULL PIPELINE:
-    1. Create application ID + timestamps
-    2. Check active PAN
-    3. submitted → processing
-    4. Agent run
-    5. Manual-review routing
-    6. Final decision (approved/rejected)
-    7. LLM status explanation (final only)
+    PANs recently refused by the unique_active_pan index. Per process and
+    short-lived: an entry can only be stale for `ttl` seconds after the
+    active application is decided elsewhere.
     """
 
+    def __init__(self, ttl: float = ADMISSION_NEGATIVE_TTL, max_entries: int = ADMISSION_NEGATIVE_MAX):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._expires = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    def __contains__(self, pan: str) -> bool:
+        if self.ttl <= 0:
+            return False
+        with self._lock:
+            expires_at = self._expires.get(pan)
+            if expires_at is None:
+                return False
+            if expires_at < time.monotonic():
+                del self._expires[pan]
+                return False
+            self.hits += 1
+            return True
+
+    def add(self, pan: str):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if len(self._expires) >= self.max_entries:
+                now = time.monotonic()
+                self._expires = {p: t for p, t in self._expires.items() if t >= now}
+                if len(self._expires) >= self.max_entries:
+                    self._expires.pop(next(iter(self._expires)))
+            self._expires[pan] = time.monotonic() + self.ttl
+
+    def discard(self, pan: str):
+        with self._lock:
+            self._expires.pop(pan, None)
+
+
+recent_duplicates = NegativeAdmissionCache()
+
+
+def new_application_data(req) -> dict:
+    """Application dict with ID, timestamps and empty officer / LLM fields."""
     data = req.dict()
     data["application_id"] = f"ln_{uuid.uuid4().hex[:12]}"
     data["created_at"] = datetime.utcnow()
+    data["status"] = None
 
-    # Pre-fill officer fields (until manual review occurs)
+    # Pre-fill officer / LLM fields (until manual review occurs)
     data["officer_notes"] = None
     data["reviewed_by"] = None
+    data["llm_explanation"] = None
+    data["llm_status_explanation"] = None
+    data["llm_status_explanation_state"] = None
+    return data
 
-    # ============================================================
-    # 1️⃣ PAN CHECK → SUBMITTED
-    # ============================================================
-    if check_active_application(data["pan"]):
-        raise Exception(f"Active application already exists for PAN {data['pan']}")
 
-    old_status = None
-    new_status = "submitted"
+def transition(data: dict, history: list, new_status: str):
+    """Record a status change in memory; history is written once at commit."""
+    history.append({
+        "old_status": data.get("status"),
+        "new_status": new_status,
+        "changed_at": datetime.utcnow(),
+    })
     data["status"] = new_status
 
-    log_status_change(data["application_id"], old_status, new_status)
 
-    # ============================================================
-    # 2️⃣ RUN AGENT
-    # ============================================================
-    agent_result = run_agent(data, use_llm=use_llm)
+def evaluate_application(data: dict, history: list, use_llm: bool = False,
+                         credit_score_fn=credit_score_tool):
+    """
+    submitted → agent run → processing → manual_review | approved | rejected.
+    Fills the decision fields on `data` and appends transitions to `history`.
+    """
+    transition(data, history, "submitted")
+
+    agent_result = run_agent(data, use_llm=use_llm, credit_score_fn=credit_score_fn)
 
     # If validation failed, agent auto-rejects
     if not agent_result["validation"]["success"]:
-        data["status"] = "rejected"
+        transition(data, history, "rejected")
         data["credit_score"] = None
         data["risk_level"] = None
         data["decision_reason"] = agent_result["decision"]["reason"]
-        return data
+        return
 
-    # ============================================================
-    # 3️⃣ PROCESSING
-    # ============================================================
-    old_status = new_status
-    new_status = "processing"
-    log_status_change(data["application_id"], old_status, new_status)
+    transition(data, history, "processing")
 
     # Fill evaluation results
     data["credit_score"] = agent_result["credit_score"]["credit_score"]
     data["risk_level"] = agent_result["risk"]["risk_level"]
     data["decision_reason"] = agent_result["decision"]["reason"]
 
-    # ============================================================
-    # 4️⃣ MANUAL REVIEW AUTO-ROUTING
-    # ============================================================
-    if agent_result["status"] == "manual_review":
-        old_status = "processing"
-        new_status = "manual_review"
-        data["status"] = new_status
-
-        log_status_change(data["application_id"], old_status, new_status)
+    # LLM explanation for decision (optional, generated by agent)
+    data["llm_explanation"] = agent_result.get("llm_explanation")
 
-        # LLM explanation for decision (optional)
-        data["llm_explanation"] = agent_result.get("llm_explanation")
+    # manual_review, or auto final decision (approved / rejected)
+    transition(data, history, agent_result["status"])
 
-        # Status explanation is NOT generated until final approval/rejection
-        data["llm_status_explanation"] = None
+    # Status explanation is NOT generated until final approval/rejection,
+    # and then by the background workers (explanation_worker.py)
+    if data["status"] in TERMINAL_STATUSES:
+        data["llm_status_explanation_state"] = "pending"
 
-        return data
 
-    # ============================================================
-    # 5️⃣ AUTO FINAL DECISION (approved / rejected)
-    # ============================================================
-    final_status = agent_result["status"]
-    data["status"] = final_status
+def generate_application_data(req, use_llm: bool = False):
+    """
+    FULL PIPELINE (one transaction, one connection):
+    1. Create application ID + timestamps
+    2. Reserve the PAN: INSERT ... ON CONFLICT DO NOTHING on unique_active_pan
+       (duplicate → DuplicateApplicationError, before any scoring)
+    3. submitted → processing
+    4. Agent run
+    5. Manual-review routing
+    6. Final decision (approved/rejected)
+    7. Write the decision onto the reserved row + bulk-insert status history
+    8. Enqueue the LLM status explanation (final only, generated in the background)
 
-    log_status_change(data["application_id"], "processing", final_status)
+    Status history is accumulated in memory and written once at the end; if
+    anything fails the reservation rolls back with it, leaving no rows behind.
+    The returned dict carries the history under "history".
+    """
 
-    # Optional LLM explanation generated by agent
-    data["llm_explanation"] = agent_result.get("llm_explanation")
+    data = new_application_data(req)
+    history = []
+
+    if data["pan"] in recent_duplicates:
+        raise DuplicateApplicationError(data["pan"])
+
+    with transaction():
+        # ============================================================
+        # 1️⃣ ADMISSION (the partial unique index is the only check)
+        # ============================================================
+        with PIPELINE_STAGE_SECONDS.time("admission"):
+            admitted = reserve_application(data)
+        if not admitted:
+            recent_duplicates.add(data["pan"])
+            raise DuplicateApplicationError(data["pan"])
+
+        # ============================================================
+        # 2️⃣ AGENT RUN + STATUS ROUTING
+        # (the reserved row is already in the PAN's 30-day count)
+        # ============================================================
+        with PIPELINE_STAGE_SECONDS.time("agent"):
+            evaluate_application(data, history, use_llm=use_llm,
+                                 credit_score_fn=partial(credit_score_tool, counted_self=True))
+
+        # ============================================================
+        # 3️⃣ DECISION + ONE BULK HISTORY INSERT
+        # ============================================================
+        with PIPELINE_STAGE_SECONDS.time("persist"):
+            finalize_application(data)
+            log_status_changes(data["application_id"], history)
 
     # ============================================================
-    # 6️⃣ FULL LLM STATUS EXPLANATION
+    # 4️⃣ LLM STATUS EXPLANATION → background queue (after commit)
     # ============================================================
-    history = get_status_history(data["application_id"])
-    data["llm_status_explanation"] = generate_status_explanation(data, history)
+    if data["llm_status_explanation_state"] == "pending":
+        explanation_workers.enqueue(data["application_id"])
 
-    return data
+    return {**data, "history": history}
+
+
+# ============================================================
+# OFFICER REVIEW
+# ============================================================
+def review_decisions(reviews: list, officer: str) -> list:
+    """
+    (application_id, action, notes) → (application_id, new_status, notes, officer)
+    rows for review_applications. ValueError on an unknown action or a repeated id.
+    """
+    decisions, seen = [], set()
+    for application_id, action, notes in reviews:
+        new_status = REVIEW_ACTIONS.get(action.lower())
+        if new_status is None:
+            raise ValueError("Action must be approve/reject")
+        if application_id in seen:
+            raise ValueError(f"Duplicate review for {application_id}")
+        seen.add(application_id)
+        decisions.append((application_id, new_status, notes, officer))
+    return decisions
+
+
+def after_status_change(application_id: str, new_status: str):
+    """
+    Post-commit hook for status changes made outside the ingestion pipeline
+    (officer review): drop cached LLM responses and chat context about the
+    application and queue its status explanation once it is final.
+    """
+    invalidate_application(application_id)
+    chat_store.invalidate(application_id)
+    if new_status in TERMINAL_STATUSES:
+        explanation_workers.enqueue(application_id)
@@ -0,0 +1,339 @@
+# status_events.py
+"""
+Push feed of status transitions for officer dashboards (GET /loan/events, SSE).
+
+Every insert into loan_status_history also writes the outbox table
+loan_status_events (migration 8) and NOTIFYs `loan_status_events` on commit.
+One relay thread per process LISTENs on a dedicated connection, reads the new
+outbox rows once and fans them out to every connected dashboard, so N open
+dashboards cost one query per commit instead of N polls of /loan/pending_review.
+
+Delivery is at-least-once. Outbox ids are allocated before commit, so a later
+id can become visible first; the relay keeps a watermark below such a gap
+until the row shows up (or STATUS_EVENTS_GAP_TIMEOUT passes, e.g. rollback).
+The SSE `id:` is that watermark, so a client resuming with Last-Event-ID (or
+`?after=`) may see a few events again; dedupe on the event's own `id`.
+"""
+import asyncio
+import os
+import queue
+import select
+import threading
+import time
+
+import metrics
+from db_postgres import get_connection, transaction
+from utils import sse_event
+
+STATUS_EVENTS_CHANNEL = "loan_status_events"
+STATUS_EVENTS_POLL = float(os.getenv("STATUS_EVENTS_POLL", "5"))                    # seconds between checks without a NOTIFY
+STATUS_EVENTS_GAP_TIMEOUT = float(os.getenv("STATUS_EVENTS_GAP_TIMEOUT", "30"))     # give up on a missing id after this
+STATUS_EVENTS_HEARTBEAT = float(os.getenv("STATUS_EVENTS_HEARTBEAT", "15"))         # idle SSE keepalive
+STATUS_EVENTS_BUFFER = int(os.getenv("STATUS_EVENTS_BUFFER", "1000"))               # batches queued per dashboard
+STATUS_EVENTS_RETENTION_HOURS = float(os.getenv("STATUS_EVENTS_RETENTION_HOURS", "72"))
+STATUS_EVENTS_PAGE = 500
+
+_EVENT_COLUMNS = ("id", "application_id", "old_status", "new_status", "changed_at")
+
+
+def read_events(after: int, limit: int = STATUS_EVENTS_PAGE) -> list:
+    """Outbox rows with id > after, oldest first (resume / replay)."""
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT {', '.join(_EVENT_COLUMNS)} FROM loan_status_events
+            WHERE id > %s ORDER BY id LIMIT %s;
+        """, (after, limit))
+        return [dict(zip(_EVENT_COLUMNS, row)) for row in cur.fetchall()]
+
+
+# -----------------------------
+# 📬 PER-DASHBOARD SUBSCRIPTION
+# -----------------------------
+class Subscription:
+    """
+    Bounded queue of (events, watermark) batches from the relay thread. Pass the
+    event loop for async consumers. On overflow the batches are dropped and the
+    consumer replays from the outbox instead.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop | None = None, maxsize: int = STATUS_EVENTS_BUFFER):
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize) if loop else queue.Queue(maxsize)
+        self.overflowed = False
+
+    def offer(self, item):
+        if self._loop is None:
+            self._put(item)
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._put, item)
+        except RuntimeError:
+            pass    # loop closed; the relay drops the subscription on unsubscribe
+
+    def _put(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except (queue.Full, asyncio.QueueFull):
+            self.overflowed = True
+
+    def get(self, timeout: float):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    async def aget(self, timeout: float):
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def reset(self):
+        """Drop whatever is queued; the caller replays from the outbox."""
+        self.overflowed = False
+        while not self._queue.empty():
+            self._queue.get_nowait()
+
+
+# -----------------------------
+# 📡 LISTEN / NOTIFY RELAY
+# -----------------------------
+class StatusEventRelay:
+    def __init__(self, poll: float = STATUS_EVENTS_POLL, gap_timeout: float = STATUS_EVENTS_GAP_TIMEOUT,
+                 retention_hours: float = STATUS_EVENTS_RETENTION_HOURS):
+        self.poll = poll
+        self.gap_timeout = gap_timeout
+        self.retention_hours = retention_hours
+        self.watermark = None       # every id <= watermark has been relayed (or given up on)
+        self._max_seen = None
+        self._gaps = {}             # missing id below _max_seen → monotonic time first noticed
+        self._subscribers = set()
+        self._listeners = []        # in-process callbacks(events), e.g. cache invalidation
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_prune = None     # monotonic time of the last prune; first one runs right away
+        self._counters = {"notifies": 0, "fetches": 0, "relayed": 0, "gaps_expired": 0, "errors": 0}
+
+    # -----------------------------
+    # LIFECYCLE
+    # -----------------------------
+    def start(self):
+        with self._lock:
+            if self._thread:
+                return
+            # ids committed long enough ago cannot still be in flight
+            with transaction() as conn:
+                cur = conn.cursor()
+                cur.execute("""
+                    SELECT COALESCE(MAX(id), 0) FROM loan_status_events
+                    WHERE created_at < NOW() - make_interval(secs => %s);
+                """, (self.gap_timeout,))
+                self.watermark = self._max_seen = cur.fetchone()[0]
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="status-event-relay", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def subscribe(self, loop: asyncio.AbstractEventLoop | None = None) -> Subscription:
+        self.start()
+        sub = Subscription(loop)
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def add_listener(self, callback):
+        """Call `callback(events)` on the relay thread for every fetched batch; keep it fast."""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["subscribers"] = len(self._subscribers)
+            stats["open_gaps"] = len(self._gaps)
+        stats["watermark"] = self.watermark
+        stats["running"] = self._thread is not None and not self._stop.is_set()
+        return stats
+
+    # -----------------------------
+    # RELAY THREAD
+    # -----------------------------
+    def _run(self):
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = get_connection()
+                conn.autocommit = True
+                cur = conn.cursor()
+                cur.execute(f"LISTEN {STATUS_EVENTS_CHANNEL};")
+                self._fetch(cur)        # anything committed before LISTEN took effect
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], self.poll)[0]:
+                        conn.poll()
+                        with self._lock:
+                            self._counters["notifies"] += len(conn.notifies)
+                        conn.notifies.clear()
+                    self._fetch(cur)
+                    self._maybe_prune(cur)
+            except Exception as e:
+                with self._lock:
+                    self._counters["errors"] += 1
+                print("⚠️ STATUS EVENT RELAY ERROR:", e)
+                self._stop.wait(self.poll)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def _fetch(self, cur):
+        """Read rows above the highest relayed id plus any still-missing ids, page by page."""
+        while True:
+            cur.execute(f"""
+                SELECT {', '.join(_EVENT_COLUMNS)} FROM loan_status_events
+                WHERE id > %s OR id = ANY(%s)
+                ORDER BY id LIMIT %s;
+            """, (self._max_seen, list(self._gaps), STATUS_EVENTS_PAGE))
+            events = [dict(zip(_EVENT_COLUMNS, row)) for row in cur.fetchall()]
+            previous = self.watermark
+            self._advance([e["id"] for e in events])
+            if events or self.watermark != previous:
+                self._broadcast(events)
+            if len(events) < STATUS_EVENTS_PAGE:
+                return
+
+    def _advance(self, ids: list):
+        now = time.monotonic()
+        for event_id in ids:
+            self._gaps.pop(event_id, None)
+        if ids and ids[-1] > self._max_seen:
+            present = set(ids)
+            for missing in range(self._max_seen + 1, ids[-1]):
+                if missing not in present:
+                    self._gaps[missing] = now
+            self._max_seen = ids[-1]
+        expired = [i for i, noticed in self._gaps.items() if now - noticed > self.gap_timeout]
+        for event_id in expired:
+            del self._gaps[event_id]
+        with self._lock:
+            self._counters["fetches"] += 1
+            self._counters["relayed"] += len(ids)
+            self._counters["gaps_expired"] += len(expired)
+        self.watermark = min(self._gaps) - 1 if self._gaps else self._max_seen
+
+    def _broadcast(self, events: list):
+        with self._lock:
+            subscribers = list(self._subscribers)
+            listeners = list(self._listeners)
+        for sub in subscribers:
+            sub.offer((events, self.watermark))
+        if events:
+            for callback in listeners:
+                try:
+                    callback(events)
+                except Exception as e:
+                    print("⚠️ STATUS EVENT LISTENER ERROR:", e)
+
+    def _maybe_prune(self, cur):
+        if self.retention_hours <= 0:
+            return
+        if self._last_prune is not None and time.monotonic() - self._last_prune < 3600:
+            return
+        self._last_prune = time.monotonic()
+        cur.execute("""
+            DELETE FROM loan_status_events
+            WHERE created_at < NOW() - make_interval(secs => %s);
+        """, (self.retention_hours * 3600,))     # make_interval(hours =>) only takes an integer
+
+
+status_relay = StatusEventRelay()
+
+metrics.Gauge(
+    "loan_status_event_subscribers", "Connected /loan/events dashboards",
+    callback=lambda: len(status_relay._subscribers),
+)
+
+
+# -----------------------------
+# 🖥️ SSE FEED (one per dashboard connection)
+# -----------------------------
+class EventFeed:
+    """Cursor, dedupe and status filter for one connection; the transport loops live in the apps."""
+
+    def __init__(self, after: int | None, statuses: set | None):
+        self.cursor = after if after is not None else status_relay.watermark
+        self.statuses = statuses
+        self._sent = set()          # ids above the cursor already written
+
+    def ready(self) -> str:
+        return sse_event({"cursor": self.cursor}, event="ready", event_id=str(self.cursor))
+
+    def heartbeat(self) -> str:
+        return sse_event({"cursor": self.cursor}, event="heartbeat", event_id=str(self.cursor))
+
+    def render(self, events: list) -> list:
+        chunks = []
+        for event in events:
+            if event["id"] <= self.cursor or event["id"] in self._sent:
+                continue
+            self._sent.add(event["id"])
+            if self.statuses and event["new_status"] not in self.statuses:
+                continue
+            chunks.append(sse_event(event, event="status", event_id=str(self.cursor)))
+        return chunks
+
+    def advance(self, watermark: int):
+        if watermark > self.cursor:
+            self.cursor = watermark
+            self._sent = {i for i in self._sent if i > watermark}
+
+    def replay(self) -> list:
+        """Everything in the outbox above the cursor (client resume, or after an overflow)."""
+        chunks, after = [], self.cursor
+        while True:
+            events = read_events(after)
+            chunks.extend(self.render(events))
+            if len(events) < STATUS_EVENTS_PAGE:
+                return chunks
+            after = events[-1]["id"]
+
+
+def parse_statuses(status: str | None) -> set | None:
+    """`status=manual_review` or a comma-separated list; None means every transition."""
+    if not status:
+        return None
+    return {s.strip() for s in status.split(",") if s.strip()}
+
+
+async def astream_events(after: int | None, statuses: set | None):
+    """SSE generator (both apps); outbox reads run in a worker thread, waiting costs no thread."""
+    sub = await asyncio.to_thread(status_relay.subscribe, asyncio.get_running_loop())
+    try:
+        feed = EventFeed(after, statuses)
+        yield feed.ready()
+        for chunk in await asyncio.to_thread(feed.replay):
+            yield chunk
+        while True:
+            item = await sub.aget(STATUS_EVENTS_HEARTBEAT)
+            if sub.overflowed:
+                sub.reset()
+                for chunk in await asyncio.to_thread(feed.replay):
+                    yield chunk
+            elif item is None:
+                yield feed.heartbeat()
+            else:
+                events, watermark = item
+                for chunk in feed.render(events):
+                    yield chunk
+                feed.advance(watermark)
+    finally:
+        status_relay.unsubscribe(sub)
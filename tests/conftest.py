@@ -0,0 +1,35 @@
+# tests/conftest.py
+"""
+Shared fixtures. Modules live at the repo root, so it is put on sys.path here.
+
+Tests that need Postgres use the `migrated_db` fixture: it is skipped when
+DB_HOST:DB_PORT does not accept connections, otherwise it runs the migrations.
+Point DB_NAME at a scratch database; tests insert (and remove) their own rows.
+"""
+import os
+import socket
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def db_reachable() -> bool:
+    host = os.getenv("DB_HOST", "localhost")
+    port = int(os.getenv("DB_PORT", "5432"))
+    try:
+        socket.create_connection((host, port), timeout=1).close()
+        return True
+    except OSError:
+        return False
+
+
+@pytest.fixture(scope="session")
+def migrated_db():
+    pytest.importorskip("psycopg2")
+    pytest.importorskip("dotenv")
+    if not db_reachable():
+        pytest.skip("Postgres not reachable at DB_HOST:DB_PORT")
+    from db_postgres import init_db
+    init_db()
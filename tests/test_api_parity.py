@@ -0,0 +1,29 @@
+# tests/test_api_parity.py
+"""main.py and main_async.py must expose the same routes."""
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("asyncpg")
+
+
+def _routes(app) -> set:
+    return {
+        (method, route.path)
+        for route in app.routes
+        for method in getattr(route, "methods", None) or ()
+    }
+
+
+def test_sync_and_async_apps_expose_the_same_routes(migrated_db):
+    import main
+    import main_async
+
+    assert _routes(main.app) == _routes(main_async.app)
+
+
+def test_static_routes_are_declared_before_application_id(migrated_db):
+    import main
+
+    paths = [route.path for route in main.app.routes]
+    for static in ("/loan/stats", "/loan/events", "/loan/all", "/loan/pending_review"):
+        assert paths.index(static) < paths.index("/loan/{application_id}")
@@ -0,0 +1,72 @@
+# tests/test_batch.py
+"""
+An active application committed after the batch's active-PAN lookup must turn
+that row into a `conflict` (ON CONFLICT DO NOTHING on unique_active_pan), not
+abort the chunk; the rest of the chunk is still persisted. The CLI reads
+NDJSON one line at a time.
+"""
+import io
+import uuid
+
+import pytest
+
+
+@pytest.fixture
+def pans(migrated_db):
+    from db_postgres import transaction
+
+    pans = [f"BT{uuid.uuid4().hex[:8].upper()}" for _ in range(2)]
+    yield pans
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT application_id FROM loan_applications WHERE pan = ANY(%s);", (pans,))
+        ids = [row[0] for row in cur.fetchall()]
+        for table in ("loan_manual_review", "loan_status_history", "loan_applications"):
+            cur.execute(f"DELETE FROM {table} WHERE application_id = ANY(%s);", (ids,))
+        cur.execute("DELETE FROM credit_profile WHERE pan = ANY(%s);", (pans,))
+
+
+def test_late_active_application_becomes_conflict(pans, monkeypatch):
+    import batch
+    from db_postgres import transaction
+
+    taken, free = pans
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO loan_applications (application_id, name, age, income, loan_amount, pan, status, created_at)
+            VALUES (%s, 'batch test', 30, 50000, 100000, %s, 'manual_review', NOW());
+        """, (f"T-{uuid.uuid4().hex[:12]}", taken))
+        cur.execute("INSERT INTO credit_profile (pan, credit_score, last_updated) VALUES (%s, 700, NOW());", (taken,))
+
+    # Hide the active row from the step-2 lookup, as if a POST /loan/ committed it just after
+    monkeypatch.setattr(batch, "ACTIVE_STATUSES", ("__none__",))
+    row = {"name": "batch test", "age": 30, "income": 50000.0, "loan_amount": 100000.0}
+    summary = batch.ingest_batch([{**row, "pan": taken}, {**row, "pan": free}])
+
+    assert summary["accepted"] == 1
+    conflict, accepted = summary["results"]
+    assert conflict["status"] == "conflict" and "application_id" not in conflict
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT credit_score FROM credit_profile WHERE pan = %s;", (taken,))
+        assert cur.fetchone()[0] == 700
+        cur.execute("SELECT count(*) FROM loan_status_history WHERE application_id = %s;",
+                    (accepted["application_id"],))
+        assert cur.fetchone()[0] > 0
+
+
+def test_iter_payload_streams_ndjson():
+    pytest.importorskip("psycopg2")
+    pytest.importorskip("dotenv")
+    pytest.importorskip("groq")
+    from batch import iter_payload
+
+    f = io.StringIO('{"pan": "A"}\n\n{"pan": "B"}\nnot json\n')
+    rows = iter_payload(f)
+    assert next(rows) == {"pan": "A"}
+    assert f.tell() < len(f.getvalue())         # the rest of the file is not read yet
+    assert next(rows) == {"pan": "B"}
+    with pytest.raises(ValueError, match="line 4"):
+        next(rows)
+    assert list(iter_payload(io.StringIO('[{"pan": "A"},\n {"pan": "B"}]'))) == [{"pan": "A"}, {"pan": "B"}]
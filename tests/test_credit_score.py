@@ -0,0 +1,77 @@
+# tests/test_credit_score.py
+"""
+Concurrent large-loan updates of one PAN must not lose each other's penalty:
+starting from the max score, `threads` simultaneous updates end at exactly
+max - threads * LARGE_LOAN_PENALTY (clamped to the min score).
+"""
+import threading
+import uuid
+
+import pytest
+
+ROUNDS = 5
+
+
+@pytest.fixture
+def pan(migrated_db):
+    from db_postgres import transaction
+
+    pan = f"ZZ{uuid.uuid4().hex[:8].upper()}"
+    yield pan
+    with transaction() as conn:
+        conn.cursor().execute("DELETE FROM credit_profile WHERE pan = %s;", (pan,))
+
+
+def _set_score(pan: str, score: int):
+    from db_postgres import transaction
+
+    with transaction() as conn:
+        conn.cursor().execute("""
+            INSERT INTO credit_profile (pan, credit_score, last_updated)
+            VALUES (%s, %s, NOW())
+            ON CONFLICT (pan) DO UPDATE SET credit_score = EXCLUDED.credit_score;
+        """, (pan, score))
+
+
+def _score(pan: str) -> int:
+    from db_postgres import transaction
+
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT credit_score FROM credit_profile WHERE pan = %s;", (pan,))
+        return cur.fetchone()[0]
+
+
+# 15 threads land exactly on the min score; 20 would go below it and are clamped
+@pytest.mark.parametrize("threads", [15, 20])
+def test_concurrent_large_loans_lose_no_penalty(pan, threads):
+    from utils import (
+        get_or_update_credit_score,
+        CREDIT_SCORE_MIN,
+        CREDIT_SCORE_MAX,
+        LARGE_LOAN_PENALTY,
+        LARGE_LOAN_RATIO,
+    )
+
+    expected = max(CREDIT_SCORE_MIN, CREDIT_SCORE_MAX - threads * LARGE_LOAN_PENALTY)
+    errors = []
+
+    for _ in range(ROUNDS):
+        _set_score(pan, CREDIT_SCORE_MAX)
+        barrier = threading.Barrier(threads)
+
+        def worker():
+            try:
+                barrier.wait()
+                get_or_update_credit_score(pan, income=1000, loan_amount=1000 * (LARGE_LOAN_RATIO + 1))
+            except Exception as e:
+                errors.append(e)
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+
+        assert not errors
+        assert _score(pan) == expected
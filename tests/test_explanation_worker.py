@@ -0,0 +1,92 @@
+# tests/test_explanation_worker.py
+"""The worker threads must survive a failing DB write on the failure path."""
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("dotenv")
+pytest.importorskip("groq")
+
+import explanation_worker
+from explanation_worker import ExplanationWorkerPool
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    processed = []
+
+    def fake_load(application_id, columns):
+        processed.append(application_id)
+        return {"application_id": application_id, "status": "approved",
+                "llm_status_explanation_state": "pending", "history": []}
+
+    monkeypatch.setattr(explanation_worker, "get_application_with_history", fake_load)
+    monkeypatch.setattr(explanation_worker, "generate_status_explanation",
+                        lambda app, history: "(LLM unavailable: test)")
+    pool = ExplanationWorkerPool(workers=1, max_retries=1, sweep_interval=0)
+    pool.processed = processed
+    yield pool
+    pool.stop()
+
+
+def _drain(pool, timeout: float = 5):
+    """Queue.join() with a deadline: a dead worker thread must fail the test, not hang it."""
+    deadline = time.monotonic() + timeout
+    while pool._queue.unfinished_tasks:
+        assert time.monotonic() < deadline, "worker stopped consuming"
+        time.sleep(0.01)
+
+
+def _broken_set_state(calls: list):
+    def set_state(application_id, state, explanation):
+        calls.append((application_id, state))
+        raise RuntimeError("database is down")
+    return set_state
+
+
+def test_worker_keeps_consuming_when_marking_failed_raises(pool, monkeypatch):
+    calls = []
+    monkeypatch.setattr(pool, "_set_state", _broken_set_state(calls))
+    pool.start()
+
+    for application_id in ("ln_a", "ln_b", "ln_c"):
+        assert pool.enqueue(application_id)
+    _drain(pool)
+
+    assert pool.processed == ["ln_a", "ln_b", "ln_c"]
+    assert [state for _, state in calls] == ["failed"] * 3
+    assert all(t.is_alive() for t in pool._threads)
+    stats = pool.stats()
+    assert stats["failed"] == 3          # counted once per application, not twice
+    assert stats["in_flight"] == 0
+
+
+def test_failed_application_can_be_enqueued_again(pool, monkeypatch):
+    monkeypatch.setattr(pool, "_set_state", _broken_set_state([]))
+    pool.start()
+    pool.enqueue("ln_a")
+    _drain(pool)
+    # the row is still 'pending' in the DB; the sweep must be able to re-enqueue it
+    assert "ln_a" not in pool._queued
+    assert pool.enqueue("ln_a")
+    _drain(pool)
+    assert pool.processed == ["ln_a", "ln_a"]
+
+
+def test_worker_survives_processing_error(pool, monkeypatch):
+    monkeypatch.setattr(pool, "_set_state", lambda *args: None)
+    failures = threading.Event()
+
+    def load(application_id, columns):
+        failures.set()
+        raise RuntimeError("pool timeout")
+
+    monkeypatch.setattr(explanation_worker, "get_application_with_history", load)
+    pool.start()
+    pool.enqueue("ln_a")
+    _drain(pool)
+    assert failures.is_set()
+    assert all(t.is_alive() for t in pool._threads)
+    assert pool.stats()["failed"] == 1
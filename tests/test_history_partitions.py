@@ -0,0 +1,36 @@
+# tests/test_history_partitions.py
+"""Partition export: the CSV must be read back and match the table before a DROP."""
+import os
+
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("dotenv")
+
+from history_partitions import _export, _count_csv_rows, ArchiveError
+
+NAME = "loan_status_history_p202001"
+CSV = (
+    b"id,application_id,old_status,new_status,changed_at,note\n"
+    b'1,A1,,submitted,2020-01-02 10:00:00,\n'
+    b'2,A1,submitted,manual_review,2020-01-02 10:00:01,"two\nlines"\n'
+)
+
+
+class FakeCursor:
+    def copy_expert(self, sql, f):
+        assert NAME in sql
+        f.write(CSV)
+
+
+def test_export_counts_records_not_lines(tmp_path):
+    path = _export(FakeCursor(), NAME, str(tmp_path), expected_rows=2)
+    assert path == os.path.join(str(tmp_path), f"{NAME}.csv.gz")
+    assert _count_csv_rows(path) == 2
+    assert os.listdir(tmp_path) == [f"{NAME}.csv.gz"]
+
+
+def test_export_mismatch_raises_and_leaves_no_file(tmp_path):
+    with pytest.raises(ArchiveError):
+        _export(FakeCursor(), NAME, str(tmp_path), expected_rows=3)
+    assert os.listdir(tmp_path) == []
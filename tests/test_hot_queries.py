@@ -0,0 +1,23 @@
+# tests/test_hot_queries.py
+"""Every query in migrations.HOT_QUERIES must be planned on its index (EXPLAIN, seqscan off)."""
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("dotenv")
+
+from migrations import HOT_QUERIES, verify_indexes
+
+
+@pytest.fixture(scope="module")
+def plans(migrated_db):
+    return verify_indexes()
+
+
+def test_every_hot_query_is_checked(plans):
+    assert set(plans) == set(HOT_QUERIES)
+
+
+@pytest.mark.parametrize("name", sorted(HOT_QUERIES))
+def test_hot_query_uses_its_index(plans, name):
+    result = plans[name]
+    assert result["used"], f"{name}: expected {result['index']}, plan used {result['plan_indexes']}"
@@ -0,0 +1,161 @@
+# tests/test_llm_client.py
+"""
+Circuit breaker outcomes of streamed calls, against fake_groq.py in-process.
+
+A half-open breaker lets one trial call through; a consumer that disconnects
+mid-stream must give that slot back, or the breaker never closes again.
+"""
+import asyncio
+
+import pytest
+
+groq = pytest.importorskip("groq")
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("fastapi")
+pytest.importorskip("psycopg2")
+pytest.importorskip("dotenv")
+
+from fastapi.testclient import TestClient
+
+import fake_groq
+import llm_service
+from llm_client import CircuitBreaker, ResilientLLMClient, LLMUnavailable
+
+REQUEST = {"model": "fake", "messages": [{"role": "user", "content": "why?"}]}
+
+
+@pytest.fixture(autouse=True)
+def fast_fake_groq(monkeypatch):
+    monkeypatch.setitem(fake_groq.settings, "latency", 0)
+    monkeypatch.setitem(fake_groq.settings, "token_delay", 0)
+    monkeypatch.setitem(fake_groq.settings, "error_rate", 0)
+    monkeypatch.setattr(llm_service, "LLM_CACHE_ENABLED", False)
+
+
+def _half_open_breaker() -> CircuitBreaker:
+    """Open with no cooldown: the next allow() is the half-open trial."""
+    breaker = CircuitBreaker(window=4, min_calls=2, error_rate=0.5, cooldown=0)
+    breaker.record(False)
+    breaker.record(False)
+    assert breaker.state == "open"
+    return breaker
+
+
+def _async_client(breaker: CircuitBreaker) -> ResilientLLMClient:
+    http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fake_groq.app))
+    client = groq.AsyncGroq(api_key="fake", base_url="http://fake-groq", http_client=http_client, max_retries=0)
+    return ResilientLLMClient(client, max_retries=0, circuit_breaker=breaker)
+
+
+@pytest.fixture
+def sync_breaker(monkeypatch):
+    breaker = _half_open_breaker()
+    client = groq.Groq(api_key="fake", base_url="http://testserver",
+                       http_client=TestClient(fake_groq.app), max_retries=0)
+    monkeypatch.setattr(llm_service, "breaker", breaker)
+    monkeypatch.setattr(llm_service, "client", client)
+    return breaker
+
+
+# ---- breaker
+def test_release_frees_the_half_open_trial():
+    breaker = _half_open_breaker()
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.release()
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+
+
+def test_release_does_not_count_as_an_outcome():
+    breaker = CircuitBreaker(window=4, min_calls=2, error_rate=0.5, cooldown=60)
+    for _ in range(4):
+        assert breaker.allow()
+        breaker.release()
+    assert breaker.state == "closed"
+
+
+# ---- sync stream (main.py)
+def test_sync_stream_disconnect_during_half_open_releases_trial(sync_breaker):
+    chunks = llm_service._generate_stream("why?")
+    assert not llm_service.is_llm_failure(next(chunks))
+    chunks.close()      # the SSE client went away: GeneratorExit at the yield
+
+    assert sync_breaker.state == "half_open"
+    assert sync_breaker.allow()
+
+
+def test_sync_stream_completed_trial_closes_breaker(sync_breaker):
+    text = "".join(llm_service._generate_stream("why?")).strip()
+    assert text == fake_groq.REPLY
+    assert sync_breaker.state == "closed"
+
+
+def test_sync_stream_failed_trial_reopens_breaker(sync_breaker, monkeypatch):
+    monkeypatch.setitem(fake_groq.settings, "error_rate", 1)
+    assert llm_service.is_llm_failure("".join(llm_service._generate_stream("why?")))
+    assert sync_breaker.state == "open"
+
+
+# ---- async stream (main_async.py)
+def test_async_stream_disconnect_during_half_open_releases_trial():
+    breaker = _half_open_breaker()
+    client = _async_client(breaker)
+
+    async def first_delta_then_disconnect():
+        deltas = client.stream(**REQUEST)
+        assert await deltas.__anext__()
+        await deltas.aclose()
+
+    asyncio.run(first_delta_then_disconnect())
+    assert breaker.state == "half_open"
+    assert client.stats()["in_flight"] == 0
+    assert breaker.allow()
+
+
+def test_async_complete_cancelled_during_half_open_releases_trial(monkeypatch):
+    breaker = _half_open_breaker()
+    client = _async_client(breaker)
+    monkeypatch.setitem(fake_groq.settings, "latency", 60)
+
+    async def cancelled_while_waiting():
+        task = asyncio.create_task(client.complete(**REQUEST))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancelled_while_waiting())
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+
+
+def test_async_stream_outcomes_still_close_and_reopen(monkeypatch):
+    breaker = _half_open_breaker()
+    client = _async_client(breaker)
+
+    async def collect():
+        return "".join([delta async for delta in client.stream(**REQUEST)]).strip()
+
+    assert asyncio.run(collect()) == fake_groq.REPLY
+    assert breaker.state == "closed"
+
+    breaker = _half_open_breaker()
+    client = _async_client(breaker)
+    monkeypatch.setitem(fake_groq.settings, "error_rate", 1)
+    with pytest.raises(LLMUnavailable):
+        asyncio.run(collect())
+    assert breaker.state == "open"
+
+
+def test_llm_service_async_stream_disconnect_closes_client_stream(monkeypatch):
+    breaker = _half_open_breaker()
+    monkeypatch.setattr(llm_service, "resilient_client", _async_client(breaker))
+
+    async def first_delta_then_disconnect():
+        deltas = llm_service._agenerate_stream("why?")
+        assert await deltas.__anext__()
+        await deltas.aclose()
+
+    asyncio.run(first_delta_then_disconnect())
+    assert breaker.allow()
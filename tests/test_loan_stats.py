@@ -0,0 +1,72 @@
+# tests/test_loan_stats.py
+"""
+The loan_status_stats triggers must keep the counters equal to loan_applications
+(no _MISMATCHES rows) across INSERT, officer review UPDATE and DELETE.
+"""
+import uuid
+
+import pytest
+
+
+@pytest.fixture
+def stats_db(migrated_db):
+    from db_postgres import transaction
+    from loan_stats import check
+
+    # start from consistent counters; the scratch DB may have drifted before
+    check(repair=True)
+    ids = [f"T-{uuid.uuid4().hex[:12]}" for _ in range(3)]
+    yield transaction, ids
+    with transaction() as conn:
+        cur = conn.cursor()
+        for table in ("loan_manual_review", "loan_status_history", "loan_applications"):
+            cur.execute(f"DELETE FROM {table} WHERE application_id = ANY(%s);", (ids,))
+
+
+def _mismatches(transaction) -> list:
+    from loan_stats import _MISMATCHES
+
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute(_MISMATCHES)
+        return cur.fetchall()
+
+
+def test_triggers_keep_counters_in_sync(stats_db):
+    from db_postgres import review_applications
+    from services import review_decisions
+
+    transaction, ids = stats_db
+    with transaction() as conn:
+        cur = conn.cursor()
+        # one multi-row statement, like bulk ingestion
+        cur.execute("""
+            INSERT INTO loan_applications
+            (application_id, name, age, income, loan_amount, pan, status, credit_score, risk_level, created_at)
+            SELECT id, 'stats test', 30, 50000, 100000, 'TS' || upper(right(id, 8)),
+                   'manual_review', 640, 'medium', NOW()
+            FROM unnest(%s::text[]) AS id;
+        """, (ids,))
+    assert _mismatches(transaction) == []
+
+    reviewed = review_applications(review_decisions(
+        [(ids[0], "approve", "ok"), (ids[1], "reject", "no")], "stats-test"
+    ))
+    assert {row["application_id"] for row in reviewed} == {ids[0], ids[1]}
+    assert _mismatches(transaction) == []
+
+    with transaction() as conn:
+        conn.cursor().execute("DELETE FROM loan_applications WHERE application_id = ANY(%s);", (ids[1:],))
+    assert _mismatches(transaction) == []
+
+
+def test_concurrent_reconcile_skips(stats_db):
+    from loan_stats import check, RECONCILE_LOCK_ID
+
+    transaction, _ = stats_db
+    with transaction(independent=True) as conn:
+        conn.cursor().execute("SELECT pg_advisory_xact_lock(%s);", (RECONCILE_LOCK_ID,))
+        report = check()
+    assert report["skipped"]
+    assert report["mismatches"] is None
+    assert "skipped" not in check()
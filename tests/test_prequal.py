@@ -0,0 +1,121 @@
+# tests/test_prequal.py
+"""
+prequal.prequalify (NumPy, whole columns) must decide exactly like run_agent
+(one prospect at a time): on every boundary value in policy.json and on
+random prospects clustered around the rule thresholds.
+"""
+import itertools
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("psycopg2")
+pytest.importorskip("dotenv")
+pytest.importorskip("groq")
+
+from agent import run_agent
+from prequal import prequalify
+from rule_engine import rule_engine
+
+COLUMNS = ("age", "income", "loan_amount", "credit_score")
+
+
+def policy_thresholds(policy) -> tuple:
+    """Numeric cut-offs per field and loan/income ratios referenced by the policy."""
+    values, ratios = {}, set()
+
+    def walk(condition):
+        for kind in ("any", "all"):
+            for part in condition.get(kind, []):
+                walk(part)
+        value = condition.get("value")
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return
+        if condition.get("times"):
+            ratios.add(float(value))
+        else:
+            values.setdefault(condition.get("field"), set()).add(value)
+
+    for name in policy.tables:
+        for rule in policy.spec[name].get("rules", []):
+            walk(rule["when"])
+    return values, ratios
+
+
+def _edges(values: dict, field: str, *extra) -> list:
+    return sorted({v + d for v in values.get(field, ()) for d in (-1, 0, 1)} | set(extra))
+
+
+def boundary_prospects(policy) -> dict:
+    """Every combination of threshold ±1 per field, with loans at each policy ratio (exact and ±0.01)."""
+    values, ratios = policy_thresholds(policy)
+    ages = _edges(values, "age", 30)
+    incomes = _edges(values, "income", -1000.0, 1.0, 50000.0)
+    scores = _edges(values, "credit_score", 700)
+    multipliers = sorted({r + d for r in ratios | {1.0} for d in (-0.01, 0, 0.01)} | {0.0})
+
+    rows = [
+        (age, income, round(income * ratio, 2), score)
+        for age, income, ratio, score in itertools.product(ages, incomes, multipliers, scores)
+    ]
+    return {c: np.array([row[i] for row in rows], dtype=np.float64) for i, c in enumerate(COLUMNS)}
+
+
+def sample_prospects(rows: int, seed: int, policy) -> dict:
+    """Random prospects concentrated around every policy threshold (plus exact boundary values)."""
+    values, ratios = policy_thresholds(policy)
+    rng = np.random.default_rng(seed)
+
+    def around(field, low, high, integer=True):
+        edges = _edges(values, field) or [low]
+        uniform = rng.integers(low, high + 1, rows) if integer else np.round(rng.uniform(low, high, rows), 2)
+        return np.where(rng.random(rows) < 0.5, rng.choice(edges, rows), uniform)
+
+    income = around("income", -100, 200000, integer=False)
+    income = np.where(rng.random(rows) < 0.2, rng.choice([-1000.0, 1.0, 25000.0, 50000.0], rows), income)
+    ratio = rng.choice(sorted(ratios | {0.0, 1.0}), rows) + rng.choice([-0.01, 0, 0, 0.01, 0.5, -0.5], rows)
+    loan_amount = np.where(rng.random(rows) < 0.9, np.round(income * ratio, 2), around("loan_amount", -1, 1))
+    return {
+        "age": around("age", 0, 110),
+        "income": income,
+        "loan_amount": loan_amount,
+        "credit_score": around("credit_score", 300, 900),
+    }
+
+
+def scalar_prequalify(age, income, loan_amount, credit_score) -> tuple:
+    """The reference path: one run_agent call per prospect with a fixed credit score."""
+    result = run_agent(
+        {"name": "prospect", "age": age, "income": income, "loan_amount": loan_amount, "pan": ""},
+        credit_score_fn=lambda pan, inc, loan: {"credit_score": credit_score},
+    )
+    risk = result["risk"]["risk_level"] if result["risk"] else ""
+    return result["status"], risk, result["decision"]["reason"]
+
+
+def assert_same_decisions(data: dict):
+    vector = prequalify(**data)
+    columns = [data[c].tolist() for c in COLUMNS]
+    mismatches = []
+    for i, row in enumerate(zip(*columns)):
+        got = (str(vector["status"][i]), str(vector["risk_level"][i]), str(vector["reason"][i]))
+        expected = scalar_prequalify(*row)
+        if got != expected:
+            mismatches.append({"input": dict(zip(COLUMNS, row)), "run_agent": expected, "prequalify": got})
+    assert not mismatches, f"{len(mismatches)} of {len(columns[0])} rows differ, e.g. {mismatches[:3]}"
+
+
+def test_policy_boundaries_match_run_agent():
+    data = boundary_prospects(rule_engine.policy)
+    assert len(data["age"]) > 1000
+    assert_same_decisions(data)
+
+
+@pytest.mark.parametrize("seed", [0, 7, 2024])
+def test_random_prospects_match_run_agent(seed):
+    assert_same_decisions(sample_prospects(5000, seed, rule_engine.policy))
+
+
+def test_every_status_is_exercised():
+    statuses = set(prequalify(**boundary_prospects(rule_engine.policy))["status"].tolist())
+    assert statuses == {"approved", "rejected", "manual_review"}
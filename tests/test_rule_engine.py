@@ -0,0 +1,83 @@
+# tests/test_rule_engine.py
+"""
+Hot reload swaps the whole compiled policy; evaluation never looks at the file.
+Vector runs (prequal) are counted apart from the live hits.
+"""
+import json
+import os
+import shutil
+import time
+
+import pytest
+
+from rule_engine import RuleEngine, POLICY_PATH
+
+APPLICATION = {"age": 35, "income": 50000.0, "loan_amount": 120000.0, "credit_score": 640}
+
+
+@pytest.fixture
+def policy_file(tmp_path):
+    path = tmp_path / "policy.json"
+    shutil.copy(POLICY_PATH, path)
+    return path
+
+
+def _rewrite(path, **changes):
+    spec = json.loads(path.read_text())
+    spec.update(changes)
+    path.write_text(json.dumps(spec))
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))   # coarse mtime clocks
+
+
+def test_evaluate_does_not_reload(policy_file):
+    engine = RuleEngine(str(policy_file), reload_interval=0.01, sample_every=0)
+    version = engine.policy.version
+    _rewrite(policy_file, version="next")
+    time.sleep(0.05)
+    engine.evaluate("validation", APPLICATION)
+    assert engine.policy.version == version      # no watcher started: nothing swapped
+
+
+def test_watcher_swaps_policy_on_mtime_change(policy_file):
+    engine = RuleEngine(str(policy_file), reload_interval=0.01, sample_every=0)
+    before = engine.policy
+    engine.start()
+    try:
+        _rewrite(policy_file, version="next")
+        deadline = time.monotonic() + 5
+        while engine.policy is before and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        engine.stop()
+    assert engine.policy.version == "next"
+    assert engine.reloads == 2
+    assert engine.evaluate("validation", APPLICATION)["success"] is True
+
+
+def test_broken_policy_keeps_active_one(policy_file):
+    engine = RuleEngine(str(policy_file), reload_interval=0, sample_every=0)
+    version = engine.policy.version
+    _rewrite(policy_file, risk={"rules": [{"id": "x", "when": {"field": "nope", "op": "<", "value": 1}}]})
+    assert engine.reload() is False
+    assert engine.policy.version == version
+    assert "nope" in engine.last_error
+
+
+def test_sampled_evaluations_count_hits_like_the_chain(policy_file):
+    engine = RuleEngine(str(policy_file), reload_interval=0, sample_every=3)
+    for _ in range(9):
+        engine.evaluate("validation", APPLICATION)
+    stats = engine.stats()["sections"]["validation"]
+    assert sum(rule["hits"] for rule in stats) == 9
+    assert stats[0]["sampled"] == 3
+
+
+def test_vector_runs_do_not_touch_live_hits(policy_file):
+    np = pytest.importorskip("numpy")
+    engine = RuleEngine(str(policy_file), reload_interval=0, sample_every=0)
+    table = engine.policy.tables["validation"]
+    table.match_vector({c: np.full(5, APPLICATION[c]) for c in ("age", "income", "loan_amount")})
+    stats = engine.stats()["sections"]["validation"]
+    assert sum(rule["hits"] for rule in stats) == 0
+    assert sum(rule["vector_hits"] for rule in stats) == 5
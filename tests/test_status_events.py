@@ -0,0 +1,131 @@
+# tests/test_status_events.py
+"""Relay watermark / gap tracking and SSE feed resume; outbox pruning against Postgres."""
+import json
+import uuid
+
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("dotenv")
+
+import status_events
+from status_events import EventFeed, StatusEventRelay
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(status_events.time, "monotonic", fake)
+    return fake
+
+
+def _relay(start: int = 5, gap_timeout: float = 30) -> StatusEventRelay:
+    relay = StatusEventRelay(gap_timeout=gap_timeout)
+    relay.watermark = relay._max_seen = start
+    return relay
+
+
+def _event(event_id: int, new_status: str = "approved") -> dict:
+    return {"id": event_id, "application_id": f"ln_{event_id}", "old_status": "manual_review",
+            "new_status": new_status, "changed_at": "2026-10-18T10:00:00"}
+
+
+def _ids(chunks: list) -> list:
+    return [json.loads(c.split("data: ", 1)[1].split("\n", 1)[0])["id"] for c in chunks]
+
+
+def test_contiguous_ids_advance_watermark(clock):
+    relay = _relay()
+    relay._advance([6, 7, 8])
+    assert relay.watermark == 8
+    assert relay._gaps == {}
+
+
+def test_watermark_stays_below_gap_until_it_fills(clock):
+    relay = _relay()
+    relay._advance([6, 8, 10])
+    assert set(relay._gaps) == {7, 9}
+    assert relay.watermark == 6
+
+    relay._advance([7])
+    assert relay.watermark == 8
+
+    relay._advance([9])
+    assert relay.watermark == 10
+    assert relay._gaps == {}
+
+
+def test_gap_is_given_up_after_timeout(clock):
+    relay = _relay(gap_timeout=30)
+    relay._advance([6, 8])
+    assert relay.watermark == 6
+
+    clock.now += 31
+    relay._advance([])
+    assert relay.watermark == 8
+    assert relay.stats()["gaps_expired"] == 1
+
+
+def test_feed_resumes_after_cursor_without_duplicates():
+    feed = EventFeed(after=7, statuses=None)
+    assert _ids(feed.render([_event(6), _event(7), _event(8), _event(9)])) == [8, 9]
+    # the relay may deliver an id again (at-least-once); the feed drops it
+    assert _ids(feed.render([_event(9), _event(10)])) == [10]
+
+    feed.advance(10)
+    assert feed.cursor == 10
+    assert _ids(feed.render([_event(10), _event(11)])) == [11]
+
+
+def test_feed_status_filter_still_advances_cursor():
+    feed = EventFeed(after=0, statuses={"manual_review"})
+    assert _ids(feed.render([_event(1, "approved"), _event(2, "manual_review")])) == [2]
+    feed.advance(2)
+    assert feed.cursor == 2
+
+
+def test_replay_pages_through_outbox(monkeypatch):
+    pages = {0: [_event(i) for i in range(1, 3)], 2: []}
+    monkeypatch.setattr(status_events, "STATUS_EVENTS_PAGE", 2)
+    monkeypatch.setattr(status_events, "read_events", lambda after: pages[after])
+    feed = EventFeed(after=0, statuses=None)
+    assert _ids(feed.replay()) == [1, 2]
+
+
+# ---- outbox pruning (Postgres)
+def test_prune_deletes_rows_past_retention(migrated_db):
+    from db_postgres import transaction
+
+    application_id = f"T-{uuid.uuid4().hex[:12]}"
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO loan_status_events (application_id, old_status, new_status, changed_at, created_at)
+            VALUES (%(id)s, NULL, 'submitted', NOW(), NOW() - interval '3 hours'),
+                   (%(id)s, 'submitted', 'approved', NOW(), NOW() - interval '20 minutes')
+            RETURNING id;
+        """, {"id": application_id})
+        old_id, recent_id = (row[0] for row in cur.fetchall())
+
+    relay = StatusEventRelay(retention_hours=0.5)    # fractional: what make_interval(hours =>) rejected
+    try:
+        with transaction() as conn:
+            relay._maybe_prune(conn.cursor())
+        with transaction() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT id FROM loan_status_events WHERE application_id = %s;", (application_id,))
+            remaining = {row[0] for row in cur.fetchall()}
+    finally:
+        with transaction() as conn:
+            conn.cursor().execute("DELETE FROM loan_status_events WHERE application_id = %s;", (application_id,))
+
+    assert remaining == {recent_id}
+    assert old_id not in remaining
@@ -1,55 +1,104 @@
 # utils.py
+import json
 import random
-from datetime import datetime
-from db_postgres import get_connection
-
-def get_or_update_credit_score(pan: str, income: float, loan_amount: float):
-    conn = get_connection()
-    cur = conn.cursor()
-
-    # Check if credit profile exists
-    cur.execute("SELECT credit_score, last_updated FROM credit_profile WHERE pan=%s", (pan,))
-    row = cur.fetchone()
-
-    # FIRST TIME PAN → Assign new score
-    if not row:
-        score = random.randint(600, 780)
-        cur.execute("""
-            INSERT INTO credit_profile (pan, credit_score, last_updated)
-            VALUES (%s, %s, NOW())
-        """, (pan, score))
-        conn.commit()
-        conn.close()
-        return score
-
-    score, last_updated = row
+from datetime import date, datetime
+import metrics
+from db_postgres import transaction
+from pan_counts import RECENT_DAY_FILTER, RECENT_WINDOW_DAYS
+
+
+def json_default(value):
+    """json.dumps fallback for DB rows (timestamps as ISO-8601)."""
+    return value.isoformat() if isinstance(value, (datetime, date)) else str(value)
+
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse_event(data: dict, event: str | None = None, event_id: str | None = None) -> str:
+    """Format one server-sent event."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=json_default)}")
+    return "\n".join(lines) + "\n\n"
 
-    # RULE 1: multiple loans within 30 days → -30
-    cur.execute("""
-        SELECT COUNT(*)
-        FROM loan_applications
-        WHERE pan=%s AND created_at > NOW() - INTERVAL '30 days'
-    """, (pan,))
-    count_recent = cur.fetchone()[0]
 
+CREDIT_SCORE_MIN = 500
+CREDIT_SCORE_MAX = 800
+RECENT_APPLICATIONS_PENALTY = 30     # more than one application in the last 30 days
+LARGE_LOAN_PENALTY = 20              # loan_amount > income * LARGE_LOAN_RATIO
+LARGE_LOAN_RATIO = 3
+
+
+def new_credit_score() -> int:
+    """Score assigned to a PAN seen for the first time."""
+    return random.randint(600, 780)
+
+
+def apply_credit_rules(score: int, count_recent: int, income: float, loan_amount: float) -> int:
+    """Adjust an existing score given the PAN's applications in the last 30 days."""
+    # RULE 1: multiple loans within 30 days → -30
     if count_recent > 1:
-        score -= 30
+        score -= RECENT_APPLICATIONS_PENALTY
 
     # RULE 2: large loan > income * 3 → -20
-    if loan_amount > income * 3:
-        score -= 20
+    if loan_amount > income * LARGE_LOAN_RATIO:
+        score -= LARGE_LOAN_PENALTY
 
     # Clamp limits
-    score = max(500, min(score, 800))
+    return max(CREDIT_SCORE_MIN, min(score, CREDIT_SCORE_MAX))
+
+
+# Same rules as apply_credit_rules, evaluated server-side in one statement.
+# ON CONFLICT DO UPDATE locks the profile row and applies the penalties to the
+# latest committed score, so concurrent submissions for one PAN serialize on
+# the row instead of overwriting each other's update.
+# The 30-day count comes from the per-PAN daily buckets (pan_counts.py).
+CREDIT_SCORE_UPSERT = f"""
+    WITH recent AS (
+        SELECT COALESCE(SUM(count), 0) AS n
+        FROM pan_daily_counts
+        WHERE pan = %(pan)s AND {RECENT_DAY_FILTER}
+    )
+    INSERT INTO credit_profile AS cp (pan, credit_score, last_updated)
+    VALUES (%(pan)s, %(new_score)s, NOW())
+    ON CONFLICT (pan) DO UPDATE
+    SET credit_score = LEAST(%(max_score)s, GREATEST(%(min_score)s,
+            cp.credit_score
+            - CASE WHEN (SELECT n FROM recent) - %(self_count)s > 1 THEN %(recent_penalty)s ELSE 0 END
+            - CASE WHEN %(loan_amount)s > %(income)s * %(large_loan_ratio)s
+                   THEN %(large_loan_penalty)s ELSE 0 END
+        )),
+        last_updated = NOW()
+    RETURNING credit_score;
+"""
 
-    # Update DB
-    cur.execute("""
-        UPDATE credit_profile
-        SET credit_score=%s, last_updated=NOW()
-        WHERE pan=%s
-    """, (score, pan))
 
-    conn.commit()
-    conn.close()
+@metrics.timed(metrics.DB_HELPER_SECONDS)
+def get_or_update_credit_score(pan: str, income: float, loan_amount: float, counted_self: bool = False):
+    """
+    First time PAN → new score; otherwise apply the 30-day / large-loan
+    penalties. One round trip, atomic per PAN.
+    `counted_self`: the application being scored is already inserted (reserved)
+    and so already in the 30-day buckets; it is left out of the count.
+    """
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute(CREDIT_SCORE_UPSERT, {
+            "pan": pan,
+            "window_days": RECENT_WINDOW_DAYS,
+            "self_count": 1 if counted_self else 0,
+            "income": income,
+            "loan_amount": loan_amount,
+            "new_score": new_credit_score(),
+            "min_score": CREDIT_SCORE_MIN,
+            "max_score": CREDIT_SCORE_MAX,
+            "recent_penalty": RECENT_APPLICATIONS_PENALTY,
+            "large_loan_ratio": LARGE_LOAN_RATIO,
+            "large_loan_penalty": LARGE_LOAN_PENALTY,
+        })
+        return cur.fetchone()[0]
 
-    return score